@@ -0,0 +1,153 @@
+"""
+IVF-flat approximate nearest-neighbour index in NumPy (cosine similarity).
+
+Build: spherical k-means splits the (L2-normalised) vectors into `nlist` lists;
+vectors are stored grouped by list so each list is one contiguous slice.
+Search: score the query against the centroids, scan only the `nprobe` closest
+lists exactly. nprobe trades recall for latency (nprobe == nlist is exact).
+
+On disk (.rag_index/<pack_id>.ivf/):
+    centroids.npy  [nlist, D] float32
+    vectors.npy    [N, D] float32, grouped by list
+    rows.npy       [N] int32, original row of each stored vector
+    offsets.npy    [nlist + 1] int64, list i is vectors[offsets[i]:offsets[i+1]]
+    meta.json      {"dim", "nlist", "chunk_ids", "embedding_model"}
+Arrays are opened with mmap_mode="r", so loading is instant and pages are shared
+between worker processes.
+"""
+
+import json
+import math
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_NPROBE = 8
+
+
+def _normalise_rows(x: np.ndarray) -> np.ndarray:
+    x = np.asarray(x, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return x / norms
+
+
+def default_nlist(n: int) -> int:
+    # Usual rule of thumb: ~sqrt(N) lists, at least 1
+    return max(1, min(n, int(round(math.sqrt(n)))))
+
+
+def _kmeans(x: np.ndarray, nlist: int, iters: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Spherical k-means on unit vectors. Returns (centroids, assignment per row).
+    """
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(x.shape[0], size=nlist, replace=False)].copy()
+    assign = np.zeros(x.shape[0], dtype=np.int32)
+
+    for _ in range(iters):
+        assign = np.argmax(x @ centroids.T, axis=1).astype(np.int32)
+        for c in range(nlist):
+            members = x[assign == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+            else:
+                # Re-seed empty lists with a random point
+                centroids[c] = x[rng.integers(x.shape[0])]
+        centroids = _normalise_rows(centroids)
+
+    assign = np.argmax(x @ centroids.T, axis=1).astype(np.int32)
+    return centroids, assign
+
+
+class IVFIndex:
+    def __init__(self, centroids: np.ndarray, vectors: np.ndarray, rows: np.ndarray, offsets: np.ndarray, meta: Dict[str, Any]):
+        self.centroids = centroids
+        self.vectors = vectors
+        self.rows = rows
+        self.offsets = offsets
+        self.meta = meta
+
+    @property
+    def nlist(self) -> int:
+        return int(self.centroids.shape[0])
+
+    @classmethod
+    def build(
+        cls,
+        vectors: np.ndarray,
+        nlist: Optional[int] = None,
+        iters: int = 12,
+        seed: int = 0,
+        meta: Optional[Dict[str, Any]] = None,
+    ) -> "IVFIndex":
+        x = _normalise_rows(vectors)
+        nlist = min(nlist or default_nlist(x.shape[0]), x.shape[0])
+        centroids, assign = _kmeans(x, nlist, iters, seed)
+
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=nlist)
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+        meta = dict(meta or {})
+        meta.update({"dim": int(x.shape[1]), "nlist": int(nlist)})
+        return cls(centroids, x[order], order.astype(np.int32), offsets, meta)
+
+    def search(self, query: np.ndarray, k: int = 4, nprobe: int = DEFAULT_NPROBE) -> List[Tuple[float, int]]:
+        """
+        [(cosine score, original row)] best first.
+        """
+        q = np.asarray(query, dtype=np.float32).reshape(-1)
+        n = float(np.linalg.norm(q))
+        if n:
+            q = q / n
+
+        nprobe = max(1, min(nprobe, self.nlist))
+        cscores = self.centroids @ q
+        probe = np.argpartition(-cscores, nprobe - 1)[:nprobe] if nprobe < self.nlist else np.arange(self.nlist)
+
+        idx = np.concatenate([np.arange(self.offsets[c], self.offsets[c + 1]) for c in probe])
+        if idx.size == 0:
+            return []
+        scores = self.vectors[idx] @ q
+
+        k = min(k, scores.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), int(self.rows[idx[i]])) for i in top]
+
+    def save(self, out_dir: Path) -> Path:
+        out_dir.mkdir(parents=True, exist_ok=True)
+        np.save(out_dir / "centroids.npy", self.centroids)
+        np.save(out_dir / "vectors.npy", self.vectors)
+        np.save(out_dir / "rows.npy", self.rows)
+        np.save(out_dir / "offsets.npy", self.offsets)
+        (out_dir / "meta.json").write_text(json.dumps(self.meta), encoding="utf-8")
+        return out_dir
+
+    @classmethod
+    def load(cls, in_dir: Path, mmap: bool = True) -> "IVFIndex":
+        mode = "r" if mmap else None
+        return cls(
+            centroids=np.load(in_dir / "centroids.npy", mmap_mode=mode),
+            vectors=np.load(in_dir / "vectors.npy", mmap_mode=mode),
+            rows=np.load(in_dir / "rows.npy", mmap_mode=mode),
+            offsets=np.load(in_dir / "offsets.npy"),
+            meta=json.loads((in_dir / "meta.json").read_text(encoding="utf-8")),
+        )
+
+
+def exact_search(matrix: np.ndarray, query: np.ndarray, k: int = 4) -> List[Tuple[float, int]]:
+    """
+    Brute-force cosine top-k over a row-normalised matrix (reference for recall).
+    """
+    q = np.asarray(query, dtype=np.float32).reshape(-1)
+    n = float(np.linalg.norm(q))
+    if n:
+        q = q / n
+    scores = matrix @ q
+    k = min(k, scores.size)
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [(float(scores[i]), int(i)) for i in top]
@@ -1,13 +1,124 @@
+"""
+Audio decoding into reusable buffers.
+
+ffmpeg writes float32 PCM straight into a preallocated array (readinto), and the
+same memory is handed to every model as a NumPy or torch view:
+
+    with decode_audio(path) as buf:       # buf goes back to the pool on exit
+        identify_speaker(path, audio=buf)  # ECAPA sees buf.tensor()
+        transcribe(path, audio=buf)        # Whisper sees buf.numpy()
+
+Buffers come from audio_pool: TEACHER_AUDIO_SLOT_S seconds each (longer clips get
+a bigger buffer), at most TEACHER_AUDIO_POOL kept free, so memory per concurrent
+utterance stays flat instead of growing with every decode.
+"""
+
+import os
 import subprocess
+import threading
+from typing import List, Optional
+
 import numpy as np
-import torch
 
-def load_audio_ffmpeg(path: str, sr: int = 16000) -> torch.Tensor:
+from app.metrics import gauge
+from app.tracing import traced
+
+SR = 16000
+AUDIO_SLOT_S = float(os.getenv("TEACHER_AUDIO_SLOT_S", "30"))
+AUDIO_POOL_MAX_FREE = int(os.getenv("TEACHER_AUDIO_POOL", "8"))
+
+_FLOAT = np.dtype(np.float32).itemsize
+
+
+class AudioBufferPool:
     """
-    Load audio using ffmpeg into a mono float32 waveform tensor [1, T] at sr Hz.
-    Requires ffmpeg in PATH (or set PATH in session).
+    Free list of float32 arrays, at least `slot_samples` long each.
+    """
+
+    def __init__(self, slot_samples: int, max_free: int = AUDIO_POOL_MAX_FREE):
+        self.slot_samples = slot_samples
+        self.max_free = max_free
+        self._free: List[np.ndarray] = []
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.allocations = 0
+
+    def acquire(self, min_samples: int = 0) -> np.ndarray:
+        with self._lock:
+            self.in_use += 1
+            for i, arr in enumerate(self._free):
+                if arr.size >= min_samples:
+                    return self._free.pop(i)
+            self.allocations += 1
+        return np.empty(max(self.slot_samples, min_samples), dtype=np.float32)
+
+    def release(self, arr: np.ndarray) -> None:
+        with self._lock:
+            self.in_use -= 1
+            if len(self._free) < self.max_free:
+                self._free.append(arr)
+
+    def free_bytes(self) -> int:
+        with self._lock:
+            return sum(a.nbytes for a in self._free)
+
+
+audio_pool = AudioBufferPool(int(AUDIO_SLOT_S * SR))
+
+gauge("teacher_audio_buffers_in_use", "Decoded audio buffers held by turns").set_function(lambda: audio_pool.in_use)
+gauge("teacher_audio_pool_free_bytes", "Bytes parked in the audio buffer pool").set_function(audio_pool.free_bytes)
+
+
+class AudioBuffer:
+    """
+    `n` decoded mono float32 samples at `sr`, in an array borrowed from a pool.
+    numpy()/tensor() are views: valid until release().
     """
-    cmd = [
+
+    __slots__ = ("path", "sr", "n", "_data", "_pool")
+
+    def __init__(self, path: str, sr: int, data: np.ndarray, n: int, pool: Optional[AudioBufferPool]):
+        self.path = path
+        self.sr = sr
+        self.n = n
+        self._data = data
+        self._pool = pool
+
+    @property
+    def duration_s(self) -> float:
+        return self.n / self.sr
+
+    def numpy(self) -> np.ndarray:
+        """
+        [T] float32 view (no copy).
+        """
+        if self._data is None:
+            raise ValueError("AudioBuffer used after release()")
+        return self._data[:self.n]
+
+    def tensor(self):
+        """
+        [1, T] float32 torch tensor sharing the buffer's memory.
+        """
+        import torch
+
+        return torch.from_numpy(self.numpy()).unsqueeze(0)
+
+    def release(self) -> None:
+        if self._data is not None and self._pool is not None:
+            self._pool.release(self._data)
+        self._data = None
+
+    def __enter__(self) -> "AudioBuffer":
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        self.release()
+        return False
+
+
+def _ffmpeg_cmd(path: str, sr: int) -> List[str]:
+    return [
         "ffmpeg",
         "-i", path,
         "-f", "f32le",
@@ -18,7 +129,52 @@ def load_audio_ffmpeg(path: str, sr: int = 16000) -> torch.Tensor:
         "-loglevel", "error",
         "pipe:1",
     ]
-    out = subprocess.check_output(cmd)
-    wav = np.frombuffer(out, dtype=np.float32).copy()
 
-    return torch.from_numpy(wav).unsqueeze(0)  # [1, T]
+
+@traced("audio.decode")
+def decode_audio(path: str, sr: int = SR, pool: Optional[AudioBufferPool] = audio_pool) -> AudioBuffer:
+    """
+    Decode with ffmpeg straight into a pooled buffer (pool=None: a private one).
+    Requires ffmpeg in PATH (or set PATH in session).
+    """
+    def _get(min_samples: int) -> np.ndarray:
+        if pool is not None:
+            return pool.acquire(min_samples)
+        return np.empty(max(min_samples, 10 * sr), dtype=np.float32)
+
+    cmd = _ffmpeg_cmd(path, sr)
+    data = _get(0)
+    filled = 0  # bytes
+    try:
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE, bufsize=0) as proc:
+            while True:
+                view = memoryview(data).cast("B")
+                if filled == len(view):
+                    # Longer than the slot: move to a buffer twice the size
+                    bigger = _get(2 * data.size)
+                    bigger[:data.size] = data
+                    if pool is not None:
+                        pool.release(data)
+                    data, view = bigger, memoryview(bigger).cast("B")
+                got = proc.stdout.readinto(view[filled:])
+                if not got:
+                    break
+                filled += got
+        if proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, cmd)
+    except BaseException:
+        if pool is not None:
+            pool.release(data)
+        raise
+
+    return AudioBuffer(path, sr, data, filled // _FLOAT, pool)
+
+
+def load_audio_ffmpeg(path: str, sr: int = SR):
+    """
+    Load audio using ffmpeg into a mono float32 waveform tensor [1, T] at sr Hz.
+    The tensor owns memory of exactly its length; inside a turn prefer decode_audio().
+    """
+    buf = decode_audio(path, sr, pool=None)
+    # The read buffer is at least 10 s long: copy out only the decoded samples
+    return buf.tensor().clone()
@@ -0,0 +1,152 @@
+"""
+Cohort broadcast: one generation per cohort step, fanned out to every listener.
+
+Everyone in a cohort is on the same classroom_state step, so the step explanation
+(and its TTS audio) is produced once per (cohort, cursor) and delivered to all
+connected students. Only Q&A stays per student. LLM + TTS cost per step is
+O(cohorts) instead of O(students).
+
+Demo:
+    python -m app.broadcast --cohort Year7_Maths_Term1 --students Samuel,Amara,Leo
+"""
+
+import argparse
+import hashlib
+import itertools
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.classroom_state import advance_step, current_position
+from app.history_store import start_compaction_from_env
+from app.log_setup import configure_logging
+from app.metrics import start_from_env as start_metrics
+from app.profiling import add_cli_flags, enable_from_args, profile_turn
+from app.response_cache import NAME_PLACEHOLDER, render
+from app.teacher_openai import teacher_teach_step
+from app.tracing import span
+from app.tts_local import play_wav, synthesize_to_wav
+
+AUDIO_DIR = Path(".cache/tts")
+
+# How the shared audio addresses the room
+CLASS_NAME = "Everyone"
+
+
+@dataclass
+class StepDelivery:
+    cohort_id: str
+    cursor: int
+    text: str                  # personalised with the listener's name
+    audio_path: Optional[str]  # shared WAV (addressed to the whole class)
+
+
+class CohortBroadcaster:
+    def __init__(self, cohort_id: str, with_audio: bool = True):
+        self.cohort_id = cohort_id
+        self.with_audio = with_audio
+        # handle -> (student, deliver); handles, not names, so two "Student"s both get it
+        self._listeners: Dict[int, Tuple[dict, Callable[[StepDelivery], None]]] = {}
+        self._handles = itertools.count(1)
+        # cursor -> (name-agnostic text, shared audio path); only the current step is kept
+        self._generated: Dict[int, Tuple[str, Optional[str]]] = {}
+        self._lock = threading.Lock()
+        self._gen_lock = threading.Lock()  # one generation per step even with concurrent callers
+        self.generations = 0
+
+    def connect(self, student: dict, deliver: Callable[[StepDelivery], None]) -> int:
+        """
+        Add a listener; returns the handle to disconnect() it with.
+        """
+        with self._lock:
+            handle = next(self._handles)
+            self._listeners[handle] = (student, deliver)
+            return handle
+
+    def disconnect(self, handle: int) -> None:
+        with self._lock:
+            self._listeners.pop(handle, None)
+
+    def _generate(self, cursor: int, plan: dict, cohort_state: dict, lesson: dict, step: dict) -> Tuple[str, Optional[str]]:
+        with self._gen_lock:
+            if cursor not in self._generated:
+                # The cohort has moved: earlier steps won't be delivered again (text stays in the response cache)
+                self._generated.clear()
+                self._generated[cursor] = self._render_step(cursor, plan, cohort_state, lesson, step)
+                self.generations += 1
+            return self._generated[cursor]
+
+    def _render_step(self, cursor: int, plan: dict, cohort_state: dict, lesson: dict, step: dict) -> Tuple[str, Optional[str]]:
+        with span("broadcast.generate", cohort=self.cohort_id, cursor=cursor):
+            # Placeholder name in, placeholder name out: one shared template
+            template = teacher_teach_step({"name": NAME_PLACEHOLDER}, plan, cohort_state, lesson, step)
+
+            audio_path = None
+            if self.with_audio:
+                digest = hashlib.sha1(template.encode("utf-8")).hexdigest()[:16]
+                wav = AUDIO_DIR / f"{digest}.wav"
+                # Same text -> same file, so restarts reuse audio already rendered
+                audio_path = str(wav) if wav.exists() else synthesize_to_wav(render(template, CLASS_NAME), str(wav))
+
+        return template, audio_path
+
+    def deliver_current_step(self) -> int:
+        """
+        Generate (once) and fan out the cohort's current step. Returns listeners reached.
+        """
+        plan, cohort_state, lesson, step = current_position(self.cohort_id)
+        cursor = cohort_state["cursor"]
+        template, audio_path = self._generate(cursor, plan, cohort_state, lesson, step)
+
+        with self._lock:
+            listeners = list(self._listeners.values())
+
+        with span("broadcast.fanout", cohort=self.cohort_id, listeners=len(listeners)):
+            for student, deliver in listeners:
+                name = student.get("name", "Student")
+                deliver(StepDelivery(self.cohort_id, cursor, render(template, name), audio_path))
+        return len(listeners)
+
+    def advance(self) -> None:
+        """
+        Move the whole cohort on one step (once, not once per student).
+        """
+        advance_step(self.cohort_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Broadcast the current lesson step to a cohort.")
+    parser.add_argument("--cohort", default="Year7_Maths_Term1")
+    parser.add_argument("--students", default="Student", help="Comma-separated names")
+    parser.add_argument("--no-audio", action="store_true")
+    parser.add_argument("--advance", action="store_true", help="Advance the cohort after delivering")
+    add_cli_flags(parser)
+    args = parser.parse_args()
+
+    enable_from_args(args)
+    configure_logging()
+    start_metrics()
+    start_compaction_from_env()
+    broadcaster = CohortBroadcaster(args.cohort, with_audio=not args.no_audio)
+    delivered: List[StepDelivery] = []
+    for name in [n.strip() for n in args.students.split(",") if n.strip()]:
+        broadcaster.connect({"name": name}, delivered.append)
+
+    with profile_turn():
+        n = broadcaster.deliver_current_step()
+    for d in delivered:
+        print(f"\n--- STEP {d.cursor + 1} -> {d.text.split(',')[0]} ---")
+        print(d.text)
+
+    # In a real room the shared audio plays once over the speakers
+    if delivered and delivered[0].audio_path:
+        play_wav(delivered[0].audio_path)
+
+    print(f"\nDelivered to {n} students with {broadcaster.generations} generation(s).")
+    if args.advance:
+        broadcaster.advance()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,37 @@
-import sys
-from app.rag_index import build_index
+import argparse
+
+from app.quantize import DTYPES
+from app.rag_index import build_ann, build_index, build_quantized
 
 def main():
-    if len(sys.argv) < 2:
-        print("Usage: python -m app.build_rag_index <PACK_ID>")
-        print("Example: python -m app.build_rag_index KS3_Maths")
-        raise SystemExit(1)
-
-    pack_id = sys.argv[1]
-    path = build_index(pack_id)
-    print(f"✅ Built index: {path}")
+    parser = argparse.ArgumentParser(
+        description="Build the embedding index for a curriculum pack.",
+        epilog="Example: python -m app.build_rag_index KS3_Maths --ann ivf --nlist 32 --quantize int8",
+    )
+    parser.add_argument("pack_id")
+    parser.add_argument("--ann", choices=["none", "ivf"], default="none", help="Also build an approximate index")
+    parser.add_argument("--nlist", type=int, default=None, help="IVF lists (default: ~sqrt(chunks))")
+    parser.add_argument("--iters", type=int, default=12, help="k-means iterations")
+    parser.add_argument("--quantize", choices=DTYPES[1:], help="Also store the embeddings as float16 / int8")
+    parser.add_argument("--no-rerank-copy", action="store_true", help="With --quantize: skip the float32 re-rank copy")
+    parser.add_argument(
+        "--reuse-embeddings",
+        action="store_true",
+        help="Skip re-embedding; only rebuild the ANN / quantized indexes from the existing one",
+    )
+    args = parser.parse_args()
+
+    if not args.reuse_embeddings:
+        path = build_index(args.pack_id)
+        print(f"✅ Built index: {path}")
+
+    if args.ann == "ivf":
+        path = build_ann(args.pack_id, nlist=args.nlist, iters=args.iters)
+        print(f"✅ Built IVF index: {path} (tune recall/latency at query time with RAG_NPROBE)")
+
+    if args.quantize:
+        path = build_quantized(args.pack_id, dtype=args.quantize, keep_full=not args.no_rerank_copy)
+        print(f"✅ Built {args.quantize} index: {path}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,21 @@
+import argparse
+
+from app.step_context import MODES, build_step_context
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Precompute curriculum context for every step of a lesson plan.",
+        epilog="Example: python -m app.build_step_context Year7_Maths_Term1 --mode hybrid",
+    )
+    parser.add_argument("cohort_id")
+    parser.add_argument("--mode", choices=MODES, default="keyword", help="semantic/hybrid need a built RAG index")
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--max-chunk-chars", type=int, default=900)
+    parser.add_argument("--pack", default=None, help="Curriculum pack (default: picked from the plan's subject/year)")
+    args = parser.parse_args()
+
+    path = build_step_context(args.cohort_id, args.mode, args.top_k, args.max_chunk_chars, pack_id=args.pack)
+    print(f"✅ Built step context: {path}")
+
+if __name__ == "__main__":
+    main()
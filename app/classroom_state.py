@@ -1,53 +1,186 @@
+"""
+Cohort progression as a per-cohort append-only event log.
+
+    data/cohorts/<cohort_id>/events.jsonl   one line per advance/rewind/reset/jump
+    data/cohorts/<cohort_id>/snapshot.json  position + log offset, rewritten every SNAPSHOT_EVERY events
+
+Reads never write. A restart replays only the log tail after the last snapshot,
+and an in-process cache means a read is usually a single stat() call. Each cohort
+has its own files, so cohorts never contend with each other; writers to the same
+cohort (several worker processes) serialize on a per-cohort file lock.
+"""
+
 import json
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Tuple
 
-from app.lesson_plan import load_plan, get_lesson, get_step
+from app.file_lock import file_lock
+from app.metrics import STATE_WRITE_BYTES
+from app.plan_cursor import CompiledPlan, get_compiled_plan
+from app.tracing import traced
 
 
+# Legacy single-file state (read once to seed cohorts that have no event log yet)
 STATE_PATH = Path("data/classroom_state.json")
+COHORTS_DIR = Path("data/cohorts")
+
+SNAPSHOT_EVERY = 50
+
+# Events after which anything precomputed for "the next step" is no longer useful
+_DISCONTINUOUS = ("reset", "jump")
+
+# cohort_id -> {"position": dict|None, "seq": int, "offset": int, "since_snapshot": int,
+#               "jump_seq": int (seq of the last reset/jump)}
+_CACHE: Dict[str, Dict[str, Any]] = {}
+
+
+def _utc_now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
 
 
-def _ensure_data_dir() -> None:
-    STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+def _log_path(cohort_id: str) -> Path:
+    return COHORTS_DIR / cohort_id / "events.jsonl"
 
 
-def _load_state() -> Dict[str, Any]:
-    _ensure_data_dir()
+def _snapshot_path(cohort_id: str) -> Path:
+    return COHORTS_DIR / cohort_id / "snapshot.json"
+
+
+def _legacy_position(cohort_id: str) -> Optional[Dict[str, Any]]:
     if not STATE_PATH.exists():
-        return {"cohorts": {}}
-    return json.loads(STATE_PATH.read_text(encoding="utf-8"))
+        return None
+    state = json.loads(STATE_PATH.read_text(encoding="utf-8"))
+    return state.get("cohorts", {}).get(cohort_id)
+
+
+def _read_snapshot(cohort_id: str) -> Optional[Dict[str, Any]]:
+    path = _snapshot_path(cohort_id)
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _write_snapshot(cohort_id: str, st: Dict[str, Any]) -> None:
+    snap = {"seq": st["seq"], "offset": st["offset"], "position": st["position"], "ts": _utc_now_iso()}
+    path = _snapshot_path(cohort_id)
+    tmp = path.with_suffix(".tmp")
+    data = json.dumps(snap, indent=2).encode("utf-8")
+    tmp.write_bytes(data)
+    tmp.replace(path)
+    STATE_WRITE_BYTES.inc(len(data), store="cohort_snapshot")
+
 
+@traced("state.load")
+def _replay(cohort_id: str) -> Dict[str, Any]:
+    """
+    Current cohort state from cache + whatever the log gained since we last looked.
+    """
+    log = _log_path(cohort_id)
+    size = log.stat().st_size if log.exists() else 0
+
+    st = _CACHE.get(cohort_id)
+    if st is not None and st["offset"] == size:
+        return st
+
+    if st is None or st["offset"] > size:
+        snap = _read_snapshot(cohort_id)
+        if snap is not None and snap["offset"] <= size:
+            # Snapshots don't record the last jump; assume it was at the snapshot (safe side)
+            st = {"position": snap["position"], "seq": snap["seq"], "offset": snap["offset"], "since_snapshot": 0,
+                  "jump_seq": snap["seq"]}
+        else:
+            st = {"position": _legacy_position(cohort_id), "seq": 0, "offset": 0, "since_snapshot": 0, "jump_seq": 0}
+
+    if size > st["offset"]:
+        with log.open("rb") as f:
+            f.seek(st["offset"])
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # half-written line from a crash; ignore until completed
+                ev = json.loads(line)
+                st["position"] = ev["position"]
+                st["seq"] = ev["seq"]
+                if ev["type"] in _DISCONTINUOUS:
+                    st["jump_seq"] = ev["seq"]
+                st["offset"] += len(line)
+                st["since_snapshot"] += 1
+
+    _CACHE[cohort_id] = st
+    return st
+
+
+@traced("state.append")
+def _append(cohort_id: str, event_type: str, position: Dict[str, int], **extra: Any) -> None:
+    st = _replay(cohort_id)
+    event = {"seq": st["seq"] + 1, "ts": _utc_now_iso(), "type": event_type, "position": position, **extra}
+    line = (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+
+    log = _log_path(cohort_id)
+    log.parent.mkdir(parents=True, exist_ok=True)
+    with log.open("ab") as f:
+        f.write(line)
+    STATE_WRITE_BYTES.inc(len(line), store="cohort_log")
+
+    st["position"] = position
+    st["seq"] = event["seq"]
+    if event_type in _DISCONTINUOUS:
+        st["jump_seq"] = event["seq"]
+    st["offset"] += len(line)
+    st["since_snapshot"] += 1
+    if st["since_snapshot"] >= SNAPSHOT_EVERY:
+        _write_snapshot(cohort_id, st)
+        st["since_snapshot"] = 0
+
+
+def _position(compiled: CompiledPlan, cursor: int) -> Dict[str, int]:
+    """
+    Stored cohort state: the flat cursor plus its (unit, lesson, step) coordinates
+    for anything that still reads the nested indices.
+    """
+    e = compiled.entry(cursor)
+    return {"cursor": e.index, "unit_idx": e.unit_idx, "lesson_idx": e.lesson_idx, "step_idx": e.step_idx}
 
-def _save_state(state: Dict[str, Any]) -> None:
-    _ensure_data_dir()
-    STATE_PATH.write_text(json.dumps(state, indent=2, ensure_ascii=False), encoding="utf-8")
+
+def _cursor_of(compiled: CompiledPlan, cohort: Optional[Dict[str, Any]]) -> int:
+    if not cohort:
+        return 0
+    if "cursor" in cohort:
+        return compiled.clamp(cohort["cursor"])
+    # Older state files only have the nested indices
+    return compiled.cursor_for(cohort.get("unit_idx", 0), cohort.get("lesson_idx", 0), cohort.get("step_idx", 0))
 
 
 def get_or_create_cohort_state(cohort_id: str) -> Dict[str, int]:
     """
-    Keeps track of where the class is: unit -> lesson -> step.
+    Keeps track of where the class is: a cursor into the compiled plan
+    (plus unit -> lesson -> step indices). Pure read: nothing is written.
     """
-    state = _load_state()
-    cohorts = state.setdefault("cohorts", {})
+    compiled = get_compiled_plan(cohort_id)
+    return _position(compiled, _cursor_of(compiled, _replay(cohort_id)["position"]))
+
 
-    if cohort_id not in cohorts:
-        cohorts[cohort_id] = {"unit_idx": 0, "lesson_idx": 0, "step_idx": 0}
+def _move(cohort_id: str, event_type: str, fn, **extra: Any) -> Dict[str, int]:
+    compiled = get_compiled_plan(cohort_id)
+    log = _log_path(cohort_id)
+    log.parent.mkdir(parents=True, exist_ok=True)
 
-    _save_state(state)
-    return cohorts[cohort_id]
+    # Read current position and append under one lock so no advance is lost
+    with file_lock(log):
+        cursor = _cursor_of(compiled, _replay(cohort_id)["position"])
+        position = _position(compiled, fn(compiled, cursor))
+        _append(cohort_id, event_type, position, **extra)
+    return position
 
 
 def reset_cohort(cohort_id: str) -> None:
     """
     Reset a cohort back to the first unit/lesson/step.
     """
-    state = _load_state()
-    cohorts = state.setdefault("cohorts", {})
-    cohorts[cohort_id] = {"unit_idx": 0, "lesson_idx": 0, "step_idx": 0}
-    _save_state(state)
+    _move(cohort_id, "reset", lambda compiled, cursor: 0)
 
 
+@traced("state.advance_step")
 def advance_step(cohort_id: str) -> None:
     """
     Advances in an orderly way:
@@ -56,61 +189,77 @@ def advance_step(cohort_id: str) -> None:
     end of lessons -> next unit
     end of units -> stay at final step (end)
     """
-    plan = load_plan(cohort_id)
-    units = plan.get("units", [])
-    if not units:
-        return
-
-    state = _load_state()
-    cohorts = state.setdefault("cohorts", {})
-    cohort = cohorts.get(cohort_id) or {"unit_idx": 0, "lesson_idx": 0, "step_idx": 0}
-
-    unit_idx = int(cohort.get("unit_idx", 0))
-    lesson_idx = int(cohort.get("lesson_idx", 0))
-    step_idx = int(cohort.get("step_idx", 0))
-
-    # Clamp indices safely
-    unit_idx = max(0, min(unit_idx, len(units) - 1))
-    lessons = units[unit_idx].get("lessons", [])
-    if not lessons:
-        return
-    lesson_idx = max(0, min(lesson_idx, len(lessons) - 1))
-
-    lesson = get_lesson(plan, unit_idx, lesson_idx)
-    steps = lesson.get("steps", [])
-    if not steps:
-        return
-    step_idx = max(0, min(step_idx, len(steps) - 1))
-
-    # If current step is an explicit "end", do not advance further
-    current_step = get_step(lesson, step_idx)
-    if current_step.get("type") == "end":
-        cohorts[cohort_id] = {"unit_idx": unit_idx, "lesson_idx": lesson_idx, "step_idx": step_idx}
-        _save_state(state)
-        return
-
-    # Move to next step if possible
-    if step_idx + 1 < len(steps):
-        step_idx += 1
-    else:
-        # Move to next lesson
-        if lesson_idx + 1 < len(lessons):
-            lesson_idx += 1
-            step_idx = 0
-        else:
-            # Move to next unit
-            if unit_idx + 1 < len(units):
-                unit_idx += 1
-                lesson_idx = 0
-                step_idx = 0
-            else:
-                # End of the entire plan: stay at final lesson final step
-                unit_idx = len(units) - 1
-                lessons = units[unit_idx].get("lessons", [])
-                lesson_idx = len(lessons) - 1 if lessons else 0
-                lesson = get_lesson(plan, unit_idx, lesson_idx)
-                steps = lesson.get("steps", [])
-                step_idx = len(steps) - 1 if steps else 0
-
-    cohorts[cohort_id] = {"unit_idx": unit_idx, "lesson_idx": lesson_idx, "step_idx": step_idx}
-    _save_state(state)
+    _move(cohort_id, "advance", lambda compiled, cursor: compiled.advance(cursor))
+
+
+def rewind_step(cohort_id: str) -> None:
+    """
+    Go back one step (across lesson/unit boundaries); stays on the first step.
+    """
+    _move(cohort_id, "rewind", lambda compiled, cursor: compiled.rewind(cursor))
+
+
+def jump_to_lesson(cohort_id: str, unit_idx: int, lesson_idx: int) -> None:
+    """
+    Move the cohort to the first step of a given lesson.
+    """
+    _move(
+        cohort_id,
+        "jump",
+        lambda compiled, cursor: compiled.jump_to_lesson(unit_idx, lesson_idx),
+        target={"unit_idx": unit_idx, "lesson_idx": lesson_idx},
+    )
+
+
+def get_progress_percent(cohort_id: str) -> float:
+    compiled = get_compiled_plan(cohort_id)
+    return compiled.progress_percent(_cursor_of(compiled, _replay(cohort_id)["position"]))
+
+
+def get_cohort_epoch(cohort_id: str) -> int:
+    """
+    Changes whenever the cohort is reset or jumps (plain advances/rewinds keep it).
+    """
+    return _replay(cohort_id)["jump_seq"]
+
+
+def get_cohort_history(cohort_id: str, since_seq: int = 0, event_type: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Events after since_seq (oldest first), optionally only one type.
+    """
+    log = _log_path(cohort_id)
+    if not log.exists():
+        return []
+    out = []
+    with log.open("rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            ev = json.loads(line)
+            if ev["seq"] <= since_seq:
+                continue
+            if event_type and ev["type"] != event_type:
+                continue
+            out.append(ev)
+    return out
+
+
+def compact_snapshot(cohort_id: str) -> None:
+    """
+    Force a snapshot now (e.g. before shutting down a worker).
+    """
+    with file_lock(_log_path(cohort_id)):
+        st = _replay(cohort_id)
+        if st["seq"]:
+            _write_snapshot(cohort_id, st)
+            st["since_snapshot"] = 0
+
+
+def current_position(cohort_id: str) -> Tuple[Dict[str, Any], Dict[str, int], Dict[str, Any], Dict[str, Any]]:
+    """
+    (plan, cohort_state, lesson, step) for the cohort, straight from the compiled plan.
+    """
+    compiled = get_compiled_plan(cohort_id)
+    cohort_state = get_or_create_cohort_state(cohort_id)
+    e = compiled.entry(cohort_state["cursor"])
+    return compiled.plan, cohort_state, e.lesson, e.step
@@ -6,6 +6,24 @@ load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+# Optional: point every OpenAI client somewhere else, e.g. the local stand-in
+# server for offline/load testing: OPENAI_BASE_URL=http://127.0.0.1:8089/v1
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+
+# Shared client tuning (see app/openai_client.py)
+OPENAI_TIMEOUT_S = float(os.getenv("OPENAI_TIMEOUT_S", "30"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "32"))
+OPENAI_BREAKER_FAILURES = int(os.getenv("OPENAI_BREAKER_FAILURES", "5"))
+OPENAI_BREAKER_COOLDOWN_S = float(os.getenv("OPENAI_BREAKER_COOLDOWN_S", "20"))
+# Send a backup Q&A request if the first has not answered after this long (0 = off)
+OPENAI_HEDGE_AFTER_S = float(os.getenv("OPENAI_HEDGE_AFTER_S", "2.5"))
+# Max concurrent requests per endpoint label
+OPENAI_CONCURRENCY = {
+    "chat": int(os.getenv("OPENAI_CHAT_CONCURRENCY", "16")),
+    "embeddings": int(os.getenv("OPENAI_EMBED_CONCURRENCY", "8")),
+}
+
 if not OPENAI_API_KEY:
     raise RuntimeError(
         "OPENAI_API_KEY not found. "
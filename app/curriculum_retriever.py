@@ -1,11 +1,17 @@
 import json
 import re
 from pathlib import Path
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Tuple
+
+from app.tracing import traced
 
 
 PACK_DIR = Path("curriculum_packs")
 
+# First-stage bonus for a lesson step's precomputed chunks: breaks ties in their
+# favour but never beats a chunk that matches one more query term
+SEED_BONUS = 0.5
+
 
 def _load_pack(pack_id: str) -> Dict[str, Any]:
     path = PACK_DIR / f"{pack_id}.json"
@@ -30,16 +36,24 @@ def _tokenize(text: str) -> List[str]:
     return [w for w in words if len(w) >= 3 and w not in stop]
 
 
+@traced("rag.keyword")
 def retrieve_curriculum_chunks(
     pack_id: str,
     query: str,
     top_k: int = 4,
     max_chunk_chars: int = 900,
+    objectives: Optional[List[str]] = None,
+    seed_ids: Optional[List[str]] = None,
 ) -> List[Dict[str, str]]:
     """
-    Keyword-based retrieval: score chunks by overlap with query tokens.
+    Keyword-based retrieval: score chunks by overlap with query tokens, then
+    re-rank a wider pool (app.rerank) and keep each chunk's best-matching window.
+    seed_ids (e.g. the lesson step's precomputed chunks) always join the pool, scored
+    on their own overlap plus SEED_BONUS.
     Returns list of {chunk_id, text}.
     """
+    from app.rerank import POOL_FACTOR, rerank  # rerank imports this module
+
     pack = _load_pack(pack_id)
     chunks = pack.get("chunks", [])
 
@@ -47,35 +61,72 @@ def retrieve_curriculum_chunks(
     if not q_tokens:
         return []
 
-    scored: List[Tuple[int, Dict[str, Any]]] = []
+    seeds = set(seed_ids or [])
+    scored: List[Tuple[float, Dict[str, Any]]] = []
+    seeded: List[Tuple[float, Dict[str, Any]]] = []
     for ch in chunks:
         text = ch.get("text", "")
         tokens = set(_tokenize(text))
         score = len(q_tokens.intersection(tokens))
-        if score > 0:
+        if ch.get("chunk_id") in seeds:
+            seeded.append((score + SEED_BONUS, ch))
+        elif score > 0:
             scored.append((score, ch))
 
+    scored.extend(seeded)
     scored.sort(key=lambda x: x[0], reverse=True)
-    top = [ch for _, ch in scored[:top_k]]
+    pool = scored[:top_k * POOL_FACTOR]
+    # Seeds cut by the pool size still get their chance in the re-rank
+    kept = {id(ch) for _, ch in pool}
+    pool.extend(item for item in seeded if id(item[1]) not in kept)
+    top = rerank(query, [ch for _, ch in pool], [s for s, _ in pool], objectives=objectives, top_k=top_k)
+    return _as_context(top, query, max_chunk_chars)
+
+
+def _as_context(chunks: List[Dict[str, Any]], query: str, max_chunk_chars: int) -> List[Dict[str, str]]:
+    from app.rerank import best_window
+
+    return [
+        {"chunk_id": ch.get("chunk_id", ""), "text": best_window(ch.get("text") or "", query, max_chunk_chars)}
+        for ch in chunks
+    ]
+
+
+def retrieve_for_student(
+    student: dict,
+    query: str,
+    objectives: Optional[List[str]] = None,
+    top_k: int = 4,
+    max_chunk_chars: int = 900,
+) -> List[Dict[str, str]]:
+    """
+    Keyword retrieval across every pack/shard routed for this student
+    (subject, year, lesson objectives), re-ranked. Returns list of {chunk_id, text}.
+    """
+    from app.pack_registry import get_registry  # registry imports this module
+    from app.rerank import POOL_FACTOR, rerank
 
-    out = []
-    for ch in top:
-        t = (ch.get("text") or "").strip()
-        if len(t) > max_chunk_chars:
-            t = t[: max_chunk_chars - 3] + "..."
-        out.append({"chunk_id": ch.get("chunk_id", ""), "text": t})
-    return out
+    pool = get_registry().search_scored(student, query, objectives=objectives, top_k=top_k * POOL_FACTOR)
+    top = rerank(query, [ch for _, ch in pool], [s for s, _ in pool], objectives=objectives, top_k=top_k)
+    return _as_context(top, query, max_chunk_chars)
 
 
 def pick_pack_id(student: dict) -> str:
     """
-    MVP pack selection:
+    Pack selection:
     - prefer explicit student['curriculum_pack']
-    - else choose based on subject + year band
+    - else the registry's best match for subject + year
+    - else the old KS3 subject mapping
     """
     if student.get("curriculum_pack"):
         return student["curriculum_pack"]
 
+    from app.pack_registry import get_registry
+
+    pack_id = get_registry().best_pack_id(student)
+    if pack_id:
+        return pack_id
+
     subject = (student.get("subject") or "").lower()
 
     # MVP: map Year 7/KS3 subjects to KS3 packs
@@ -0,0 +1,289 @@
+"""
+Local OpenAI-compatible stand-in server (offline dev, CI and load testing).
+
+Implements:
+- POST /v1/chat/completions  (normal + stream=true via server-sent events)
+- POST /v1/embeddings        (deterministic hash-based vectors)
+- GET  /v1/models
+
+Run:
+    python -m app.fake_openai_server --port 8089 --chat-latency lognormal:400:0.5
+
+Then point the app at it:
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1  OPENAI_API_KEY=local
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+DEFAULT_EMBED_DIM = 1536
+
+
+class Latency:
+    """
+    Latency distribution in milliseconds, parsed from a spec string:
+        const:200          -> always 200 ms
+        uniform:100:300    -> uniform between 100 and 300 ms
+        lognormal:400:0.5  -> median 400 ms, sigma 0.5 (long tail)
+    """
+
+    def __init__(self, spec: str = "const:0", seed: Optional[int] = None):
+        self.spec = spec
+        parts = spec.split(":")
+        self.kind = parts[0]
+        self.args = [float(x) for x in parts[1:]]
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+        expected = {"const": 1, "uniform": 2, "lognormal": 2}
+        if self.kind not in expected or len(self.args) != expected[self.kind]:
+            raise ValueError(f"Bad latency spec: {spec!r} (use const:MS, uniform:LO:HI, lognormal:MEDIAN:SIGMA)")
+
+    def sample_s(self) -> float:
+        with self._lock:
+            if self.kind == "const":
+                ms = self.args[0]
+            elif self.kind == "uniform":
+                ms = self._rng.uniform(self.args[0], self.args[1])
+            else:
+                ms = self.args[0] * math.exp(self._rng.gauss(0.0, self.args[1]))
+        return max(0.0, ms) / 1000.0
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+def hash_embedding(text: str, dim: int = DEFAULT_EMBED_DIM) -> List[float]:
+    """
+    Deterministic feature-hashed vector: texts sharing words get similar vectors,
+    so retrieval behaves plausibly without a real model.
+    """
+    vec = [0.0] * dim
+    for w in _words(text) or [""]:
+        h = hashlib.blake2b(w.encode("utf-8"), digest_size=8).digest()
+        idx = int.from_bytes(h[:4], "little") % dim
+        sign = 1.0 if h[4] & 1 else -1.0
+        vec[idx] += sign
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+
+def _approx_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+def fake_reply(messages: List[Dict[str, Any]]) -> str:
+    """
+    Deterministic teacher-ish reply. Honours 'Start your reply with: "X,"' so name
+    substitution downstream behaves like the real thing.
+    """
+    system = " ".join(str(m.get("content", "")) for m in messages if m.get("role") == "system")
+    user = " ".join(str(m.get("content", "")) for m in messages if m.get("role") == "user")
+
+    m = re.search(r'Start (?:your reply )?with: "([^"]+)"', system)
+    opener = m.group(1) if m else "Hello,"
+
+    digest = hashlib.sha1((system + "\n" + user).encode("utf-8")).hexdigest()[:8]
+    if user:
+        body = f"good question. You asked about {user.strip()[:80]}. Let's think it through step by step."
+    else:
+        body = "well done for being here. Let's carry on with our lesson step by step."
+    return f"{opener} {body} Now let's continue our lesson from where we stopped. (ref {digest})"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "FakeOpenAI/0.1"
+    protocol_version = "HTTP/1.1"
+
+    # set by make_server
+    chat_latency: Latency
+    embed_latency: Latency
+    token_interval_s: float
+
+    def log_message(self, fmt, *args):  # keep load tests quiet
+        pass
+
+    def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Dict[str, Any]:
+        n = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(n) or b"{}")
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [
+                {"id": "gpt-4o-mini", "object": "model", "owned_by": "local"},
+                {"id": "text-embedding-3-small", "object": "model", "owned_by": "local"},
+            ]})
+            return
+        self._send_json(404, {"error": {"message": f"Not found: {self.path}"}})
+
+    def do_POST(self):
+        try:
+            req = self._read_json()
+        except ValueError:
+            self._send_json(400, {"error": {"message": "Invalid JSON"}})
+            return
+
+        path = self.path.rstrip("/")
+        if path.endswith("/chat/completions"):
+            self._chat(req)
+        elif path.endswith("/embeddings"):
+            self._embeddings(req)
+        else:
+            self._send_json(404, {"error": {"message": f"Not found: {self.path}"}})
+
+    def _chat(self, req: Dict[str, Any]) -> None:
+        messages = req.get("messages", [])
+        model = req.get("model", "gpt-4o-mini")
+        text = fake_reply(messages)
+        created = int(time.time())
+        cid = "chatcmpl-" + hashlib.sha1(f"{created}{text}{random.random()}".encode()).hexdigest()[:20]
+        prompt_tokens = sum(_approx_tokens(str(m.get("content", ""))) for m in messages)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": _approx_tokens(text),
+            "total_tokens": prompt_tokens + _approx_tokens(text),
+            "prompt_tokens_details": {"cached_tokens": 0},
+        }
+
+        time.sleep(self.chat_latency.sample_s())
+
+        if not req.get("stream"):
+            self._send_json(200, {
+                "id": cid,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": text},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        def _event(delta: Dict[str, Any], finish: Optional[str] = None) -> None:
+            chunk = {
+                "id": cid,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        _event({"role": "assistant", "content": ""})
+        for piece in re.findall(r"\S+\s*", text):
+            if self.token_interval_s:
+                time.sleep(self.token_interval_s)
+            _event({"content": piece})
+        _event({}, finish="stop")
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+    def _embeddings(self, req: Dict[str, Any]) -> None:
+        inputs = req.get("input", "")
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        dim = int(req.get("dimensions") or DEFAULT_EMBED_DIM)
+
+        time.sleep(self.embed_latency.sample_s())
+
+        self._send_json(200, {
+            "object": "list",
+            "model": req.get("model", "text-embedding-3-small"),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": hash_embedding(str(t), dim)}
+                for i, t in enumerate(inputs)
+            ],
+            "usage": {
+                "prompt_tokens": sum(_approx_tokens(str(t)) for t in inputs),
+                "total_tokens": sum(_approx_tokens(str(t)) for t in inputs),
+            },
+        })
+
+
+def make_server(
+    host: str = "127.0.0.1",
+    port: int = 8089,
+    chat_latency: str = "const:0",
+    embed_latency: str = "const:0",
+    token_interval_ms: float = 0.0,
+    seed: Optional[int] = None,
+) -> ThreadingHTTPServer:
+    """
+    Build (but do not start) a stand-in server. port=0 picks a free port.
+    """
+    handler = type("Handler", (_Handler,), {
+        "chat_latency": Latency(chat_latency, seed),
+        "embed_latency": Latency(embed_latency, seed),
+        "token_interval_s": token_interval_ms / 1000.0,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_in_background(**kwargs) -> ThreadingHTTPServer:
+    """
+    Start a stand-in server on a daemon thread; returns the server (see server.server_address).
+    """
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stand-in server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--chat-latency", default="lognormal:400:0.4", help="const:MS | uniform:LO:HI | lognormal:MEDIAN:SIGMA")
+    parser.add_argument("--embed-latency", default="lognormal:80:0.3")
+    parser.add_argument("--token-interval-ms", type=float, default=15.0, help="Delay between streamed tokens")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    server = make_server(
+        host=args.host,
+        port=args.port,
+        chat_latency=args.chat_latency,
+        embed_latency=args.embed_latency,
+        token_interval_ms=args.token_interval_ms,
+        seed=args.seed,
+    )
+    host, port = server.server_address[:2]
+    print(f"Fake OpenAI server on http://{host}:{port}/v1 (chat={args.chat_latency}, embed={args.embed_latency})")
+    print(f"Use: OPENAI_BASE_URL=http://{host}:{port}/v1 OPENAI_API_KEY=local")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
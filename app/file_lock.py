@@ -0,0 +1,142 @@
+"""
+Cross-process safety for the JSON files in data/.
+
+- file_lock(path): advisory exclusive lock on <path>.lock (fcntl, msvcrt on Windows)
+  with a timeout
+- update_json(path, default, fn): optimistic read-modify-write. The file carries a
+  "_version" counter; the write only lands if nobody bumped it since our read,
+  otherwise we re-read and retry.
+"""
+
+import json
+import os
+import random
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Tuple
+
+from app.metrics import STATE_WRITE_BYTES
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+DEFAULT_TIMEOUT_S = 10.0
+DEFAULT_RETRIES = 8
+
+
+class LockTimeout(TimeoutError):
+    pass
+
+
+class VersionConflict(RuntimeError):
+    pass
+
+
+def _try_lock(fd: int) -> bool:
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+
+def _unlock(fd: int) -> None:
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def file_lock(path: Path, timeout: float = DEFAULT_TIMEOUT_S) -> Iterator[None]:
+    """
+    Hold an exclusive advisory lock for `path` (via a sibling .lock file).
+    Raises LockTimeout if it cannot be taken within `timeout` seconds.
+    """
+    lock_path = Path(str(path) + ".lock")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        deadline = time.monotonic() + timeout
+        delay = 0.001
+        while not _try_lock(fd):
+            if time.monotonic() >= deadline:
+                raise LockTimeout(f"Could not lock {path} within {timeout}s")
+            time.sleep(delay)
+            delay = min(delay * 2, 0.05)
+        try:
+            yield
+        finally:
+            _unlock(fd)
+    finally:
+        os.close(fd)
+
+
+def read_json_versioned(path: Path, default: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    """
+    (data, version). A missing file is (copy of default, 0).
+    """
+    if not path.exists():
+        return json.loads(json.dumps(default)), 0
+    data = json.loads(path.read_text(encoding="utf-8"))
+    return data, int(data.get("_version", 0))
+
+
+def _write_atomic(path: Path, data: Dict[str, Any], indent: int = 2) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    blob = json.dumps(data, indent=indent, ensure_ascii=False).encode("utf-8")
+    tmp.write_bytes(blob)
+    os.replace(tmp, path)
+    STATE_WRITE_BYTES.inc(len(blob), store=path.stem)
+
+
+def write_json_if_version(path: Path, data: Dict[str, Any], expected_version: int, timeout: float = DEFAULT_TIMEOUT_S) -> int:
+    """
+    Write data only if the file is still at expected_version. Returns the new version.
+    """
+    with file_lock(path, timeout=timeout):
+        _, current = read_json_versioned(path, {})
+        if current != expected_version:
+            raise VersionConflict(f"{path} is at version {current}, expected {expected_version}")
+        data["_version"] = expected_version + 1
+        _write_atomic(path, data)
+        return data["_version"]
+
+
+def update_json(
+    path: Path,
+    default: Dict[str, Any],
+    fn: Callable[[Dict[str, Any]], Any],
+    retries: int = DEFAULT_RETRIES,
+    timeout: float = DEFAULT_TIMEOUT_S,
+) -> Any:
+    """
+    Optimistic read-modify-write: fn mutates the loaded data in place and may return
+    a value (passed back to the caller). fn may run more than once on conflicts, so it
+    should only touch the data it is given. After `retries` conflicts the last attempt
+    runs entirely under the lock so heavy contention still makes progress.
+    """
+    for attempt in range(retries):
+        data, version = read_json_versioned(path, default)
+        result = fn(data)
+        try:
+            write_json_if_version(path, data, version, timeout=timeout)
+            return result
+        except VersionConflict:
+            time.sleep(random.uniform(0, 0.002 * (2 ** attempt)))
+
+    with file_lock(path, timeout=timeout):
+        data, version = read_json_versioned(path, default)
+        result = fn(data)
+        data["_version"] = version + 1
+        _write_atomic(path, data)
+        return result
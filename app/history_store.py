@@ -0,0 +1,291 @@
+"""
+Long-term, append-only Q&A history per student.
+
+    data/history/<student>/<YYYY-MM>.seg   one segment per month
+    data/history/<student>/stats.json      per-topic rollup of compacted months
+
+A segment is a sequence of records: 4-byte little-endian length + zlib-compressed
+JSON. Appends never rewrite anything, every record is compressed, and readers walk
+a segment through mmap without loading it into memory.
+
+Months older than KEEP_RAW_MONTHS are compacted into per-topic statistics (counts,
+first/last seen, frequent terms, a few example questions) and their raw segment is
+removed, so storage per learner stays bounded over years. A student's old months
+are compacted when their first record of a new month is written; students who
+stop asking are covered by the periodic sweep (TEACHER_HISTORY_COMPACT_S > 0).
+"""
+
+import heapq
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import struct
+import threading
+import zlib
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.curriculum_retriever import _tokenize
+from app.file_lock import file_lock, update_json
+from app.metrics import STATE_WRITE_BYTES
+from app.tracing import traced
+
+HISTORY_DIR = Path("data/history")
+
+KEEP_RAW_MONTHS = 6
+
+# Seconds between compact_all() sweeps started by start_compaction_from_env (0 = off)
+COMPACT_INTERVAL_S = float(os.getenv("TEACHER_HISTORY_COMPACT_S", "0"))
+_LEN = struct.Struct("<I")
+
+# Bounds for fetch_relevant(): it never looks at more than this
+MAX_SCAN_SEGMENTS = 6
+MAX_SCAN_RECORDS = 5000
+
+# Recency half-life used when ranking past interactions
+RECENCY_HALF_LIFE_DAYS = 60.0
+
+# Lesson steps are logged as pseudo-questions with this prefix; they are not
+# something the student asked, so recall skips them
+LESSON_STEP_PREFIX = "[LESSON_STEP]"
+
+log = logging.getLogger(__name__)
+
+
+def _student_dir(name: str) -> Path:
+    slug = re.sub(r"[^A-Za-z0-9_-]+", "_", name.strip()) or "_"
+    return HISTORY_DIR / slug
+
+
+def _month_key(ts: datetime) -> str:
+    return ts.strftime("%Y-%m")
+
+
+def _segments(name: str) -> List[Path]:
+    """
+    Segment files, oldest month first.
+    """
+    d = _student_dir(name)
+    if not d.exists():
+        return []
+    return sorted(d.glob("*.seg"))
+
+
+@traced("history.append")
+def append_interaction(
+    name: str,
+    question: str,
+    answer: str,
+    topic: Optional[str] = None,
+    ts: Optional[datetime] = None,
+) -> None:
+    now = datetime.now(timezone.utc)
+    ts = ts or now
+    rec = {"ts": ts.isoformat(timespec="seconds"), "q": question.strip(), "a": answer.strip(), "topic": topic or ""}
+    blob = zlib.compress(json.dumps(rec, ensure_ascii=False).encode("utf-8"), 6)
+
+    path = _student_dir(name) / f"{_month_key(ts)}.seg"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with file_lock(path):
+        with path.open("ab") as f:
+            new_month = f.tell() == 0
+            f.write(_LEN.pack(len(blob)) + blob)
+    STATE_WRITE_BYTES.inc(_LEN.size + len(blob), store="history")
+
+    if new_month and _month_key(ts) == _month_key(now):
+        # A month just rolled over for this student: older months may now be due
+        # (backfilled records for past months don't trigger it)
+        try:
+            compact_student(name)
+        except Exception as e:
+            log.warning("history compaction failed for %s: %s", name, e)
+
+
+def _iter_segment(path: Path, newest_first: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    Records of one segment in append order (or reversed), read via mmap. Reversed
+    order walks the length headers once, then decompresses records newest first.
+    """
+    size = path.stat().st_size
+    if size == 0:
+        return
+    with path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        spans: List[Tuple[int, int]] = []
+        pos = 0
+        while pos + _LEN.size <= size:
+            (n,) = _LEN.unpack_from(mm, pos)
+            start = pos + _LEN.size
+            if start + n > size:
+                break  # torn write at the tail
+            if newest_first:
+                spans.append((start, n))
+            else:
+                yield json.loads(zlib.decompress(mm[start:start + n]))
+            pos = start + n
+        for start, n in reversed(spans):
+            yield json.loads(zlib.decompress(mm[start:start + n]))
+
+
+def iter_history(name: str, newest_first: bool = True) -> Iterator[Dict[str, Any]]:
+    segs = _segments(name)
+    if newest_first:
+        for seg in reversed(segs):
+            yield from _iter_segment(seg, newest_first=True)
+    else:
+        for seg in segs:
+            yield from _iter_segment(seg)
+
+
+@traced("history.fetch_relevant")
+def fetch_relevant(
+    name: str,
+    question: str,
+    n: int = 5,
+    max_segments: int = MAX_SCAN_SEGMENTS,
+    max_records: int = MAX_SCAN_RECORDS,
+) -> List[Dict[str, Any]]:
+    """
+    N past interactions most relevant to `question`: term overlap weighted by recency.
+    Lesson-step records are skipped. Scans newest first, at most max_segments recent
+    months and max_records records (bounded time).
+    """
+    q_tokens = set(_tokenize(question))
+    if not q_tokens:
+        return []
+
+    now = datetime.now(timezone.utc)
+    heap: List[Tuple[float, int, Dict[str, Any]]] = []
+    seen = 0
+
+    for seg in reversed(_segments(name)[-max_segments:]):
+        for rec in _iter_segment(seg, newest_first=True):
+            seen += 1
+            lesson_step = rec["q"].startswith(LESSON_STEP_PREFIX)
+            overlap = len(q_tokens.intersection(_tokenize(rec["q"] + " " + rec.get("topic", ""))))
+            if overlap and not lesson_step:
+                try:
+                    age_days = (now - datetime.fromisoformat(rec["ts"])).total_seconds() / 86400.0
+                except ValueError:
+                    age_days = 0.0
+                score = overlap * math.pow(0.5, max(0.0, age_days) / RECENCY_HALF_LIFE_DAYS)
+                item = (score, -seen, rec)  # ties go to the newer record
+                if len(heap) < n:
+                    heapq.heappush(heap, item)
+                elif item[:2] > heap[0][:2]:
+                    heapq.heapreplace(heap, item)
+            if seen >= max_records:
+                break
+        if seen >= max_records:
+            break
+
+    return [rec for _, _, rec in sorted(heap, key=lambda x: (x[0], x[1]), reverse=True)]
+
+
+def recall_from_history(name: str, question: str, k: int = 3) -> List[Dict[str, Any]]:
+    """
+    fetch_relevant() shaped like student_recall results ({"ts", "q", "a_short"}).
+    """
+    out = []
+    for rec in fetch_relevant(name, question, n=k):
+        a_short = rec.get("a", "").replace("\n", " ")
+        if len(a_short) > 180:
+            a_short = a_short[:177] + "..."
+        out.append({"ts": rec["ts"], "q": rec["q"], "a_short": a_short})
+    return out
+
+
+def load_topic_stats(name: str) -> Dict[str, Any]:
+    path = _student_dir(name) / "stats.json"
+    if not path.exists():
+        return {"topics": {}, "compacted_months": []}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _months_ago(month: str, now: datetime) -> int:
+    y, m = (int(x) for x in month.split("-"))
+    return (now.year - y) * 12 + (now.month - m)
+
+
+@traced("history.compact")
+def compact_student(name: str, keep_raw_months: int = KEEP_RAW_MONTHS, now: Optional[datetime] = None) -> int:
+    """
+    Roll raw months older than keep_raw_months into stats.json. Returns months compacted.
+    """
+    now = now or datetime.now(timezone.utc)
+    old = [seg for seg in _segments(name) if _months_ago(seg.stem, now) > keep_raw_months]
+    if not old:
+        return 0
+
+    stats_path = _student_dir(name) / "stats.json"
+    for seg in old:
+        with file_lock(seg):
+            records = list(_iter_segment(seg))
+
+        def _apply(stats: Dict[str, Any]) -> None:
+            if seg.stem in stats["compacted_months"]:
+                return  # another worker already did this month
+            for rec in records:
+                topic = rec.get("topic") or "general"
+                t = stats["topics"].setdefault(
+                    topic, {"count": 0, "first": rec["ts"], "last": rec["ts"], "terms": {}, "examples": []}
+                )
+                t["count"] += 1
+                t["first"] = min(t["first"], rec["ts"])
+                t["last"] = max(t["last"], rec["ts"])
+                terms = Counter(t["terms"])
+                terms.update(_tokenize(rec["q"]))
+                t["terms"] = dict(terms.most_common(20))
+                if len(t["examples"]) < 3:
+                    t["examples"].append(rec["q"])
+            stats["compacted_months"].append(seg.stem)
+
+        update_json(stats_path, {"topics": {}, "compacted_months": []}, _apply)
+        with file_lock(seg):
+            seg.unlink(missing_ok=True)
+
+    return len(old)
+
+
+def compact_all(keep_raw_months: int = KEEP_RAW_MONTHS) -> int:
+    if not HISTORY_DIR.exists():
+        return 0
+    total = 0
+    for d in HISTORY_DIR.iterdir():
+        if d.is_dir():
+            # The directory name is already the slug, which maps back to itself
+            total += compact_student(d.name, keep_raw_months)
+    return total
+
+
+def start_background_compaction(interval_s: float = 3600.0) -> threading.Event:
+    """
+    Run compact_all() now and then every interval_s on a daemon thread. Set the
+    returned event to stop.
+    """
+    stop = threading.Event()
+
+    def _loop() -> None:
+        while True:
+            try:
+                compact_all()
+            except Exception as e:  # keep the worker alive; try again next round
+                log.warning("history compaction failed: %s", e)
+            if stop.wait(interval_s):
+                return
+
+    threading.Thread(target=_loop, name="history-compaction", daemon=True).start()
+    return stop
+
+
+def start_compaction_from_env() -> Optional[threading.Event]:
+    """
+    start_background_compaction(TEACHER_HISTORY_COMPACT_S) if it is set (entry points call this).
+    """
+    if COMPACT_INTERVAL_S <= 0:
+        return None
+    return start_background_compaction(COMPACT_INTERVAL_S)
@@ -2,9 +2,12 @@ import json
 from pathlib import Path
 from typing import Dict, Any
 
+from app.tracing import traced
+
 PLANS_DIR = Path("lesson_plans")
 
 
+@traced("plan.load")
 def load_plan(cohort_id: str) -> Dict[str, Any]:
     path = PLANS_DIR / f"{cohort_id}.json"
     if not path.exists():
@@ -0,0 +1,130 @@
+"""
+Load generator: drives N simulated classrooms through the teacher pipeline and
+reports p50/p95/p99 turn latency and throughput.
+
+Offline (spawns the local stand-in server in-process):
+    python -m app.load_test --classrooms 20 --students 5 --turns 3 --spawn-server
+
+Against an already running server / real API, set OPENAI_BASE_URL and omit --spawn-server.
+"""
+
+import argparse
+import math
+import os
+import threading
+import time
+from typing import Dict, List
+
+from app.profiling import add_cli_flags, enable_from_args, profile_turn
+
+
+def percentile(values: List[float], p: float) -> float:
+    """
+    Nearest-rank percentile (p in 0..100). Returns 0.0 for an empty list.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100.0 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+QUESTIONS = [
+    "What is a fraction?",
+    "Why is the bottom number called the denominator?",
+    "Is three eighths bigger than one quarter?",
+    "How do I simplify a fraction?",
+]
+
+
+def _run_classroom(idx: int, cohort_id: str, students: int, turns: int, use_cache: bool, out: List[float]) -> None:
+    from app.plan_cursor import get_compiled_plan
+    from app.teacher_openai import teacher_welcome, teacher_teach_step, teacher_answer_question_and_resume
+
+    compiled = get_compiled_plan(cohort_id)
+    plan = compiled.plan
+    n_steps = max(1, len(compiled.entry(compiled.jump_to_lesson(0, 0)).lesson.get("steps", [])))
+
+    for t in range(turns):
+        e = compiled.entry(compiled.cursor_for(0, 0, t % n_steps))
+        cohort_state = {"cursor": e.index, "unit_idx": e.unit_idx, "lesson_idx": e.lesson_idx, "step_idx": e.step_idx}
+        lesson, step = e.lesson, e.step
+        for s in range(students):
+            student = {"name": f"Student{idx}_{s}", "subject": plan.get("subject", "Maths")}
+            question = QUESTIONS[(idx + s + t) % len(QUESTIONS)]
+
+            t0 = time.perf_counter()
+            with profile_turn():
+                teacher_welcome(student, plan, cohort_state, lesson, use_cache=use_cache)
+                teacher_answer_question_and_resume(student, plan, cohort_state, lesson, step, question)
+                teacher_teach_step(student, plan, cohort_state, lesson, step, use_cache=use_cache)
+            out.append(time.perf_counter() - t0)
+
+
+def run_load(classrooms: int, students: int, turns: int, cohort_id: str, use_cache: bool = False) -> Dict[str, float]:
+    latencies: List[float] = []
+    threads = [
+        threading.Thread(target=_run_classroom, args=(i, cohort_id, students, turns, use_cache, latencies))
+        for i in range(classrooms)
+    ]
+
+    t0 = time.perf_counter()
+    for th in threads:
+        th.start()
+    for th in threads:
+        th.join()
+    wall = time.perf_counter() - t0
+
+    return {
+        "turns": len(latencies),
+        "wall_s": wall,
+        "throughput_turns_per_s": len(latencies) / wall if wall else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated classroom load test.")
+    parser.add_argument("--classrooms", type=int, default=10)
+    parser.add_argument("--students", type=int, default=5, help="Students per classroom")
+    parser.add_argument("--turns", type=int, default=3, help="Turns per student")
+    parser.add_argument("--cohort", default="Year7_Maths_Term1")
+    parser.add_argument("--use-cache", action="store_true", help="Allow response cache for welcome/teach step")
+    parser.add_argument("--spawn-server", action="store_true", help="Start the local stand-in server in-process")
+    parser.add_argument("--chat-latency", default="lognormal:400:0.4")
+    parser.add_argument("--embed-latency", default="lognormal:80:0.3")
+    add_cli_flags(parser)
+    args = parser.parse_args()
+
+    from app.history_store import start_compaction_from_env
+    from app.log_setup import configure_logging
+    from app.metrics import start_from_env as start_metrics
+
+    enable_from_args(args)
+    configure_logging()
+    start_metrics()
+    start_compaction_from_env()
+
+    if args.spawn_server:
+        from app.fake_openai_server import start_in_background
+
+        server = start_in_background(port=0, chat_latency=args.chat_latency, embed_latency=args.embed_latency)
+        host, port = server.server_address[:2]
+        # Must be set before app.teacher_openai creates its client
+        os.environ["OPENAI_BASE_URL"] = f"http://{host}:{port}/v1"
+        os.environ.setdefault("OPENAI_API_KEY", "local")
+        print(f"Stand-in server: {os.environ['OPENAI_BASE_URL']}")
+
+    res = run_load(args.classrooms, args.students, args.turns, args.cohort, use_cache=args.use_cache)
+
+    print("\n--- LOAD TEST ---")
+    print(f"classrooms={args.classrooms} students={args.students} turns={args.turns}")
+    print(f"turns completed: {res['turns']} in {res['wall_s']:.2f}s")
+    print(f"throughput: {res['throughput_turns_per_s']:.2f} turns/s")
+    print(f"latency p50={res['p50_ms']:.0f}ms p95={res['p95_ms']:.0f}ms p99={res['p99_ms']:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Structured, levelled, sampled logging for the app's entry points.
+
+    TEACHER_LOG_LEVEL=INFO                       # DEBUG shows per-chunk TTS, per-match voice ID, ...
+    TEACHER_LOG_FORMAT=text | json               # json: one object per line
+    TEACHER_LOG_SAMPLE=app.tts_local=0.1,app.voice_id=0.5
+                                                 # keep this fraction of a logger's records below WARNING
+
+Fields passed as `extra=` show up as key=value pairs (text) or as keys (json):
+    log.info("voice match", extra={"speaker": name, "score": 0.82})
+"""
+
+import json
+import logging
+import os
+import random
+import sys
+from typing import Dict, Optional
+
+# Attributes every LogRecord has; anything else came in through extra=
+_STANDARD = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+
+def _fields(record: logging.LogRecord) -> Dict[str, object]:
+    return {k: v for k, v in vars(record).items() if k not in _STANDARD and not k.startswith("_")}
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s: %(message)s", "%H:%M:%S")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = _fields(record)
+        if fields:
+            line += "  " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **_fields(record),
+        }
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, default=str, ensure_ascii=False)
+
+
+class SampleFilter(logging.Filter):
+    """
+    Keep a fraction of records below WARNING for the configured logger prefixes.
+    Warnings and errors always pass.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        # Longest prefix wins
+        self.rates = sorted(rates.items(), key=lambda kv: -len(kv[0]))
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        for prefix, rate in self.rates:
+            if record.name == prefix or record.name.startswith(prefix + "."):
+                return rate >= 1.0 or random.random() < rate
+        return True
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    rates = {}
+    for part in spec.split(","):
+        if "=" in part:
+            name, rate = part.split("=", 1)
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+_configured = False
+
+
+def configure_logging(level: Optional[str] = None, fmt: Optional[str] = None, sample: Optional[str] = None) -> None:
+    """
+    Set up the root logger once per process (arguments override the env vars).
+    """
+    global _configured
+    if _configured:
+        return
+    _configured = True
+
+    level = (level or os.getenv("TEACHER_LOG_LEVEL", "INFO")).upper()
+    fmt = fmt or os.getenv("TEACHER_LOG_FORMAT", "text")
+    sample = sample if sample is not None else os.getenv("TEACHER_LOG_SAMPLE", "")
+
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    rates = parse_sample_rates(sample)
+    if rates:
+        handler.addFilter(SampleFilter(rates))
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+    # Third-party clients are chatty at INFO (one line per HTTP request)
+    for noisy in ("httpx", "httpcore", "openai", "urllib3"):
+        logging.getLogger(noisy).setLevel(max(logging.WARNING, root.level))
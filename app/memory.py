@@ -1,7 +1,12 @@
+import heapq
 import json
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.file_lock import update_json
+from app.history_store import append_interaction
+from app.tracing import traced
 
 DB_PATH = Path("data/progress_db.json")
 
@@ -14,6 +19,7 @@ def _ensure_data_dir() -> None:
     Path("data").mkdir(parents=True, exist_ok=True)
 
 
+@traced("memory.load")
 def _load_db() -> Dict[str, Any]:
     _ensure_data_dir()
     if not DB_PATH.exists():
@@ -21,54 +27,140 @@ def _load_db() -> Dict[str, Any]:
     return json.loads(DB_PATH.read_text(encoding="utf-8"))
 
 
-def _save_db(db: Dict[str, Any]) -> None:
-    _ensure_data_dir()
-    DB_PATH.write_text(json.dumps(db, indent=2, ensure_ascii=False), encoding="utf-8")
-
-
-def get_student_memory(name: str) -> Dict[str, Any]:
+@traced("memory.save")
+def _update_db(fn: Callable[[Dict[str, Any]], Any]) -> Any:
     """
-    Returns a memory object for a student (creates one if missing).
+    Read-modify-write of the progress DB that is safe across worker processes.
+    fn mutates the db in place (and may run again on a version conflict).
     """
-    db = _load_db()
+    _ensure_data_dir()
+    return update_json(DB_PATH, {"students": {}}, fn)
+
+
+def _new_student(name: str) -> Dict[str, Any]:
+    return {
+        "name": name,
+        "created_at": _utc_now_iso(),
+        "last_seen_at": _utc_now_iso(),
+        "topics": {},              # topic -> {"asked": int, "last": iso, "notes": str}
+        "misconceptions": [],      # list[str]
+        "strengths": [],           # list[str]
+        "last_questions": [],      # list[{"ts":..., "q":..., "a_short":..., "topic":...}]
+
+        # ✅ NEW: lesson state + session state
+        "lesson_state": {
+            # key -> { "pack_id": str, "step_index": int, "completed": bool,
+            #          "last_step_at": iso, "started_at": iso, "completed_at": iso|None }
+        },
+        "session_state": {
+            "last_welcome_at": None,   # iso
+            "last_pack_id": None,      # str
+        },
+    }
+
+
+def _ensure_student(db: Dict[str, Any], name: str) -> Dict[str, Any]:
     students = db.setdefault("students", {})
-
     if name not in students:
-        students[name] = {
-            "name": name,
-            "created_at": _utc_now_iso(),
-            "last_seen_at": _utc_now_iso(),
-            "topics": {},              # topic -> {"asked": int, "last": iso, "notes": str}
-            "misconceptions": [],      # list[str]
-            "strengths": [],           # list[str]
-            "last_questions": [],      # list[{"ts":..., "q":..., "a_short":..., "topic":...}]
-
-            # ✅ NEW: lesson state + session state
-            "lesson_state": {
-                # key -> { "pack_id": str, "step_index": int, "completed": bool,
-                #          "last_step_at": iso, "started_at": iso, "completed_at": iso|None }
-            },
-            "session_state": {
-                "last_welcome_at": None,   # iso
-                "last_pack_id": None,      # str
-            },
-        }
-        _save_db(db)
+        students[name] = _new_student(name)
 
     # Backward-compat for older students created before lesson_state existed
     s = students[name]
     s.setdefault("lesson_state", {})
     s.setdefault("session_state", {"last_welcome_at": None, "last_pack_id": None})
-    students[name] = s
-    _save_db(db)
+    return s
 
-    return students[name]
+
+@traced("memory.get_student")
+def get_student_memory(name: str) -> Dict[str, Any]:
+    """
+    Returns a memory object for a student (creates one if missing).
+    """
+    student = _load_db().get("students", {}).get(name)
+    if student is not None and "lesson_state" in student and "session_state" in student:
+        return student
+
+    # Only write when something is actually missing
+    return _update_db(lambda db: _ensure_student(db, name))
 
 
 def _cap_list(lst: List[Any], max_items: int) -> List[Any]:
-    return lst[-max_items:]
+    # Trim in place (no copy of the kept items)
+    if len(lst) > max_items:
+        del lst[: len(lst) - max_items]
+    return lst
+
+
+# Running aggregates kept on each student so the prompt summary never has to
+# re-scan the full history:
+#   student["aggregates"] = {
+#       "version": int,                       # bumped whenever a summary input changes
+#       "top_topics": [[topic, asked], ...],  # top TOP_K_TOPICS by asked, desc
+#       "question_count": int,                # questions with a topic (== sum of topics[*]["asked"])
+#       "misconceptions": {text: last_seen},  # deduplicated, oldest first
+#   }
+#   student["summary"] = {"version": int, "text": str}
+TOP_K_TOPICS = 3
+MAX_MISCONCEPTIONS = 10
+
+
+def _bump_top_topics(top: List[List[Any]], topic: str, asked: int) -> None:
+    """
+    Counts only ever grow by one, so the top-k list can be maintained in O(k).
+    """
+    for item in top:
+        if item[0] == topic:
+            item[1] = asked
+            break
+    else:
+        if len(top) < TOP_K_TOPICS:
+            top.append([topic, asked])
+        elif asked > top[-1][1]:
+            top[-1] = [topic, asked]
+        else:
+            return
+    top.sort(key=lambda kv: kv[1], reverse=True)
+
+
+def _build_aggregates(student: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    One-off full scan for records written before aggregates existed.
+    """
+    topics = student.get("topics", {})
+    top = heapq.nlargest(TOP_K_TOPICS, topics.items(), key=lambda kv: kv[1].get("asked", 0))
+    return {
+        "version": 1,
+        "top_topics": [[t, meta.get("asked", 0)] for t, meta in top],
+        "question_count": sum(meta.get("asked", 0) for meta in topics.values()),
+        "misconceptions": {m: None for m in student.get("misconceptions", [])},
+    }
+
+
+def _ensure_aggregates(student: Dict[str, Any]) -> Dict[str, Any]:
+    if "aggregates" not in student:
+        student["aggregates"] = _build_aggregates(student)
+    return student["aggregates"]
+
+
+def _render_summary(student: Dict[str, Any]) -> str:
+    agg = _ensure_aggregates(student)
+    top_topics_text = ", ".join([f"{t}({asked})" for t, asked in agg["top_topics"]]) or "None yet"
+
+    misconceptions = list(agg["misconceptions"])
+    strengths = student.get("strengths", [])
+
+    last_qs = student.get("last_questions", [])
+    last_q_text = last_qs[-1]["q"] if last_qs else "None yet"
 
+    return (
+        f"Recent topic focus: {top_topics_text}\n"
+        f"Known misconceptions: {', '.join(misconceptions) if misconceptions else 'None recorded'}\n"
+        f"Strengths: {', '.join(strengths) if strengths else 'None recorded'}\n"
+        f"Last question asked: {last_q_text}"
+    )
 
+
+@traced("memory.update_progress")
 def update_student_progress(
     name: str,
     question: str,
@@ -80,63 +172,69 @@ def update_student_progress(
     """
     Updates memory after a Q&A. Topic/misconception/strength are optional for MVP.
     """
-    db = _load_db()
-    students = db.setdefault("students", {})
-    student = students.get(name) or get_student_memory(name)
-
-    student["last_seen_at"] = _utc_now_iso()
-
-    # Topic tracking (simple)
-    if topic:
-        t = student["topics"].setdefault(topic, {"asked": 0, "last": None, "notes": ""})
-        t["asked"] += 1
-        t["last"] = _utc_now_iso()
-
-    # Add misconception/strength (avoid duplicates, keep short lists)
-    if misconception:
-        if misconception not in student["misconceptions"]:
-            student["misconceptions"].append(misconception)
-        student["misconceptions"] = _cap_list(student["misconceptions"], 10)
-
-    if strength:
-        if strength not in student["strengths"]:
-            student["strengths"].append(strength)
-        student["strengths"] = _cap_list(student["strengths"], 10)
-
     # Store last questions (short answer excerpt)
     a_short = answer.strip().replace("\n", " ")
     if len(a_short) > 180:
         a_short = a_short[:177] + "..."
 
-    student["last_questions"].append(
-        {"ts": _utc_now_iso(), "q": question.strip(), "a_short": a_short, "topic": topic or ""}
-    )
-    student["last_questions"] = _cap_list(student["last_questions"], 8)
-
-    students[name] = student
-    _save_db(db)
+    def _apply(db: Dict[str, Any]) -> None:
+        student = _ensure_student(db, name)
+        agg = _ensure_aggregates(student)
+        now = _utc_now_iso()
+        student["last_seen_at"] = now
+
+        # Topic tracking (simple)
+        if topic:
+            t = student["topics"].setdefault(topic, {"asked": 0, "last": None, "notes": ""})
+            t["asked"] += 1
+            agg["question_count"] += 1
+            t["last"] = now
+            _bump_top_topics(agg["top_topics"], topic, t["asked"])
+
+        # Misconceptions: deduplicated, most recently seen last, capped
+        if misconception:
+            seen = agg["misconceptions"]
+            seen.pop(misconception, None)
+            seen[misconception] = now
+            while len(seen) > MAX_MISCONCEPTIONS:
+                del seen[next(iter(seen))]
+            student["misconceptions"] = list(seen)
+
+        if strength:
+            if strength not in student["strengths"]:
+                student["strengths"].append(strength)
+            _cap_list(student["strengths"], 10)
+
+        student["last_questions"].append(
+            {"ts": now, "q": question.strip(), "a_short": a_short, "topic": topic or ""}
+        )
+        _cap_list(student["last_questions"], 8)
+
+        # Every update changes the last question, so re-render here (O(k)) and
+        # let reads serve the stored text.
+        agg["version"] += 1
+        student["summary"] = {"version": agg["version"], "text": _render_summary(student)}
+
+    _update_db(_apply)
+
+    # Full, uncapped record goes to the long-term history store
+    append_interaction(name, question, answer, topic)
 
 
 def build_memory_summary(student_memory: Dict[str, Any]) -> str:
     """
     Creates a short summary for the teacher prompt.
+    Served from the stored summary when it matches the aggregates version.
     """
-    topics = student_memory.get("topics", {})
-    top_topics = sorted(topics.items(), key=lambda kv: kv[1].get("asked", 0), reverse=True)[:3]
-    top_topics_text = ", ".join([f"{t}({meta.get('asked',0)})" for t, meta in top_topics]) or "None yet"
-
-    misconceptions = student_memory.get("misconceptions", [])
-    strengths = student_memory.get("strengths", [])
+    agg = student_memory.get("aggregates")
+    cached = student_memory.get("summary")
+    if agg is not None and cached is not None and cached.get("version") == agg.get("version"):
+        return cached["text"]
 
-    last_qs = student_memory.get("last_questions", [])
-    last_q_text = last_qs[-1]["q"] if last_qs else "None yet"
-
-    return (
-        f"Recent topic focus: {top_topics_text}\n"
-        f"Known misconceptions: {', '.join(misconceptions) if misconceptions else 'None recorded'}\n"
-        f"Strengths: {', '.join(strengths) if strengths else 'None recorded'}\n"
-        f"Last question asked: {last_q_text}"
-    )
+    # Older record (or never updated): render once and keep it on the dict
+    text = _render_summary(student_memory)
+    student_memory["summary"] = {"version": student_memory["aggregates"]["version"], "text": text}
+    return text
 
 
 # =========================================================
@@ -152,62 +250,71 @@ def get_lesson_state(name: str, subject: str, pack_id: str) -> Dict[str, Any]:
     """
     Returns lesson state dict, creating if missing.
     """
-    db = _load_db()
-    students = db.setdefault("students", {})
-    student = students.get(name) or get_student_memory(name)
-
-    student.setdefault("lesson_state", {})
     key = _lesson_key(subject, pack_id)
-
-    if key not in student["lesson_state"]:
-        student["lesson_state"][key] = {
-            "pack_id": pack_id,
-            "subject": subject,
-            "step_index": 0,            # next step to teach
-            "completed": False,
-            "started_at": _utc_now_iso(),
-            "last_step_at": None,
-            "completed_at": None,
-        }
-        students[name] = student
-        _save_db(db)
-
-    return student["lesson_state"][key]
+    student = _load_db().get("students", {}).get(name)
+    if student is not None and key in student.get("lesson_state", {}):
+        return student["lesson_state"][key]
+
+    def _apply(db: Dict[str, Any]) -> Dict[str, Any]:
+        student = _ensure_student(db, name)
+        if key not in student["lesson_state"]:
+            student["lesson_state"][key] = {
+                "pack_id": pack_id,
+                "subject": subject,
+                "step_index": 0,            # next step to teach
+                "completed": False,
+                "started_at": _utc_now_iso(),
+                "last_step_at": None,
+                "completed_at": None,
+            }
+        return student["lesson_state"][key]
+
+    return _update_db(_apply)
 
 
 def set_lesson_state(name: str, subject: str, pack_id: str, state: Dict[str, Any]) -> None:
-    db = _load_db()
-    students = db.setdefault("students", {})
-    student = students.get(name) or get_student_memory(name)
-
-    student.setdefault("lesson_state", {})
     key = _lesson_key(subject, pack_id)
-    student["lesson_state"][key] = state
-    student["last_seen_at"] = _utc_now_iso()
 
-    students[name] = student
-    _save_db(db)
+    def _apply(db: Dict[str, Any]) -> None:
+        student = _ensure_student(db, name)
+        student["lesson_state"][key] = state
+        student["last_seen_at"] = _utc_now_iso()
+
+    _update_db(_apply)
 
 
 def advance_lesson_step(name: str, subject: str, pack_id: str) -> int:
     """
     Increase step_index by 1 and save. Returns new step_index.
     """
-    state = get_lesson_state(name, subject, pack_id)
-    if state.get("completed"):
+    get_lesson_state(name, subject, pack_id)
+    key = _lesson_key(subject, pack_id)
+
+    # Increment inside the update so concurrent workers never lose a step
+    def _apply(db: Dict[str, Any]) -> int:
+        student = _ensure_student(db, name)
+        state = student["lesson_state"][key]
+        if not state.get("completed"):
+            state["step_index"] = int(state.get("step_index", 0)) + 1
+            state["last_step_at"] = _utc_now_iso()
+            student["last_seen_at"] = _utc_now_iso()
         return int(state.get("step_index", 0))
 
-    state["step_index"] = int(state.get("step_index", 0)) + 1
-    state["last_step_at"] = _utc_now_iso()
-    set_lesson_state(name, subject, pack_id, state)
-    return state["step_index"]
+    return _update_db(_apply)
 
 
 def mark_lesson_complete(name: str, subject: str, pack_id: str) -> None:
-    state = get_lesson_state(name, subject, pack_id)
-    state["completed"] = True
-    state["completed_at"] = _utc_now_iso()
-    set_lesson_state(name, subject, pack_id, state)
+    get_lesson_state(name, subject, pack_id)
+    key = _lesson_key(subject, pack_id)
+
+    def _apply(db: Dict[str, Any]) -> None:
+        student = _ensure_student(db, name)
+        state = student["lesson_state"][key]
+        state["completed"] = True
+        state["completed_at"] = _utc_now_iso()
+        student["last_seen_at"] = _utc_now_iso()
+
+    _update_db(_apply)
 
 
 def should_welcome_today(name: str) -> bool:
@@ -227,15 +334,10 @@ def should_welcome_today(name: str) -> bool:
 
 
 def set_welcomed_now(name: str) -> None:
-    db = _load_db()
-    students = db.setdefault("students", {})
-    student = students.get(name) or get_student_memory(name)
-
-    student.setdefault("session_state", {})
-    student["session_state"]["last_welcome_at"] = _utc_now_iso()
-    student["last_seen_at"] = _utc_now_iso()
-
-    students[name] = student
-    _save_db(db)
-
+    def _apply(db: Dict[str, Any]) -> None:
+        student = _ensure_student(db, name)
+        student.setdefault("session_state", {})
+        student["session_state"]["last_welcome_at"] = _utc_now_iso()
+        student["last_seen_at"] = _utc_now_iso()
 
+    _update_db(_apply)
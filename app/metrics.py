@@ -0,0 +1,362 @@
+"""
+In-process metrics: counters, gauges and histograms with labels.
+
+    from app.metrics import counter, histogram
+    REQUESTS = counter("teacher_cache_requests_total", "Cache lookups", ["cache", "result"])
+    REQUESTS.inc(cache="response", result="hit")
+    LATENCY = histogram("teacher_stage_seconds", "Turn stage latency", ["stage"])
+    LATENCY.observe(0.12, stage="stt")
+
+counter()/gauge()/histogram() return the existing metric when the name is already
+registered, so several modules can feed the same one. A gauge can also be backed
+by a function (set_function) for values that live elsewhere, such as queue depths.
+
+Export (both off by default):
+    TEACHER_METRICS_PORT=9108                 # Prometheus text at http://127.0.0.1:9108/metrics
+    TEACHER_METRICS_JSON=data/metrics.json    # snapshot rewritten every TEACHER_METRICS_INTERVAL_S
+Entry points call start_from_env(); in code use start_http_server() / start_json_dump().
+"""
+
+import atexit
+import json
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Seconds; covers a cache lookup up to a slow LLM call
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+METRICS_INTERVAL_S = float(os.getenv("TEACHER_METRICS_INTERVAL_S", "30"))
+
+_registry: Dict[str, "_Metric"] = {}
+_registry_lock = threading.Lock()
+
+
+def _label_key(labelnames: Sequence[str], labels: Dict[str, Any]) -> Tuple[str, ...]:
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {list(labelnames)}, got {sorted(labels)}")
+    return tuple(str(labels[n]) for n in labelnames)
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt_value(v: float) -> str:
+    if math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    if float(v).is_integer() and abs(v) < 1e15:
+        return str(int(v))
+    return repr(float(v))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        """
+        (sample name, labels, value) rows, as exported.
+        """
+        raise NotImplementedError
+
+    def prometheus(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for sample, labels, value in self.samples():
+            le = labels.pop("le", None)
+            extra = f'le="{le}"' if le is not None else ""
+            lines.append(f"{sample}{_fmt_labels(list(labels), list(labels.values()), extra)} {_fmt_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        if amount < 0:
+            raise ValueError("Counters only go up")
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(_label_key(self.labelnames, labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, dict(zip(self.labelnames, k)), v) for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._fn: Optional[Callable[[], Any]] = None
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn: Callable[[], Any]) -> None:
+        """
+        Read the value at export time instead: fn() returns a number (no labels)
+        or {label values tuple: number}.
+        """
+        self._fn = fn
+
+    def samples(self):
+        if self._fn is not None:
+            got = self._fn()
+            items = list(got.items()) if isinstance(got, dict) else [((), got)]
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return [(self.name, dict(zip(self.labelnames, k)), float(v)) for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label key -> (per-bucket counts incl. +Inf, sum)
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _label_key(self.labelnames, labels)
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def time(self, **labels: Any) -> "_Timer":
+        """
+        with LATENCY.time(stage="stt"): ...
+        """
+        return _Timer(self, labels)
+
+    def snapshot(self, **labels: Any) -> Dict[str, Any]:
+        """
+        {"count", "sum", "buckets": {upper bound: cumulative count}} for one label set.
+        """
+        with self._lock:
+            counts, total = self._values.get(_label_key(self.labelnames, labels)) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts = list(counts)
+        cumulative, running = {}, 0
+        for bound, n in zip((*self.buckets, math.inf), counts):
+            running += n
+            cumulative[bound] = running
+        return {"count": running, "sum": total, "buckets": cumulative}
+
+    def samples(self):
+        with self._lock:
+            items = [(k, list(c), s) for k, (c, s) in self._values.items()]
+        out = []
+        for key, counts, total in items:
+            labels = dict(zip(self.labelnames, key))
+            running = 0
+            for bound, n in zip((*self.buckets, math.inf), counts):
+                running += n
+                out.append((f"{self.name}_bucket", {**labels, "le": _fmt_value(bound)}, running))
+            out.append((f"{self.name}_sum", dict(labels), total))
+            out.append((f"{self.name}_count", dict(labels), running))
+        return out
+
+
+class _Timer:
+    __slots__ = ("hist", "labels", "t0")
+
+    def __init__(self, hist: Histogram, labels: Dict[str, Any]):
+        self.hist = hist
+        self.labels = labels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.t0, **self.labels)
+        return False
+
+
+def _get_or_create(cls, name: str, help: str, labelnames: Sequence[str], **kwargs) -> Any:
+    with _registry_lock:
+        m = _registry.get(name)
+        if m is None:
+            m = _registry[name] = cls(name, help, labelnames, **kwargs)
+        elif not isinstance(m, cls) or m.labelnames != tuple(labelnames):
+            raise ValueError(f"Metric {name} already registered as {m.kind} with labels {list(m.labelnames)}")
+        return m
+
+
+def counter(name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+    return _get_or_create(Counter, name, help, labelnames)
+
+
+def gauge(name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+    return _get_or_create(Gauge, name, help, labelnames)
+
+
+def histogram(name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    return _get_or_create(Histogram, name, help, labelnames, buckets=buckets)
+
+
+# Shared by several modules
+CACHE_REQUESTS = counter("teacher_cache_requests_total", "Cache lookups by cache and result (hit/miss)", ["cache", "result"])
+STATE_WRITE_BYTES = counter("teacher_state_write_bytes_total", "Bytes written to state files", ["store"])
+
+
+def cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+# -------------------------
+# Export
+# -------------------------
+
+def _metrics() -> List[_Metric]:
+    with _registry_lock:
+        return sorted(_registry.values(), key=lambda m: m.name)
+
+
+def render_prometheus() -> str:
+    """
+    All metrics in the Prometheus text exposition format (0.0.4).
+    """
+    lines: List[str] = []
+    for m in _metrics():
+        lines.extend(m.prometheus())
+    return "\n".join(lines) + "\n"
+
+
+def snapshot() -> Dict[str, Any]:
+    """
+    JSON-friendly view: {name: {"type", "help", "samples": [{"labels", "value"}] }}.
+    Histograms carry count, sum and cumulative buckets per label set instead of value.
+    """
+    out: Dict[str, Any] = {}
+    for m in _metrics():
+        if isinstance(m, Histogram):
+            with m._lock:
+                keys = list(m._values)
+            samples = []
+            for key in keys:
+                labels = dict(zip(m.labelnames, key))
+                snap = m.snapshot(**labels)
+                snap["buckets"] = {_fmt_value(b): n for b, n in snap["buckets"].items()}
+                samples.append({"labels": labels, **snap})
+        else:
+            samples = [{"labels": labels, "value": v} for _, labels, v in m.samples()]
+        out[m.name] = {"type": m.kind, "help": m.help, "samples": samples}
+    return {"ts": time.time(), "pid": os.getpid(), "metrics": out}
+
+
+def write_json(path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(json.dumps(snapshot(), indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] == "/metrics":
+            body, ctype = render_prometheus().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        elif self.path.split("?")[0] == "/metrics.json":
+            body, ctype = json.dumps(snapshot()).encode("utf-8"), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        pass  # scrapes every few seconds would drown the console
+
+
+def start_http_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Serve /metrics (Prometheus) and /metrics.json on a daemon thread. port=0 picks a free port.
+    """
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def start_json_dump(path: str, interval_s: float = METRICS_INTERVAL_S) -> threading.Event:
+    """
+    Rewrite `path` with snapshot() every interval_s (and once at exit). Set the returned event to stop.
+    """
+    stop = threading.Event()
+    out = Path(path)
+
+    def _loop() -> None:
+        while not stop.wait(interval_s):
+            try:
+                write_json(out)
+            except OSError:
+                pass  # disk hiccup; the next round tries again
+
+    threading.Thread(target=_loop, name="metrics-dump", daemon=True).start()
+    atexit.register(lambda: write_json(out))
+    return stop
+
+
+_started = False
+
+
+def start_from_env() -> None:
+    """
+    Start whichever exporters TEACHER_METRICS_PORT / TEACHER_METRICS_JSON ask for (once per process).
+    """
+    global _started
+    if _started:
+        return
+    _started = True
+    port = os.getenv("TEACHER_METRICS_PORT")
+    if port:
+        start_http_server(int(port), os.getenv("TEACHER_METRICS_HOST", "127.0.0.1"))
+    path = os.getenv("TEACHER_METRICS_JSON")
+    if path:
+        start_json_dump(path)
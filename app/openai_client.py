@@ -0,0 +1,430 @@
+"""
+One shared OpenAI client (sync + async) for the whole app.
+
+- single pooled HTTP connection pool per process (keep-alive, bounded)
+- explicit connect/read timeouts
+- per-endpoint concurrency caps (backpressure instead of connection churn)
+- jittered exponential backoff on retryable errors
+- per-endpoint circuit breaker
+- optional hedged requests for latency-critical calls (Q&A)
+
+Use:
+    from app.openai_client import get_client, call
+    resp = call("chat", get_client().chat.completions.create, model=..., messages=...)
+"""
+
+import asyncio
+import random
+import threading
+import time
+import weakref
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+import openai
+from openai import AsyncOpenAI, OpenAI
+
+from app.config import (
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+    OPENAI_BREAKER_COOLDOWN_S,
+    OPENAI_BREAKER_FAILURES,
+    OPENAI_CONCURRENCY,
+    OPENAI_HEDGE_AFTER_S,
+    OPENAI_MAX_CONNECTIONS,
+    OPENAI_MAX_RETRIES,
+    OPENAI_TIMEOUT_S,
+)
+from app.metrics import counter, gauge, histogram
+
+# Errors worth retrying; everything else (bad request, auth) fails immediately
+RETRYABLE = (
+    openai.APIConnectionError,  # includes APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+BACKOFF_BASE_S = 0.25
+BACKOFF_MAX_S = 4.0
+
+# How long a caller waits for a concurrency slot before giving up
+ACQUIRE_TIMEOUT_S = 30.0
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class ClientOverloadedError(RuntimeError):
+    pass
+
+
+_lock = threading.Lock()
+_client: Optional[OpenAI] = None
+_hedge_pool: Optional[ThreadPoolExecutor] = None
+
+_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+
+# asyncio primitives and connections belong to one event loop: one set per loop
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+_async_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = (
+    weakref.WeakKeyDictionary()
+)
+_breakers: Dict[str, "CircuitBreaker"] = {}
+
+_metrics_lock = threading.Lock()
+_METRICS: Dict[str, Dict[str, int]] = {}
+
+REQUEST_SECONDS = histogram("teacher_openai_request_seconds", "OpenAI request latency per attempt", ["endpoint", "outcome"])
+EVENTS = counter(
+    "teacher_openai_events_total",
+    "OpenAI client events (requests, errors, retries, hedges, breaker_open, rejected)",
+    ["endpoint", "event"],
+)
+TOKENS = counter("teacher_openai_tokens_total", "OpenAI tokens by call kind and type (prompt/completion/cached)", ["kind", "type"])
+WAITING = gauge("teacher_openai_waiting", "Callers queued for a concurrency slot", ["endpoint"])
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(OPENAI_TIMEOUT_S, connect=min(5.0, OPENAI_TIMEOUT_S))
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+        keepalive_expiry=60.0,
+    )
+
+
+def get_client() -> OpenAI:
+    """
+    Process-wide sync client over one pooled httpx.Client. SDK retries are off;
+    retries happen in call() so they respect the breaker and metrics.
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = OpenAI(
+                    api_key=OPENAI_API_KEY,
+                    base_url=OPENAI_BASE_URL,
+                    max_retries=0,
+                    timeout=_timeout(),
+                    http_client=httpx.Client(limits=_limits(), timeout=_timeout()),
+                )
+    return _client
+
+
+def get_async_client() -> AsyncOpenAI:
+    """
+    Async client for the running event loop (its connection pool can't be shared across loops).
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            client = _async_clients[loop] = AsyncOpenAI(
+                api_key=OPENAI_API_KEY,
+                base_url=OPENAI_BASE_URL,
+                max_retries=0,
+                timeout=_timeout(),
+                http_client=httpx.AsyncClient(limits=_limits(), timeout=_timeout()),
+            )
+    return client
+
+
+# -------------------------
+# Metrics
+# -------------------------
+
+def _bump(endpoint: str, name: str, delta: int = 1) -> None:
+    with _metrics_lock:
+        m = _METRICS.setdefault(
+            endpoint,
+            {"in_flight": 0, "requests": 0, "errors": 0, "retries": 0, "hedges": 0, "breaker_open": 0, "rejected": 0},
+        )
+        m[name] += delta
+    if name != "in_flight":
+        EVENTS.inc(delta, endpoint=endpoint, event=name)
+
+
+def client_metrics() -> Dict[str, Dict[str, int]]:
+    """
+    Snapshot of per-endpoint counters: in_flight, requests, errors, retries, hedges, breaker_open, rejected.
+    """
+    with _metrics_lock:
+        return {k: dict(v) for k, v in _METRICS.items()}
+
+
+gauge("teacher_openai_in_flight", "OpenAI requests in flight", ["endpoint"]).set_function(
+    lambda: {(ep,): m["in_flight"] for ep, m in client_metrics().items()}
+)
+
+
+# -------------------------
+# Circuit breaker
+# -------------------------
+
+class CircuitBreaker:
+    """
+    closed -> (N consecutive failures) -> open -> (cooldown) -> half-open -> one trial call
+    """
+
+    def __init__(self, failure_threshold: int, cooldown_s: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown_s = cooldown_s
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.cooldown_s:
+                return False
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True  # half-open: let one call through
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def release_trial(self) -> None:
+        """
+        The call never reached the service: free a half-open trial slot, change nothing else.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self) -> bool:
+        """
+        Returns True when this failure (re)opens the breaker.
+        """
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+
+def _breaker(endpoint: str) -> CircuitBreaker:
+    with _lock:
+        if endpoint not in _breakers:
+            _breakers[endpoint] = CircuitBreaker(OPENAI_BREAKER_FAILURES, OPENAI_BREAKER_COOLDOWN_S)
+        return _breakers[endpoint]
+
+
+def _semaphore(endpoint: str) -> threading.BoundedSemaphore:
+    with _lock:
+        if endpoint not in _semaphores:
+            _semaphores[endpoint] = threading.BoundedSemaphore(OPENAI_CONCURRENCY.get(endpoint, 8))
+        return _semaphores[endpoint]
+
+
+def _backoff_s(attempt: int) -> float:
+    # "Full jitter": uniform in [0, min(cap, base * 2^attempt)]
+    return random.uniform(0.0, min(BACKOFF_MAX_S, BACKOFF_BASE_S * (2 ** attempt)))
+
+
+# -------------------------
+# Sync path
+# -------------------------
+
+def _attempt(endpoint: str, fn: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+    sem = _semaphore(endpoint)
+    WAITING.inc(endpoint=endpoint)
+    try:
+        acquired = sem.acquire(timeout=ACQUIRE_TIMEOUT_S)
+    finally:
+        WAITING.dec(endpoint=endpoint)
+    if not acquired:
+        _bump(endpoint, "rejected")
+        raise ClientOverloadedError(f"No free {endpoint} slot after {ACQUIRE_TIMEOUT_S}s")
+    _bump(endpoint, "in_flight")
+    _bump(endpoint, "requests")
+    outcome = "error"
+    t0 = time.perf_counter()
+    try:
+        result = fn(*args, **kwargs)
+        outcome = "ok"
+        return result
+    finally:
+        REQUEST_SECONDS.observe(time.perf_counter() - t0, endpoint=endpoint, outcome=outcome)
+        _bump(endpoint, "in_flight", -1)
+        sem.release()
+
+
+def _get_hedge_pool() -> ThreadPoolExecutor:
+    global _hedge_pool
+    with _lock:
+        if _hedge_pool is None:
+            _hedge_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="openai-hedge")
+        return _hedge_pool
+
+
+def _hedged_attempt(endpoint: str, fn: Callable[..., Any], args: tuple, kwargs: dict, hedge_after_s: float) -> Any:
+    pool = _get_hedge_pool()
+    first = pool.submit(_attempt, endpoint, fn, args, kwargs)
+    try:
+        return first.result(timeout=hedge_after_s)
+    except FutureTimeout:
+        pass
+
+    # Primary is slow: race a backup request, take whichever succeeds first
+    _bump(endpoint, "hedges")
+    second = pool.submit(_attempt, endpoint, fn, args, kwargs)
+    pending = {first, second}
+    error: Optional[BaseException] = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for f in done:
+            if f.exception() is None:
+                return f.result()
+            error = f.exception()
+    raise error  # type: ignore[misc]
+
+
+def call(endpoint: str, fn: Callable[..., Any], *args: Any, hedge: bool = False, **kwargs: Any) -> Any:
+    """
+    Run one OpenAI SDK call with concurrency cap, breaker, retries and optional hedging.
+    endpoint is a label used for limits/metrics ("chat", "embeddings", ...).
+    """
+    breaker = _breaker(endpoint)
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            _bump(endpoint, "rejected")
+            raise CircuitOpenError(f"OpenAI {endpoint} circuit is open; retry later")
+        try:
+            if hedge and OPENAI_HEDGE_AFTER_S > 0:
+                result = _hedged_attempt(endpoint, fn, args, kwargs, OPENAI_HEDGE_AFTER_S)
+            else:
+                result = _attempt(endpoint, fn, args, kwargs)
+        except RETRYABLE:
+            _bump(endpoint, "errors")
+            if breaker.record_failure():
+                _bump(endpoint, "breaker_open")
+            if attempt >= OPENAI_MAX_RETRIES:
+                raise
+            _bump(endpoint, "retries")
+            time.sleep(_backoff_s(attempt))
+            attempt += 1
+            continue
+        except ClientOverloadedError:
+            # Shed locally before reaching the service: says nothing about its health
+            breaker.release_trial()
+            raise
+        except Exception:
+            # Not a service-health problem (bad request, auth, ...): don't trip the breaker
+            _bump(endpoint, "errors")
+            breaker.record_success()
+            raise
+        breaker.record_success()
+        return result
+
+
+# -------------------------
+# Async path
+# -------------------------
+
+def _async_semaphore(endpoint: str) -> asyncio.Semaphore:
+    # Per running loop: a semaphore binds to the first loop that waits on it
+    loop = asyncio.get_running_loop()
+    with _lock:
+        sems = _async_semaphores.setdefault(loop, {})
+        if endpoint not in sems:
+            sems[endpoint] = asyncio.Semaphore(OPENAI_CONCURRENCY.get(endpoint, 8))
+        return sems[endpoint]
+
+
+async def _aattempt(endpoint: str, fn: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+    sem = _async_semaphore(endpoint)
+    WAITING.inc(endpoint=endpoint)
+    try:
+        await asyncio.wait_for(sem.acquire(), timeout=ACQUIRE_TIMEOUT_S)
+    except asyncio.TimeoutError:
+        _bump(endpoint, "rejected")
+        raise ClientOverloadedError(f"No free {endpoint} slot after {ACQUIRE_TIMEOUT_S}s")
+    finally:
+        WAITING.dec(endpoint=endpoint)
+    _bump(endpoint, "in_flight")
+    _bump(endpoint, "requests")
+    outcome = "error"
+    t0 = time.perf_counter()
+    try:
+        result = await fn(*args, **kwargs)
+        outcome = "ok"
+        return result
+    finally:
+        REQUEST_SECONDS.observe(time.perf_counter() - t0, endpoint=endpoint, outcome=outcome)
+        _bump(endpoint, "in_flight", -1)
+        sem.release()
+
+
+async def _ahedged_attempt(endpoint: str, fn: Callable[..., Any], args: tuple, kwargs: dict, hedge_after_s: float) -> Any:
+    first = asyncio.ensure_future(_aattempt(endpoint, fn, args, kwargs))
+    done, _ = await asyncio.wait({first}, timeout=hedge_after_s)
+    if done:
+        return first.result()
+
+    _bump(endpoint, "hedges")
+    second = asyncio.ensure_future(_aattempt(endpoint, fn, args, kwargs))
+    pending = {first, second}
+    error: Optional[BaseException] = None
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for f in done:
+            if f.exception() is None:
+                for p in pending:
+                    p.cancel()
+                return f.result()
+            error = f.exception()
+    raise error  # type: ignore[misc]
+
+
+async def acall(endpoint: str, fn: Callable[..., Any], *args: Any, hedge: bool = False, **kwargs: Any) -> Any:
+    """
+    Async twin of call() for AsyncOpenAI methods.
+    """
+    breaker = _breaker(endpoint)
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            _bump(endpoint, "rejected")
+            raise CircuitOpenError(f"OpenAI {endpoint} circuit is open; retry later")
+        try:
+            if hedge and OPENAI_HEDGE_AFTER_S > 0:
+                result = await _ahedged_attempt(endpoint, fn, args, kwargs, OPENAI_HEDGE_AFTER_S)
+            else:
+                result = await _aattempt(endpoint, fn, args, kwargs)
+        except RETRYABLE:
+            _bump(endpoint, "errors")
+            if breaker.record_failure():
+                _bump(endpoint, "breaker_open")
+            if attempt >= OPENAI_MAX_RETRIES:
+                raise
+            _bump(endpoint, "retries")
+            await asyncio.sleep(_backoff_s(attempt))
+            attempt += 1
+            continue
+        except ClientOverloadedError:
+            # Shed locally before reaching the service: says nothing about its health
+            breaker.release_trial()
+            raise
+        except Exception:
+            # Not a service-health problem (bad request, auth, ...): don't trip the breaker
+            _bump(endpoint, "errors")
+            breaker.record_success()
+            raise
+        breaker.record_success()
+        return result
@@ -0,0 +1,247 @@
+"""
+Registry of curriculum packs, split into shards, with subject/year-aware routing.
+
+At startup every curriculum_packs/*.json is read once. For each pack we keep its
+metadata (subject, year band, key stage, topics) and split its chunks into shards
+of SHARD_SIZE, each with pre-tokenised chunks and a shard vocabulary.
+
+Retrieval then:
+  1) routes: packs matching the student's subject and year, then shards whose
+     vocabulary overlaps the current lesson objectives,
+  2) scores the selected shards (pre-tokenised set intersections, one pass),
+  3) merges each shard's top-k into a global top-k.
+
+Subjects match on their normalised name ("Maths" == "maths" == "Math"), never by
+substring, so "Maths" does not pull in "Further Maths".
+"""
+
+import heapq
+import json
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from app.curriculum_retriever import PACK_DIR, _tokenize
+from app.tracing import span, traced
+
+SHARD_SIZE = 256
+TOPICS_PER_PACK = 30
+
+# Spellings of the same subject
+SUBJECT_ALIASES = {"math": "maths", "mathematics": "maths"}
+
+# Year groups covered by each key stage (England)
+KEY_STAGE_YEARS = {
+    "KS1": (1, 2),
+    "KS2": (3, 6),
+    "KS3": (7, 9),
+    "KS4": (10, 11),
+    "KS5": (12, 13),
+}
+
+
+@dataclass
+class Shard:
+    shard_id: str
+    pack_id: str
+    chunks: List[Dict[str, Any]]
+    chunk_tokens: List[FrozenSet[str]]
+    vocab: FrozenSet[str]
+
+
+@dataclass
+class PackMeta:
+    pack_id: str
+    subject: str
+    year_band: str
+    key_stage: str
+    years: Tuple[int, int]
+    topics: List[str]
+    n_chunks: int
+    shards: List[Shard] = field(default_factory=list)
+
+    def covers_year(self, year: Optional[int]) -> bool:
+        return year is None or self.years[0] <= year <= self.years[1]
+
+
+def _parse_years(pack: Dict[str, Any], pack_id: str) -> Tuple[str, Tuple[int, int]]:
+    band = pack.get("year_band", "")
+    ks = re.search(r"KS\s*(\d)", f"{band} {pack_id}", re.IGNORECASE)
+    key_stage = f"KS{ks.group(1)}" if ks else ""
+
+    m = re.search(r"Year\s*(\d+)\s*[-–]\s*(\d+)", band)
+    if m:
+        return key_stage, (int(m.group(1)), int(m.group(2)))
+    m = re.search(r"Year\s*(\d+)", band)
+    if m:
+        return key_stage, (int(m.group(1)), int(m.group(1)))
+    return key_stage, KEY_STAGE_YEARS.get(key_stage, (0, 99))
+
+
+def normalise_subject(subject: str) -> str:
+    key = " ".join(re.findall(r"[a-z0-9]+", (subject or "").lower()))
+    return SUBJECT_ALIASES.get(key, key)
+
+
+def student_year(student: dict) -> Optional[int]:
+    """
+    Year group from student["year"] / student["class"] ("Year 7"), if known.
+    """
+    for key in ("year", "class"):
+        m = re.search(r"(\d+)", str(student.get(key) or ""))
+        if m:
+            return int(m.group(1))
+    return None
+
+
+def _build_pack(pack: Dict[str, Any], pack_id: str, shard_size: int) -> PackMeta:
+    key_stage, years = _parse_years(pack, pack_id)
+    chunks = pack.get("chunks", [])
+
+    shards: List[Shard] = []
+    term_counts: Counter = Counter()
+    for n, start in enumerate(range(0, len(chunks), shard_size)):
+        part = chunks[start:start + shard_size]
+        toks = [frozenset(_tokenize(c.get("text", ""))) for c in part]
+        vocab = frozenset().union(*toks) if toks else frozenset()
+        for t in toks:
+            term_counts.update(t)
+        shards.append(Shard(f"{pack_id}#{n}", pack_id, part, toks, vocab))
+
+    topics = pack.get("topics") or [t for t, _ in term_counts.most_common(TOPICS_PER_PACK)]
+    return PackMeta(
+        pack_id=pack_id,
+        subject=pack.get("subject", ""),
+        year_band=pack.get("year_band", ""),
+        key_stage=key_stage,
+        years=years,
+        topics=list(topics),
+        n_chunks=len(chunks),
+        shards=shards,
+    )
+
+
+class PackRegistry:
+    def __init__(self, packs: Dict[str, PackMeta]):
+        self.packs = packs
+
+    @classmethod
+    def load(cls, pack_dir: Path = PACK_DIR, shard_size: int = SHARD_SIZE) -> "PackRegistry":
+        packs = {}
+        for path in sorted(pack_dir.glob("*.json")):
+            pack = json.loads(path.read_text(encoding="utf-8"))
+            pack_id = pack.get("pack_id", path.stem)
+            packs[pack_id] = _build_pack(pack, pack_id, shard_size)
+        return cls(packs)
+
+    def packs_for(self, subject: str = "", year: Optional[int] = None) -> List[PackMeta]:
+        subject = normalise_subject(subject)
+        out = []
+        for meta in self.packs.values():
+            if subject and normalise_subject(meta.subject) != subject:
+                continue
+            if not meta.covers_year(year):
+                continue
+            out.append(meta)
+        return out
+
+    def route(self, student: dict, objectives: Optional[List[str]] = None) -> List[Shard]:
+        """
+        Shards worth searching for this student. Falls back to wider sets rather
+        than returning nothing.
+        """
+        if student.get("curriculum_pack") in self.packs:
+            packs = [self.packs[student["curriculum_pack"]]]
+        else:
+            subject = student.get("subject") or ""
+            year = student_year(student)
+            packs = self.packs_for(subject, year) or self.packs_for(subject) or list(self.packs.values())
+
+        shards = [sh for p in packs for sh in p.shards]
+        obj_tokens = set(_tokenize(" ".join(objectives or [])))
+        if obj_tokens:
+            focused = [sh for sh in shards if obj_tokens & sh.vocab]
+            if focused:
+                return focused
+        return shards
+
+    def best_pack_id(self, student: dict) -> Optional[str]:
+        if student.get("curriculum_pack"):
+            return student["curriculum_pack"]
+        year = student_year(student)
+        packs = self.packs_for(student.get("subject") or "", year) or self.packs_for(student.get("subject") or "")
+        if not packs:
+            return None
+        # Prefer the narrowest year band that still covers the student
+        packs.sort(key=lambda p: (p.years[1] - p.years[0], p.pack_id))
+        return packs[0].pack_id
+
+    @staticmethod
+    def _search_shard(shard: Shard, q_tokens: FrozenSet[str], top_k: int) -> List[Tuple[int, str, Dict[str, Any]]]:
+        scored = []
+        for ch, toks in zip(shard.chunks, shard.chunk_tokens):
+            score = len(q_tokens & toks)
+            if score > 0:
+                scored.append((score, ch.get("chunk_id", ""), ch))
+        return heapq.nlargest(top_k, scored, key=lambda x: (x[0], x[1]))
+
+    def search(
+        self,
+        student: dict,
+        query: str,
+        objectives: Optional[List[str]] = None,
+        top_k: int = 4,
+    ) -> List[Dict[str, Any]]:
+        """
+        Keyword search over the routed shards, merged to a global top_k.
+        """
+        return [ch for _, ch in self.search_scored(student, query, objectives=objectives, top_k=top_k)]
+
+    @traced("rag.routed")
+    def search_scored(
+        self,
+        student: dict,
+        query: str,
+        objectives: Optional[List[str]] = None,
+        top_k: int = 4,
+    ) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        Like search(), but returns (overlap score, chunk) pairs, best first.
+        """
+        q_tokens = frozenset(_tokenize(query))
+        if not q_tokens:
+            return []
+
+        shards = self.route(student, objectives)
+        with span("rag.shards", shards=len(shards)):
+            # Sequential on purpose: set intersections hold the GIL, so threads only add overhead
+            parts = [self._search_shard(sh, q_tokens, top_k) for sh in shards]
+
+        merged = heapq.nlargest(top_k, (hit for part in parts for hit in part), key=lambda x: (x[0], x[1]))
+        return [(score, ch) for score, _, ch in merged]
+
+
+_registry: Optional[PackRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> PackRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = PackRegistry.load()
+    return _registry
+
+
+def reload_registry() -> PackRegistry:
+    """
+    Re-scan curriculum_packs/ (after adding or rebuilding packs).
+    """
+    global _registry
+    with _registry_lock:
+        _registry = PackRegistry.load()
+    return _registry
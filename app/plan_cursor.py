@@ -0,0 +1,151 @@
+"""
+Lesson plans compiled into a flat step table.
+
+A plan (units -> lessons -> steps) becomes a tuple of StepEntry rows, one per step,
+in teaching order. Each row carries its (unit, lesson, step) coordinates and the
+index of the next/previous row, so a cohort's position is a single integer cursor
+and moving around the plan is plain array indexing.
+
+Plans are compiled once per process and recompiled only if the JSON file changes.
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from app.lesson_plan import PLANS_DIR, load_plan
+
+# What an empty lesson compiles to (same as get_step() past the last step)
+_END_STEP = {"type": "end", "text": "Lesson completed."}
+
+
+@dataclass(frozen=True)
+class StepEntry:
+    index: int
+    unit_idx: int
+    lesson_idx: int
+    step_idx: int
+    step: Dict[str, Any]
+    lesson: Dict[str, Any]
+    next_index: int      # == index on the final row
+    prev_index: int      # == index on the first row
+    lesson_start: int    # first row of this lesson
+    is_end: bool         # explicit "end" step: advancing stops here
+
+
+@dataclass(frozen=True)
+class CompiledPlan:
+    cohort_id: str
+    plan: Dict[str, Any]
+    steps: Tuple[StepEntry, ...]
+    lesson_index: Dict[Tuple[int, int], int]           # (unit, lesson) -> first row
+    coord_index: Dict[Tuple[int, int, int], int]       # (unit, lesson, step) -> row
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    def clamp(self, cursor: int) -> int:
+        return max(0, min(int(cursor), len(self.steps) - 1))
+
+    def entry(self, cursor: int) -> StepEntry:
+        return self.steps[self.clamp(cursor)]
+
+    def advance(self, cursor: int) -> int:
+        """
+        Next row; stays put on an explicit end step or the final row.
+        """
+        e = self.entry(cursor)
+        return e.index if e.is_end else e.next_index
+
+    def rewind(self, cursor: int) -> int:
+        return self.entry(cursor).prev_index
+
+    def jump_to_lesson(self, unit_idx: int, lesson_idx: int) -> int:
+        key = (int(unit_idx), int(lesson_idx))
+        if key not in self.lesson_index:
+            raise IndexError(f"{self.cohort_id} has no unit {unit_idx + 1} lesson {lesson_idx + 1}")
+        return self.lesson_index[key]
+
+    def progress_percent(self, cursor: int) -> float:
+        """
+        Share of the plan reached, counting the current step (step k of n).
+        """
+        return round(100.0 * (self.clamp(cursor) + 1) / len(self.steps), 1)
+
+    def cursor_for(self, unit_idx: int, lesson_idx: int, step_idx: int) -> int:
+        """
+        Map legacy (unit, lesson, step) indices to a cursor, clamping like advance_step used to.
+        """
+        key = (int(unit_idx), int(lesson_idx), int(step_idx))
+        if key in self.coord_index:
+            return self.coord_index[key]
+        # Out of range: nearest row at or before the requested coordinates
+        best = 0
+        for coord, row in self.coord_index.items():
+            if coord <= key and row > best:
+                best = row
+        return best
+
+
+def compile_plan(plan: Dict[str, Any], cohort_id: str = "") -> CompiledPlan:
+    rows = []
+    lesson_index: Dict[Tuple[int, int], int] = {}
+
+    for u, unit in enumerate(plan.get("units", [])):
+        for l, lesson in enumerate(unit.get("lessons", [])):
+            lesson_index[(u, l)] = len(rows)
+            steps = lesson.get("steps", []) or [_END_STEP]
+            for s, step in enumerate(steps):
+                rows.append((u, l, s, step, lesson, lesson_index[(u, l)]))
+
+    if not rows:
+        raise ValueError(f"Lesson plan {cohort_id or '?'} has no lessons")
+
+    last = len(rows) - 1
+    entries = tuple(
+        StepEntry(
+            index=i,
+            unit_idx=u,
+            lesson_idx=l,
+            step_idx=s,
+            step=step,
+            lesson=lesson,
+            next_index=min(i + 1, last),
+            prev_index=max(i - 1, 0),
+            lesson_start=start,
+            is_end=step.get("type") == "end",
+        )
+        for i, (u, l, s, step, lesson, start) in enumerate(rows)
+    )
+    coord_index = {(e.unit_idx, e.lesson_idx, e.step_idx): e.index for e in entries}
+
+    return CompiledPlan(
+        cohort_id=cohort_id or plan.get("cohort_id", ""),
+        plan=plan,
+        steps=entries,
+        lesson_index=lesson_index,
+        coord_index=coord_index,
+    )
+
+
+# cohort_id -> (plan file mtime, compiled plan)
+_COMPILED: Dict[str, Tuple[float, CompiledPlan]] = {}
+
+
+def get_compiled_plan(cohort_id: str) -> CompiledPlan:
+    """
+    Compiled plan for a cohort; reloads only when the plan file has changed.
+    """
+    path = PLANS_DIR / f"{cohort_id}.json"
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        mtime = -1.0  # let load_plan raise its usual error
+
+    cached: Optional[Tuple[float, CompiledPlan]] = _COMPILED.get(cohort_id)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    compiled = compile_plan(load_plan(cohort_id), cohort_id)
+    _COMPILED[cohort_id] = (mtime, compiled)
+    return compiled
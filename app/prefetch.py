@@ -0,0 +1,163 @@
+"""
+Speculative generation of a cohort's next lesson step.
+
+Lesson plans are a fixed sequence, so while the current step is being spoken we
+already know what comes next. prefetch_next() generates that step's teacher text
+(and optionally its TTS audio) on a background thread; take() hands it over when
+the cohort gets there, waiting for it if it is still in flight.
+
+Entries live in a small LRU cache keyed by (cohort, cursor). Each entry remembers
+the cohort's epoch (classroom_state.get_cohort_epoch): after a reset or jump the
+cohort's entries are dropped instead of served.
+
+The text also goes through teacher_teach_step, so it lands in the shared response
+cache and a later session (another process) still finds it there.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+from app.classroom_state import get_cohort_epoch, get_or_create_cohort_state
+from app.metrics import cache_lookup, gauge
+from app.plan_cursor import get_compiled_plan
+from app.response_cache import NAME_PLACEHOLDER, render
+from app.teacher_openai import teacher_teach_step
+from app.tracing import span
+
+MAX_ENTRIES = 16
+
+# Also render the prefetched step to a WAV (TEACHER_PREFETCH_AUDIO=1)
+PREFETCH_AUDIO = os.getenv("TEACHER_PREFETCH_AUDIO", "0") == "1"
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class Prefetched:
+    cohort_id: str
+    cursor: int
+    epoch: int
+    future: "Future[Tuple[str, Optional[str]]]"  # (name-agnostic text, audio path)
+    name: str                                     # who the audio is addressed to
+
+
+class StepPrefetcher:
+    def __init__(self, max_entries: int = MAX_ENTRIES, with_audio: bool = PREFETCH_AUDIO):
+        self.max_entries = max_entries
+        self.with_audio = with_audio
+        self._entries: "OrderedDict[Tuple[str, int], Prefetched]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="step-prefetch")
+        self.hits = 0
+        self.misses = 0
+
+    def _generate(self, cohort_id: str, cursor: int, student: dict) -> Tuple[str, Optional[str]]:
+        compiled = get_compiled_plan(cohort_id)
+        e = compiled.entry(cursor)
+        cohort_state = {"cursor": e.index, "unit_idx": e.unit_idx, "lesson_idx": e.lesson_idx, "step_idx": e.step_idx}
+
+        with span("prefetch.generate", cohort=cohort_id, cursor=cursor):
+            template = teacher_teach_step({**student, "name": NAME_PLACEHOLDER}, compiled.plan, cohort_state, e.lesson, e.step)
+
+            audio_path = None
+            if self.with_audio:
+                from app.broadcast import AUDIO_DIR
+                from app.tts_local import synthesize_to_wav
+
+                text = render(template, student.get("name", "Student"))
+                wav = AUDIO_DIR / f"{hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]}.wav"
+                audio_path = str(wav) if wav.exists() else synthesize_to_wav(text, str(wav))
+        return template, audio_path
+
+    def _drop_stale(self, cohort_id: str, epoch: int) -> None:
+        for key in [k for k, p in self._entries.items() if k[0] == cohort_id and p.epoch != epoch]:
+            del self._entries[key]
+
+    def prefetch_next(self, cohort_id: str, student: dict) -> Optional[int]:
+        """
+        Start generating the step after the cohort's current one. Returns its cursor,
+        or None if there is nothing further to teach (or it is already queued).
+        """
+        compiled = get_compiled_plan(cohort_id)
+        cursor = get_or_create_cohort_state(cohort_id)["cursor"]
+        nxt = compiled.advance(cursor)
+        if nxt == cursor or compiled.entry(nxt).is_end:
+            return None
+        return self.prefetch(cohort_id, nxt, student)
+
+    def prefetch(self, cohort_id: str, cursor: int, student: dict) -> Optional[int]:
+        epoch = get_cohort_epoch(cohort_id)
+        key = (cohort_id, cursor)
+        with self._lock:
+            self._drop_stale(cohort_id, epoch)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return None
+            fut = self._pool.submit(self._generate, cohort_id, cursor, dict(student))
+            self._entries[key] = Prefetched(cohort_id, cursor, epoch, fut, student.get("name", "Student"))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return cursor
+
+    def take(self, cohort_id: str, cursor: int, student: dict, timeout: Optional[float] = None) -> Optional[Tuple[str, Optional[str]]]:
+        """
+        (text for this student, audio path or None) if the step was prefetched, else None.
+        """
+        epoch = get_cohort_epoch(cohort_id)
+        with self._lock:
+            self._drop_stale(cohort_id, epoch)
+            entry = self._entries.pop((cohort_id, cursor), None)
+
+        if entry is None:
+            self.misses += 1
+            cache_lookup("prefetch", False)
+            return None
+        try:
+            template, audio_path = entry.future.result(timeout=timeout)
+        except Exception as e:
+            log.warning("prefetch of %s step %d failed: %s", cohort_id, cursor, e)
+            self.misses += 1
+            cache_lookup("prefetch", False)
+            return None
+
+        self.hits += 1
+        cache_lookup("prefetch", True)
+        name = student.get("name", "Student")
+        # The audio says the name it was rendered for
+        return render(template, name), (audio_path if entry.name == name else None)
+
+    def pending(self) -> int:
+        """
+        Prefetches queued or still generating.
+        """
+        with self._lock:
+            return sum(1 for p in self._entries.values() if not p.future.done())
+
+    def invalidate(self, cohort_id: Optional[str] = None) -> None:
+        with self._lock:
+            for key in [k for k in self._entries if cohort_id is None or k[0] == cohort_id]:
+                self._entries[key].future.cancel()
+                del self._entries[key]
+
+    def drain(self, timeout: Optional[float] = None) -> None:
+        """
+        Wait for queued prefetches (so their results reach the disk caches before exit).
+        """
+        with self._lock:
+            futures = [p.future for p in self._entries.values()]
+        for fut in futures:
+            try:
+                fut.result(timeout=timeout)
+            except Exception:
+                pass  # reported by take(); a failed prefetch just means a normal generation later
+
+
+prefetcher = StepPrefetcher()
+
+gauge("teacher_prefetch_pending", "Step prefetches queued or generating").set_function(prefetcher.pending)
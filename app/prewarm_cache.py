@@ -0,0 +1,47 @@
+import sys
+
+from app.plan_cursor import get_compiled_plan
+from app.teacher_openai import teacher_welcome, teacher_teach_step
+from app.response_cache import NAME_PLACEHOLDER, response_cache
+
+
+def prewarm(cohort_id: str) -> int:
+    """
+    Generate and cache the welcome for every lesson and the text for every step.
+    Returns number of entries written/refreshed.
+    """
+    compiled = get_compiled_plan(cohort_id)
+    plan = compiled.plan
+    student = {"name": NAME_PLACEHOLDER, "subject": plan.get("subject", "")}
+    count = 0
+
+    for e in compiled.steps:
+        # Same state a live turn has at this cursor, so step context matches what it would see
+        cohort_state = {"cursor": e.index, "unit_idx": e.unit_idx, "lesson_idx": e.lesson_idx, "step_idx": e.step_idx}
+
+        if e.index == e.lesson_start:
+            teacher_welcome(student, plan, cohort_state, e.lesson)
+            count += 1
+
+        if e.is_end:
+            continue
+        teacher_teach_step(student, plan, cohort_state, e.lesson, e.step)
+        count += 1
+        print(f"  cached U{e.unit_idx + 1} L{e.lesson_idx + 1} step {e.step_idx + 1}")
+
+    return count
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python -m app.prewarm_cache <COHORT_ID>")
+        print("Example: python -m app.prewarm_cache Year7_Maths_Term1")
+        raise SystemExit(1)
+
+    cohort_id = sys.argv[1]
+    n = prewarm(cohort_id)
+    print(f"✅ Pre-warmed {n} responses for {cohort_id} ({response_cache.stats()['entries']} in cache)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Opt-in per-turn profiling that keeps the N slowest turns.
+
+    TEACHER_PROFILE=1                    # or --profile on run_demo / broadcast / load_test
+    TEACHER_PROFILE_DIR=data/profiles
+    TEACHER_PROFILE_KEEP=5               # keep this many slowest turns (older, faster ones are deleted)
+    TEACHER_PROFILE_MODE=sample          # sample: stack sampler over the turn's threads (caller + stage workers)
+                                         # cprofile: cProfile of the calling thread only (.prof, for pstats/snakeviz)
+    TEACHER_PROFILE_INTERVAL_MS=5        # sampler period
+    TEACHER_PROFILE_TORCH=1              # also torch.profiler around the ECAPA / Whisper calls
+
+Output per kept turn, named <turn id>_<ms>ms:
+    .folded              collapsed stacks ("thread;outer;...;inner count"), one line per stack
+    .torch.<stage>.folded  torch.profiler stacks weighted by self CPU time (us)
+    .prof                cProfile stats (cprofile mode)
+
+Collapsed stacks feed straight into flamegraph.pl, speedscope or inferno. The
+sampler only records threads working for the profiled turn: the one that entered
+profile_turn and any thread inside turn_thread() (TurnGraph wraps every sync stage
+in it), so other classrooms' concurrent turns stay out of the file. Only one
+turn per process is profiled at a time; turns that start while another is being
+profiled run unprofiled. The keep-N bound also counts turns already in
+TEACHER_PROFILE_DIR from earlier runs. With TEACHER_PROFILE_TORCH=1, model stages
+that would overlap are run one after the other.
+"""
+
+import contextvars
+import cProfile
+import heapq
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+PROFILE_DIR = Path(os.getenv("TEACHER_PROFILE_DIR", "data/profiles"))
+PROFILE_KEEP = int(os.getenv("TEACHER_PROFILE_KEEP", "5"))
+PROFILE_MODE = os.getenv("TEACHER_PROFILE_MODE", "sample")
+PROFILE_INTERVAL_MS = float(os.getenv("TEACHER_PROFILE_INTERVAL_MS", "5"))
+
+_enabled = os.getenv("TEACHER_PROFILE", "0") == "1"
+_torch = os.getenv("TEACHER_PROFILE_TORCH", "0") == "1"
+
+# Turn being profiled in this context (set by profile_turn, read by torch_stage)
+_turn: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("teacher_profile_turn", default=None)
+
+_active = threading.Lock()   # one profiled turn at a time
+_threads_lock = threading.Lock()
+_turn_threads: Counter = Counter()  # thread ident -> nesting depth, while working for the profiled turn
+_torch_lock = threading.Lock()  # torch.profiler is process-wide: one session at a time
+_kept_lock = threading.Lock()
+_kept: List[Tuple[float, str]] = []  # min-heap of (duration, turn id)
+_seeded = False
+_seq = 0
+
+# <turn id>_<ms>ms.<ext> as written by profile_turn
+_KEPT_NAME = re.compile(r"^(?P<turn>.+)_(?P<ms>\d+)ms\.")
+
+
+def enable(keep: Optional[int] = None, mode: Optional[str] = None, torch_stages: Optional[bool] = None) -> None:
+    global _enabled, PROFILE_KEEP, PROFILE_MODE, _torch
+    if mode is not None and mode not in ("sample", "cprofile"):
+        raise ValueError(f"Unknown profile mode: {mode}")
+    _enabled = True
+    PROFILE_KEEP = keep if keep is not None else PROFILE_KEEP
+    PROFILE_MODE = mode or PROFILE_MODE
+    _torch = _torch if torch_stages is None else torch_stages
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def add_cli_flags(parser) -> None:
+    """
+    --profile / --profile-keep / --profile-mode / --profile-torch on an argparse parser.
+    """
+    parser.add_argument("--profile", action="store_true", help="Profile turns, keep the slowest (see app/profiling.py)")
+    parser.add_argument("--profile-keep", type=int, default=None, help="How many slowest turns to keep")
+    parser.add_argument(
+        "--profile-mode",
+        choices=["sample", "cprofile"],
+        default=None,
+        help="sample: every thread (default); cprofile: only the calling thread, which in run_demo "
+             "just waits on the stage pool",
+    )
+    parser.add_argument("--profile-torch", action="store_true", help="Also torch.profiler the model stages")
+
+
+def enable_from_args(args) -> None:
+    if getattr(args, "profile", False):
+        enable(keep=args.profile_keep, mode=args.profile_mode, torch_stages=args.profile_torch or None)
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Samples Python stacks every `interval_s` on a daemon thread: every thread, or
+    only the idents `threads()` returns at each tick.
+    """
+
+    def __init__(self, interval_s: float, threads: Optional[Callable[[], Set[int]]] = None):
+        self.interval_s = interval_s
+        self.threads = threads  # idents to sample each tick (None: every thread)
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        names: Dict[int, str] = {}
+        while not self._stop.wait(self.interval_s):
+            frames = sys._current_frames()
+            wanted = self.threads() if self.threads is not None else None
+            for ident, frame in frames.items():
+                if ident == me or (wanted is not None and ident not in wanted):
+                    continue
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def write_folded(self, path: Path) -> None:
+        with path.open("w", encoding="utf-8") as f:
+            for stack, n in self.stacks.most_common():
+                f.write(f"{stack} {n}\n")
+
+
+def _sampled_threads() -> Set[int]:
+    with _threads_lock:
+        return set(_turn_threads)
+
+
+@contextmanager
+def turn_thread() -> Iterator[None]:
+    """
+    Count the calling thread as working for the profiled turn while inside (no-op
+    unless this context belongs to a profiled turn).
+    """
+    if _turn.get() is None:
+        yield
+        return
+    ident = threading.get_ident()
+    with _threads_lock:
+        _turn_threads[ident] += 1
+    try:
+        yield
+    finally:
+        with _threads_lock:
+            _turn_threads[ident] -= 1
+            if _turn_threads[ident] <= 0:
+                del _turn_threads[ident]
+
+
+def _new_turn_id() -> str:
+    global _seq
+    with _kept_lock:
+        _seq += 1
+        return f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{_seq:04d}"
+
+
+def _turn_files(turn_id: str) -> List[Path]:
+    return [*PROFILE_DIR.glob(f"{turn_id}_*"), *PROFILE_DIR.glob(f"{turn_id}.*")]
+
+
+def _seed_kept() -> None:
+    """
+    Load turns kept by earlier processes (duration is in the file name), so the
+    PROFILE_KEEP bound holds across runs, not just within one. Caller holds _kept_lock.
+    """
+    global _seeded
+    if _seeded:
+        return
+    _seeded = True
+    durations: Dict[str, float] = {}
+    for p in PROFILE_DIR.glob("*ms.*"):
+        m = _KEPT_NAME.match(p.name)
+        if m:
+            durations[m.group("turn")] = int(m.group("ms")) / 1000.0
+    _kept.extend((d, t) for t, d in durations.items())
+    heapq.heapify(_kept)
+    evicted = []
+    while len(_kept) > PROFILE_KEEP:
+        evicted.append(heapq.heappop(_kept)[1])
+    for turn_id in evicted:
+        for p in _turn_files(turn_id):
+            p.unlink(missing_ok=True)
+
+
+def _keep(turn_id: str, duration: float) -> bool:
+    """
+    Record a finished turn; True if it is among the slowest PROFILE_KEEP so far.
+    Files of the turn it displaces are deleted.
+    """
+    with _kept_lock:
+        _seed_kept()
+        if len(_kept) < PROFILE_KEEP:
+            heapq.heappush(_kept, (duration, turn_id))
+            return True
+        if duration <= _kept[0][0]:
+            return False
+        _, evicted = heapq.heapreplace(_kept, (duration, turn_id))
+    for p in _turn_files(evicted):
+        p.unlink(missing_ok=True)
+    return True
+
+
+@contextmanager
+def profile_turn(turn_id: Optional[str] = None) -> Iterator[Optional[str]]:
+    """
+    Profile the enclosed turn; yields its turn id (None when not profiled).
+    """
+    if not _enabled or not _active.acquire(blocking=False):
+        yield None
+        return
+
+    turn_id = turn_id or _new_turn_id()
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    token = _turn.set(turn_id)
+    sampler: Optional[StackSampler] = None
+    prof: Optional[cProfile.Profile] = None
+    if PROFILE_MODE == "cprofile":
+        prof = cProfile.Profile()
+        prof.enable()
+    else:
+        sampler = StackSampler(PROFILE_INTERVAL_MS / 1000.0, threads=_sampled_threads)
+        sampler.start()
+
+    t0 = time.perf_counter()
+    try:
+        with turn_thread():
+            yield turn_id
+    finally:
+        duration = time.perf_counter() - t0
+        if prof is not None:
+            prof.disable()
+        if sampler is not None:
+            sampler.stop()
+        _turn.reset(token)
+        _active.release()
+
+        stem = PROFILE_DIR / f"{turn_id}_{duration * 1000:.0f}ms"
+        if _keep(turn_id, duration):
+            if prof is not None:
+                prof.dump_stats(f"{stem}.prof")
+            if sampler is not None:
+                sampler.write_folded(Path(f"{stem}.folded"))
+            # torch traces were written under the bare turn id while the turn ran
+            for p in PROFILE_DIR.glob(f"{turn_id}.torch.*"):
+                p.rename(PROFILE_DIR / p.name.replace(turn_id, stem.name, 1))
+        else:
+            for p in _turn_files(turn_id):
+                p.unlink(missing_ok=True)
+
+
+@contextmanager
+def torch_stage(name: str) -> Iterator[None]:
+    """
+    torch.profiler around one model call inside a profiled turn (TEACHER_PROFILE_TORCH=1).
+    """
+    turn_id = _turn.get()
+    if not _torch or turn_id is None:
+        yield
+        return
+
+    from torch.profiler import ProfilerActivity, profile
+
+    # Stages run in parallel on the turn pool; overlapping sessions are not supported,
+    # so the second model waits (only while profiling)
+    with _torch_lock:
+        with profile(activities=[ProfilerActivity.CPU], with_stack=True) as prof:
+            yield
+        prof.export_stacks(str(PROFILE_DIR / f"{turn_id}.torch.{name}.folded"), "self_cpu_time_total")
@@ -0,0 +1,306 @@
+"""
+Prompt assembly for the teacher calls.
+
+Every system prompt is laid out as:
+    stable prefix  -> role, style rules, plan + lesson context
+    volatile suffix -> student name, memory summary, similar past questions,
+                       retrieved curriculum
+
+The prefix only depends on (kind, cohort, unit, lesson, step) so it is rendered
+once and memoized. Keeping it byte-identical at the front of the prompt also lets
+the provider reuse its prompt-prefix cache across students.
+"""
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+# Bump when the wording of any template below changes (used by response caches).
+PROMPT_VERSION = "4"
+
+# Max input tokens per call (system + user). Memory and curriculum get trimmed first.
+DEFAULT_TOKEN_BUDGET = 2500
+
+try:
+    # Optional: exact token counts when tiktoken is installed
+    import tiktoken
+
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:  # pragma: no cover - optional dependency
+    _ENCODING = None
+
+
+TEACHER_STYLE_RULES = """
+STYLE (talk like a real UK classroom teacher):
+- Use warm, encouraging language.
+- Use the student name naturally.
+- Praise effort: "Good question", "Well done", "You're thinking well".
+- If the student is confused, simplify and use a different example.
+- Keep it spoken, simple, and clear for text-to-speech.
+- No markdown, no symbols like **, no bullet characters, no weird formatting.
+- Short sentences are better than long sentences.
+""".strip()
+
+
+_ROLES = {
+    "welcome": """
+You are a classroom teacher.
+Your task: welcome the student and tell them what we are learning today.
+
+Rules:
+1) Start with the student's name followed by a comma.
+2) Be friendly and teacher-like.
+3) Mention term, unit, and lesson.
+4) Keep it short (2 to 4 sentences).
+""",
+    "teach_step": """
+You are a classroom teacher teaching a lesson in order.
+
+You MUST teach the CURRENT STEP only.
+Do not jump ahead to future steps.
+Do not introduce new topics outside the lesson context.
+
+Rules:
+1) Start with the student's name followed by a comma.
+2) Teach the step in a clear spoken way.
+3) If the step is "check_question", ask ONLY that check question.
+4) No markdown or symbols.
+""",
+    "answer": """
+You are a classroom teacher.
+
+A student asked a question while we are in the middle of a lesson.
+Answer the question kindly, then return to the lesson.
+
+Rules:
+1) Start with the student's name followed by a comma.
+2) First say something encouraging like:
+   "Good question" or "You're thinking well".
+3) Answer in simple spoken language.
+4) Use an example if needed.
+5) Then end with a short transition sentence:
+   "Now let's continue our lesson from where we stopped."
+6) Do NOT teach the next step. Just resume verbally.
+7) No markdown or symbols.
+""",
+}
+
+
+# Memoized prefixes kept (LRU): a handful of lessons' worth of steps across all kinds
+PREFIX_CACHE_MAX = int(os.getenv("TEACHER_PREFIX_CACHE", "256"))
+
+# (kind, cohort_id, unit_idx, lesson_idx, step_idx) -> (prefix text, prefix tokens)
+_PREFIX_CACHE: "OrderedDict[Tuple[Any, ...], Tuple[str, int]]" = OrderedDict()
+_prefix_lock = threading.Lock()
+_PREFIX_STATS = {"hits": 0, "misses": 0}
+
+
+def count_tokens(text: str) -> int:
+    """
+    Token count for a piece of prompt text (approximate without tiktoken).
+    """
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    # ~4 chars per token for English prose
+    return (len(text) + 3) // 4
+
+
+def lesson_context_text(plan: dict, cohort_state: dict, lesson: dict, step: dict) -> str:
+    # Build a friendly “where we are” summary
+    year = plan.get("year", "Year 7")
+    subject = plan.get("subject", "Maths")
+    term = plan.get("term", "this term")
+
+    unit_idx = cohort_state.get("unit_idx", 0)
+    lesson_idx = cohort_state.get("lesson_idx", 0)
+    step_idx = cohort_state.get("step_idx", 0)
+
+    unit = plan["units"][unit_idx]
+    unit_title = unit.get("unit_title", f"Unit {unit_idx + 1}")
+    lesson_title = lesson.get("lesson_title", f"Lesson {lesson_idx + 1}")
+
+    objectives = lesson.get("objectives", [])
+    obj_text = " ".join([f"Objective: {o}" for o in objectives[:3]])
+
+    step_type = step.get("type", "explain")
+    step_text = step.get("text", "")
+
+    return f"""
+CLASS CONTEXT:
+- Year group: {year}
+- Subject: {subject}
+- Term: {term}
+- Unit: {unit_title}
+- Lesson: {lesson_title}
+- We are currently on step {step_idx + 1} of the lesson.
+{obj_text}
+
+CURRENT STEP TYPE: {step_type}
+CURRENT STEP CONTENT:
+{step_text}
+""".strip()
+
+
+def _welcome_context_text(plan: dict, cohort_state: dict, lesson: dict) -> str:
+    unit = plan["units"][cohort_state.get("unit_idx", 0)]
+    return f"""
+Context:
+- Year: {plan.get("year", "Year 7")}
+- Subject: {plan.get("subject", "Maths")}
+- Term: {plan.get("term", "this term")}
+- Unit: {unit.get("unit_title", "our unit")}
+- Lesson: {lesson.get("lesson_title", "today's lesson")}
+""".strip()
+
+
+def _prefix_key(kind: str, plan: dict, cohort_state: dict) -> Tuple[Any, ...]:
+    # The welcome does not depend on the step, so all steps share one prefix
+    step_idx = None if kind == "welcome" else int(cohort_state.get("step_idx", 0))
+    return (
+        kind,
+        plan.get("cohort_id", ""),
+        int(cohort_state.get("unit_idx", 0)),
+        int(cohort_state.get("lesson_idx", 0)),
+        step_idx,
+    )
+
+
+def build_prefix(kind: str, plan: dict, cohort_state: dict, lesson: dict, step: Optional[dict] = None) -> Tuple[str, int]:
+    """
+    Returns (prefix text, prefix tokens), rendering at most once per (kind, cohort, lesson, step).
+    """
+    if kind not in _ROLES:
+        raise ValueError(f"Unknown prompt kind: {kind}")
+
+    key = _prefix_key(kind, plan, cohort_state)
+    with _prefix_lock:
+        cached = _PREFIX_CACHE.get(key)
+        if cached is not None:
+            _PREFIX_CACHE.move_to_end(key)
+            _PREFIX_STATS["hits"] += 1
+            return cached
+        _PREFIX_STATS["misses"] += 1
+
+    if kind == "welcome":
+        ctx = _welcome_context_text(plan, cohort_state, lesson)
+    else:
+        ctx = lesson_context_text(plan, cohort_state, lesson, step or {})
+
+    text = f"{_ROLES[kind].strip()}\n\n{TEACHER_STYLE_RULES}\n\n{ctx}"
+    cached = (text, count_tokens(text))
+    with _prefix_lock:
+        _PREFIX_CACHE[key] = cached
+        while len(_PREFIX_CACHE) > PREFIX_CACHE_MAX:
+            _PREFIX_CACHE.popitem(last=False)
+    return cached
+
+
+def prefix_cache_stats() -> Dict[str, float]:
+    hits, misses = _PREFIX_STATS["hits"], _PREFIX_STATS["misses"]
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_rate": (hits / total) if total else 0.0}
+
+
+def clear_prefix_cache() -> None:
+    """
+    Drop memoized prefixes (call after editing lesson plans at runtime).
+    """
+    with _prefix_lock:
+        _PREFIX_CACHE.clear()
+        _PREFIX_STATS["hits"] = 0
+        _PREFIX_STATS["misses"] = 0
+
+
+def _trim_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Drop trailing lines until text fits, then hard-cut the last line.
+    """
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    lines = text.splitlines()
+    while len(lines) > 1 and count_tokens("\n".join(lines)) > max_tokens:
+        lines.pop()
+    out = "\n".join(lines)
+    if count_tokens(out) > max_tokens:
+        out = out[: max(0, max_tokens * 4 - 3)].rstrip() + "..."
+    return out
+
+
+def _suffix_text(
+    name: str,
+    memory_summary: str,
+    chunks: List[Dict[str, str]],
+    recall: Optional[List[Dict[str, Any]]] = None,
+) -> str:
+    parts = [f"Student name: {name}\nStart your reply with: \"{name},\""]
+    if memory_summary:
+        parts.append(f"WHAT WE KNOW ABOUT THIS STUDENT:\n{memory_summary}")
+    if recall:
+        past = "\n".join(f"- They asked: {r.get('q', '')} / We said: {r.get('a_short', '')}" for r in recall)
+        parts.append(f"SIMILAR QUESTIONS THIS STUDENT ASKED BEFORE:\n{past}")
+    if chunks:
+        excerpts = "\n\n".join(f"[{c.get('chunk_id', '')}] {c.get('text', '')}" for c in chunks)
+        parts.append(f"CURRICULUM EXCERPTS (use only if relevant):\n{excerpts}")
+    return "\n\n".join(parts)
+
+
+def build_messages(
+    kind: str,
+    student: dict,
+    plan: dict,
+    cohort_state: dict,
+    lesson: dict,
+    step: Optional[dict] = None,
+    question: Optional[str] = None,
+    memory_summary: str = "",
+    chunks: Optional[List[Dict[str, str]]] = None,
+    recall: Optional[List[Dict[str, Any]]] = None,
+    token_budget: int = DEFAULT_TOKEN_BUDGET,
+) -> List[Dict[str, str]]:
+    """
+    Builds chat messages as stable prefix + volatile suffix, enforcing token_budget.
+    Over budget: drop lowest-ranked chunks first, then past exchanges, then shorten
+    the memory summary.
+    """
+    name = student.get("name", "Student")
+    prefix, prefix_tokens = build_prefix(kind, plan, cohort_state, lesson, step)
+
+    chunks = list(chunks or [])
+    recall = list(recall or [])
+    base_tokens = prefix_tokens + count_tokens(question or "")
+
+    def _total() -> int:
+        return base_tokens + count_tokens(_suffix_text(name, memory_summary, chunks, recall))
+
+    while chunks and _total() > token_budget:
+        chunks.pop()
+    while recall and _total() > token_budget:
+        recall.pop()
+    if memory_summary and _total() > token_budget:
+        room = token_budget - base_tokens - count_tokens(_suffix_text(name, "", chunks, recall)) - 12  # heading
+        memory_summary = _trim_to_tokens(memory_summary, room)
+
+    system = f"{prefix}\n\n{_suffix_text(name, memory_summary, chunks, recall)}"
+    messages = [{"role": "system", "content": system}]
+    if question is not None:
+        messages.append({"role": "user", "content": question})
+
+    stats = prefix_cache_stats()
+    log.info(
+        "prompt kind=%s input_tokens=%d prefix_tokens=%d chunks=%d prefix_hit_rate=%.2f",
+        kind,
+        count_tokens(system) + count_tokens(question or ""),
+        prefix_tokens,
+        len(chunks),
+        stats["hit_rate"],
+    )
+    return messages
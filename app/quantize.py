@@ -0,0 +1,171 @@
+"""
+Quantized storage for embedding matrices (RAG chunks, voice prints).
+
+    float32  4 bytes/dim   reference
+    float16  2 bytes/dim   plain cast
+    int8     1 byte/dim    per-vector scale: x ~= q * scale, scale = max|x| / 127
+
+Rows are L2-normalised before quantizing, so a dot product is a cosine score.
+Scoring casts SCORE_BLOCK rows at a time, and int8 applies the scale after the
+dot: scores = (Q @ query) * scales.
+
+An optional float32 copy (memory-mapped, so it stays on disk until touched) lets
+search() re-rank the best `rerank` candidates at full precision.
+
+On disk (<dir>/):
+    vectors.npy   [N, D] float16 / int8 / float32
+    scales.npy    [N] float32 (int8 only)
+    full.npy      [N, D] float32 (only when keep_full=True)
+    meta.json     {"dtype", "dim", ...caller metadata}
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.ann_index import _normalise_rows
+
+DTYPES = ("float32", "float16", "int8")
+
+# Candidates re-scored in float32 when a full-precision copy exists
+DEFAULT_RERANK = 32
+
+# Rows dequantized per step while scoring
+SCORE_BLOCK = 4096
+
+
+def quantize(x: np.ndarray, dtype: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    (quantized rows, per-row scales or None). Rows should already be normalised.
+    """
+    if dtype == "float32":
+        return np.ascontiguousarray(x, dtype=np.float32), None
+    if dtype == "float16":
+        return x.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.abs(x).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        q = np.clip(np.rint(x / scales[:, None]), -127, 127).astype(np.int8)
+        return q, scales.astype(np.float32)
+    raise ValueError(f"Unknown dtype {dtype!r}; expected one of {DTYPES}")
+
+
+def dequantize(q: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+    x = q.astype(np.float32)
+    if scales is not None:
+        x *= scales[:, None]
+    return x
+
+
+class QuantizedMatrix:
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        scales: Optional[np.ndarray] = None,
+        full: Optional[np.ndarray] = None,
+        meta: Optional[Dict[str, Any]] = None,
+    ):
+        self.vectors = vectors
+        self.scales = scales
+        self.full = full
+        self.meta = meta or {}
+
+    @property
+    def dtype(self) -> str:
+        return str(self.vectors.dtype)
+
+    def __len__(self) -> int:
+        return int(self.vectors.shape[0])
+
+    @classmethod
+    def from_float(
+        cls,
+        x: np.ndarray,
+        dtype: str = "int8",
+        keep_full: bool = True,
+        meta: Optional[Dict[str, Any]] = None,
+    ) -> "QuantizedMatrix":
+        x = _normalise_rows(x)
+        q, scales = quantize(x, dtype)
+        meta = dict(meta or {})
+        meta.update({"dtype": dtype, "dim": int(x.shape[1])})
+        return cls(q, scales, x if keep_full and dtype != "float32" else None, meta)
+
+    def nbytes(self, include_full: bool = False) -> int:
+        """
+        Bytes of the resident (quantized) data; the float32 copy is counted only if asked.
+        """
+        n = self.vectors.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+        if include_full and self.full is not None:
+            n += self.full.nbytes
+        return int(n)
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        """
+        Cosine scores of every row against `query`.
+        """
+        q = np.asarray(query, dtype=np.float32).reshape(-1)
+        n = float(np.linalg.norm(q))
+        if n:
+            q = q / n
+        if self.vectors.dtype == np.float32:
+            return self.vectors @ q
+        # Dequantize one block at a time so the float32 temporary stays small;
+        # int8 rows are scaled after the dot instead of before
+        s = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), SCORE_BLOCK):
+            s[start:start + SCORE_BLOCK] = self.vectors[start:start + SCORE_BLOCK].astype(np.float32) @ q
+        if self.scales is not None:
+            s *= self.scales
+        return s
+
+    def search(self, query: np.ndarray, k: int = 4, rerank: int = DEFAULT_RERANK) -> List[Tuple[float, int]]:
+        """
+        [(score, row)] best first. With a float32 copy, the top max(k, rerank)
+        quantized hits are re-scored at full precision.
+        """
+        s = self.scores(query)
+        if s.size == 0:
+            return []
+
+        n_cand = min(s.size, max(k, rerank) if self.full is not None else k)
+        cand = np.argpartition(-s, n_cand - 1)[:n_cand]
+
+        if self.full is not None and rerank:
+            q = np.asarray(query, dtype=np.float32).reshape(-1)
+            n = float(np.linalg.norm(q))
+            if n:
+                q = q / n
+            cand = np.sort(cand)  # sequential reads from the mmap
+            s_cand = np.asarray(self.full[cand]) @ q
+        else:
+            s_cand = s[cand]
+
+        k = min(k, cand.size)
+        top = np.argsort(-s_cand)[:k]
+        return [(float(s_cand[i]), int(cand[i])) for i in top]
+
+    def save(self, out_dir: Path) -> Path:
+        out_dir.mkdir(parents=True, exist_ok=True)
+        np.save(out_dir / "vectors.npy", self.vectors)
+        for name, arr in (("scales.npy", self.scales), ("full.npy", self.full)):
+            if arr is not None:
+                np.save(out_dir / name, arr)
+            else:
+                (out_dir / name).unlink(missing_ok=True)
+        (out_dir / "meta.json").write_text(json.dumps(self.meta), encoding="utf-8")
+        return out_dir
+
+    @classmethod
+    def load(cls, in_dir: Path) -> "QuantizedMatrix":
+        scales = in_dir / "scales.npy"
+        full = in_dir / "full.npy"
+        return cls(
+            vectors=np.load(in_dir / "vectors.npy"),
+            scales=np.load(scales) if scales.exists() else None,
+            # Left on disk; only the re-ranked rows are ever paged in
+            full=np.load(full, mmap_mode="r") if full.exists() else None,
+            meta=json.loads((in_dir / "meta.json").read_text(encoding="utf-8")),
+        )
@@ -2,14 +2,19 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import json
-import os
+import logging
+import shutil
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 
 import numpy as np
-from openai import OpenAI
+from app.ann_index import IVFIndex
+from app.quantize import QuantizedMatrix
+from app.openai_client import TOKENS, call, get_client
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+log = logging.getLogger(__name__)
+
+client = get_client()
 
 PACK_DIR = Path("curriculum_packs")
 INDEX_DIR = Path(".rag_index")
@@ -26,6 +31,14 @@ def _index_path(pack_id: str) -> Path:
     return INDEX_DIR / f"{pack_id}.index.json"
 
 
+def _ann_dir(pack_id: str) -> Path:
+    return INDEX_DIR / f"{pack_id}.ivf"
+
+
+def _quant_dir(pack_id: str) -> Path:
+    return INDEX_DIR / f"{pack_id}.q"
+
+
 def load_pack(pack_id: str) -> Dict[str, Any]:
     path = _pack_path(pack_id)
     if not path.exists():
@@ -33,7 +46,22 @@ def load_pack(pack_id: str) -> Dict[str, Any]:
     return json.loads(path.read_text(encoding="utf-8"))
 
 
-def build_index(pack_id: str, model: str = "text-embedding-3-small") -> Path:
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+
+def embed_texts(texts: List[str], model: str = EMBEDDING_MODEL) -> List[List[float]]:
+    """
+    Embeddings for a batch of texts (one API call), in input order.
+    """
+    # OpenAI embeddings API supports batching
+    resp = call("embeddings", client.embeddings.create, model=model, input=texts)
+    usage = getattr(resp, "usage", None)
+    if usage is not None:
+        TOKENS.inc(usage.prompt_tokens or 0, kind="embeddings", type="prompt")
+    return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+
+
+def build_index(pack_id: str, model: str = EMBEDDING_MODEL) -> Path:
     """
     Builds embeddings for all chunks in a pack and stores them in .rag_index/<pack_id>.index.json
     """
@@ -46,9 +74,7 @@ def build_index(pack_id: str, model: str = "text-embedding-3-small") -> Path:
     texts = [c["text"] for c in chunks]
     chunk_ids = [c["chunk_id"] for c in chunks]
 
-    # OpenAI embeddings API supports batching
-    resp = client.embeddings.create(model=model, input=texts)
-    vectors = [d.embedding for d in resp.data]
+    vectors = embed_texts(texts, model=model)
 
     out = {
         "pack_id": pack_id,
@@ -58,9 +84,35 @@ def build_index(pack_id: str, model: str = "text-embedding-3-small") -> Path:
 
     path = _index_path(pack_id)
     path.write_text(json.dumps(out, indent=2), encoding="utf-8")
+
+    # ANN / quantized indexes were derived from the old embeddings: rebuild them explicitly
+    for d in (_ann_dir(pack_id), _quant_dir(pack_id)):
+        shutil.rmtree(d, ignore_errors=True)
+    _ann_cache.pop(pack_id, None)
+    _quant_cache.pop(pack_id, None)
     return path
 
 
+def _source_stamp(pack_id: str) -> Optional[int]:
+    """
+    st_mtime_ns of the embedding index a derived index was built from (None if missing).
+    """
+    try:
+        return _index_path(pack_id).stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _derived_is_current(pack_id: str, meta: Dict[str, Any], kind: str) -> bool:
+    if meta.get("source_mtime_ns") == _source_stamp(pack_id):
+        return True
+    log.warning(
+        "%s index for %s is older than its embedding index; ignoring it "
+        "(rebuild with: python -m app.build_rag_index %s --reuse-embeddings)", kind, pack_id, pack_id,
+    )
+    return False
+
+
 def load_index(pack_id: str) -> Dict[str, Any]:
     path = _index_path(pack_id)
     if not path.exists():
@@ -75,3 +127,90 @@ def cosine_sim(a: np.ndarray, b: np.ndarray) -> float:
     if denom == 0:
         return 0.0
     return float(np.dot(a, b) / denom)
+
+
+def build_ann(pack_id: str, nlist: Optional[int] = None, iters: int = 12, seed: int = 0) -> Path:
+    """
+    Builds an IVF-flat index (.rag_index/<pack_id>.ivf/) from the pack's embedding index.
+    """
+    idx = load_index(pack_id)
+    vectors = np.array([c["embedding"] for c in idx["chunks"]], dtype=np.float32)
+    ann = IVFIndex.build(
+        vectors,
+        nlist=nlist,
+        iters=iters,
+        seed=seed,
+        meta={
+            "pack_id": pack_id,
+            "embedding_model": idx["embedding_model"],
+            "chunk_ids": [c["chunk_id"] for c in idx["chunks"]],
+            "source_mtime_ns": _source_stamp(pack_id),
+        },
+    )
+    _ann_cache.pop(pack_id, None)
+    return ann.save(_ann_dir(pack_id))
+
+
+# pack_id -> ((meta mtime, source stamp), index or None when stale)
+_ann_cache: Dict[str, Tuple[Tuple[int, Optional[int]], Optional[IVFIndex]]] = {}
+
+
+def load_ann(pack_id: str) -> Optional[IVFIndex]:
+    """
+    The pack's IVF index (memory-mapped), or None if it was never built or was
+    built from an older embedding index. Reloaded when the files on disk change.
+    """
+    d = _ann_dir(pack_id)
+    meta = d / "meta.json"
+    if not meta.exists():
+        return None
+    stamp = (meta.stat().st_mtime_ns, _source_stamp(pack_id))
+    hit = _ann_cache.get(pack_id)
+    if hit is None or hit[0] != stamp:
+        ann = IVFIndex.load(d)
+        hit = (stamp, ann if _derived_is_current(pack_id, ann.meta, "IVF") else None)
+        _ann_cache[pack_id] = hit
+    return hit[1]
+
+
+def build_quantized(pack_id: str, dtype: str = "int8", keep_full: bool = True) -> Path:
+    """
+    Stores the pack's embeddings as float16 / int8 in .rag_index/<pack_id>.q/
+    (plus a float32 copy for re-ranking unless keep_full=False).
+    """
+    idx = load_index(pack_id)
+    vectors = np.array([c["embedding"] for c in idx["chunks"]], dtype=np.float32)
+    qm = QuantizedMatrix.from_float(
+        vectors,
+        dtype=dtype,
+        keep_full=keep_full,
+        meta={
+            "pack_id": pack_id,
+            "embedding_model": idx["embedding_model"],
+            "chunk_ids": [c["chunk_id"] for c in idx["chunks"]],
+            "source_mtime_ns": _source_stamp(pack_id),
+        },
+    )
+    _quant_cache.pop(pack_id, None)
+    return qm.save(_quant_dir(pack_id))
+
+
+_quant_cache: Dict[str, Tuple[Tuple[int, Optional[int]], Optional[QuantizedMatrix]]] = {}
+
+
+def load_quantized(pack_id: str) -> Optional[QuantizedMatrix]:
+    """
+    The pack's quantized embeddings, or None if they were never built or are
+    older than the embedding index.
+    """
+    d = _quant_dir(pack_id)
+    meta = d / "meta.json"
+    if not meta.exists():
+        return None
+    stamp = (meta.stat().st_mtime_ns, _source_stamp(pack_id))
+    hit = _quant_cache.get(pack_id)
+    if hit is None or hit[0] != stamp:
+        qm = QuantizedMatrix.load(d)
+        hit = (stamp, qm if _derived_is_current(pack_id, qm.meta, "Quantized") else None)
+        _quant_cache[pack_id] = hit
+    return hit[1]
@@ -2,42 +2,75 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import os
+
 import numpy as np
-from openai import OpenAI
-from typing import List, Dict
+from app.openai_client import call, get_client
+from typing import List, Dict, Optional
+
+from app.tracing import span, traced
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = get_client()
 
-from app.rag_index import load_pack, load_index, cosine_sim
+from app.rag_index import load_pack, load_index, load_ann, load_quantized, cosine_sim
+from app.rerank import POOL_FACTOR, best_window, rerank
 
+# IVF lists scanned per query when an ANN index exists (higher = better recall, slower)
+RAG_NPROBE = int(os.getenv("RAG_NPROBE", "8"))
 
+# Quantized candidates re-scored in float32 (0 = trust the quantized scores)
+RAG_RERANK = int(os.getenv("RAG_RERANK", "32"))
 
 
-def retrieve_semantic(pack_id: str, query: str, top_k: int = 4, max_chunk_chars: int = 900) -> List[Dict[str, str]]:
+@traced("rag.semantic")
+def retrieve_semantic(
+    pack_id: str,
+    query: str,
+    top_k: int = 4,
+    max_chunk_chars: int = 900,
+    nprobe: int = RAG_NPROBE,
+    objectives: Optional[List[str]] = None,
+) -> List[Dict[str, str]]:
+    """
+    Cosine retrieval over the pack's embeddings (IVF, quantized or exact), then
+    a lexical re-rank of a wider pool and best-window extraction per chunk.
+    """
     pack = load_pack(pack_id)
-    idx = load_index(pack_id)
+    ann = load_ann(pack_id)
+    quant = load_quantized(pack_id) if ann is None else None
+    idx = load_index(pack_id) if ann is None and quant is None else None
+    model = (ann or quant).meta["embedding_model"] if idx is None else idx["embedding_model"]
 
     # Embed query
-    q_resp = client.embeddings.create(model=idx["embedding_model"], input=query)
+    q_resp = call("embeddings", client.embeddings.create, model=model, input=query)
     q_vec = np.array(q_resp.data[0].embedding, dtype=np.float32)
 
-    # Create map from chunk_id -> text
-    text_map = {c["chunk_id"]: c["text"] for c in pack.get("chunks", [])}
-
-    scored = []
-    for item in idx["chunks"]:
-        cid = item["chunk_id"]
-        vec = np.array(item["embedding"], dtype=np.float32)
-        score = cosine_sim(q_vec, vec)
-        scored.append((score, cid))
-
-    scored.sort(key=lambda x: x[0], reverse=True)
-    top = scored[:top_k]
-
-    out = []
-    for score, cid in top:
-        t = (text_map.get(cid) or "").strip()
-        if len(t) > max_chunk_chars:
-            t = t[: max_chunk_chars - 3] + "..."
-        out.append({"chunk_id": cid, "text": t})
-    return out
+    # Create map from chunk_id -> chunk
+    chunk_map = {c["chunk_id"]: c for c in pack.get("chunks", [])}
+    pool_k = top_k * POOL_FACTOR
+
+    if ann is not None:
+        # Approximate search: only the nprobe closest IVF lists are scanned
+        with span("rag.ann", nprobe=nprobe):
+            chunk_ids = ann.meta["chunk_ids"]
+            top = [(score, chunk_ids[row]) for score, row in ann.search(q_vec, k=pool_k, nprobe=nprobe)]
+    elif quant is not None:
+        with span("rag.quantized", dtype=quant.dtype):
+            chunk_ids = quant.meta["chunk_ids"]
+            top = [(score, chunk_ids[row]) for score, row in quant.search(q_vec, k=pool_k, rerank=RAG_RERANK)]
+    else:
+        scored = []
+        for item in idx["chunks"]:
+            cid = item["chunk_id"]
+            vec = np.array(item["embedding"], dtype=np.float32)
+            score = cosine_sim(q_vec, vec)
+            scored.append((score, cid))
+
+        scored.sort(key=lambda x: x[0], reverse=True)
+        top = scored[:pool_k]
+
+    pool = [(score, chunk_map[cid]) for score, cid in top if cid in chunk_map]
+    best = rerank(query, [ch for _, ch in pool], [sc for sc, _ in pool], objectives=objectives, top_k=top_k)
+    return [
+        {"chunk_id": ch["chunk_id"], "text": best_window(ch.get("text") or "", query, max_chunk_chars)}
+        for ch in best
+    ]
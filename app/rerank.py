@@ -0,0 +1,174 @@
+"""
+Second-stage re-ranking for curriculum retrieval, using cheap lexical features only.
+
+The first stage (keyword overlap or cosine) returns a wider candidate pool; each
+candidate is re-scored on:
+  - coverage:   share of query terms present in the chunk
+  - proximity:  how tightly the query terms sit together (smallest window holding
+                every matched term) plus adjacent query bigrams
+  - heading:    query terms in the chunk's title / heading lines
+  - objective:  share of lesson-objective terms present
+  - first:      the first-stage score, scaled to 0..1 across the pool
+
+Then, instead of cutting each chunk at max_chars from the start, the best-matching
+window of lines/sentences within it is kept.
+
+Everything is linear in the candidate text, so a pool of ~20 chunks re-ranks in a
+few milliseconds.
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.curriculum_retriever import _tokenize
+
+# Candidates fetched per requested result before re-ranking
+POOL_FACTOR = 5
+
+WEIGHTS = {
+    "coverage": 1.0,
+    "proximity": 0.6,
+    "heading": 0.4,
+    "objective": 0.3,
+    "first": 0.5,
+}
+
+# Short lines without a full stop are treated as headings in the packs' PDF text
+_HEADING_MAX_CHARS = 60
+# A sentence (ends at ./!/? followed by whitespace, so "3.5" stays whole) or a line
+_SEGMENT_RE = re.compile(r"[^\n]*?(?:[.!?](?=\s)|\n|$)[ \t]*")
+
+
+def _headings(ch: Dict[str, Any]) -> str:
+    parts = [ch.get("title") or "", ch.get("heading") or ""]
+    for line in (ch.get("text") or "").splitlines():
+        line = line.strip()
+        if 0 < len(line) <= _HEADING_MAX_CHARS and not line.endswith("."):
+            parts.append(line)
+    return " ".join(parts)
+
+
+def _min_cover_span(positions: Dict[str, List[int]]) -> int:
+    """
+    Length (in terms) of the smallest window that contains every key of `positions`.
+    """
+    events = sorted((p, t) for t, ps in positions.items() for p in ps)
+    need = len(positions)
+    counts: Dict[str, int] = {}
+    best = len(events) + 1 if events else 0
+    lo = 0
+    for hi, (p_hi, t_hi) in enumerate(events):
+        counts[t_hi] = counts.get(t_hi, 0) + 1
+        while len(counts) == need:
+            p_lo, t_lo = events[lo]
+            best = min(best, p_hi - p_lo + 1)
+            counts[t_lo] -= 1
+            if not counts[t_lo]:
+                del counts[t_lo]
+            lo += 1
+    return best
+
+
+def features(
+    q_terms: Sequence[str],
+    ch: Dict[str, Any],
+    obj_terms: Optional[set] = None,
+) -> Dict[str, float]:
+    q_set = set(q_terms)
+    terms = _tokenize(ch.get("text") or "")
+    positions: Dict[str, List[int]] = {}
+    for i, t in enumerate(terms):
+        if t in q_set:
+            positions.setdefault(t, []).append(i)
+
+    matched = len(positions)
+    coverage = matched / len(q_set) if q_set else 0.0
+
+    proximity = 0.0
+    if matched >= 2:
+        span = _min_cover_span(positions)
+        tightness = matched / span if span else 0.0
+        pairs = set(zip(terms, terms[1:]))
+        q_pairs = list(zip(q_terms, q_terms[1:]))
+        bigrams = sum(1 for p in q_pairs if p in pairs) / len(q_pairs) if q_pairs else 0.0
+        proximity = 0.5 * tightness + 0.5 * bigrams
+
+    heading_terms = set(_tokenize(_headings(ch)))
+    heading = len(q_set & heading_terms) / len(q_set) if q_set else 0.0
+
+    objective = 0.0
+    if obj_terms:
+        objective = len(obj_terms.intersection(terms)) / len(obj_terms)
+
+    return {"coverage": coverage, "proximity": proximity, "heading": heading, "objective": objective}
+
+
+def rerank(
+    query: str,
+    candidates: List[Dict[str, Any]],
+    first_scores: Optional[List[float]] = None,
+    objectives: Optional[List[str]] = None,
+    top_k: int = 4,
+) -> List[Dict[str, Any]]:
+    """
+    Re-order candidate chunks by the weighted lexical features; returns the best top_k.
+    """
+    q_terms = _tokenize(query)
+    if not candidates or not q_terms:
+        return candidates[:top_k]
+    obj_terms = set(_tokenize(" ".join(objectives or []))) or None
+
+    first = [0.0] * len(candidates)
+    if first_scores:
+        lo, hi = min(first_scores), max(first_scores)
+        first = [(s - lo) / (hi - lo) if hi > lo else 1.0 for s in first_scores]
+
+    scored: List[Tuple[float, int, Dict[str, Any]]] = []
+    for i, ch in enumerate(candidates):
+        f = features(q_terms, ch, obj_terms)
+        f["first"] = first[i]
+        score = sum(WEIGHTS[k] * v for k, v in f.items())
+        # Earlier (first-stage) position breaks ties, so order stays deterministic
+        scored.append((score, -i, ch))
+
+    scored.sort(key=lambda x: (x[0], x[1]), reverse=True)
+    return [ch for _, _, ch in scored[:top_k]]
+
+
+def best_window(text: str, query: str, max_chars: int = 900) -> str:
+    """
+    The run of consecutive sentences/lines (at most max_chars) holding the most
+    query terms, with "..." where it was cut. Falls back to the head of the text.
+    """
+    text = (text or "").strip()
+    if len(text) <= max_chars:
+        return text
+
+    q_set = set(_tokenize(query))
+    segs = [s for s in _SEGMENT_RE.findall(text) if s]
+    if not q_set or len(segs) < 2:
+        return text[: max_chars - 3] + "..."
+
+    hits = [len(q_set.intersection(_tokenize(s))) for s in segs]
+    budget = max_chars - 6  # room for both ellipses
+
+    best = (-1, 0, 0)  # (hits, start, end)
+    start, length, total = 0, 0, 0
+    for end, seg in enumerate(segs):
+        length += len(seg)
+        total += hits[end]
+        while length > budget and start < end:
+            length -= len(segs[start])
+            total -= hits[start]
+            start += 1
+        if length <= budget and total > best[0]:
+            best = (total, start, end + 1)
+
+    if best[0] <= 0:
+        return text[: max_chars - 3] + "..."
+
+    _, s, e = best
+    window = "".join(segs[s:e]).strip()
+    prefix = "..." if s > 0 else ""
+    suffix = "..." if e < len(segs) else ""
+    return f"{prefix}{window}{suffix}"
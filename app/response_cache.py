@@ -0,0 +1,224 @@
+"""
+Cache of name-agnostic teacher outputs (welcome + teach step).
+
+Every student on the same step of the same plan gets the same explanation, so we
+generate it once with a placeholder name and fill the real name in afterwards.
+Entries expire after a TTL and the cache is LRU-bounded. It is persisted to disk
+so `python -m app.prewarm_cache <COHORT_ID>` can fill it ahead of a lesson. Writes
+are batched off the lookup path and merged into the file under a file lock, so
+several worker processes can share it without losing each other's entries.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.file_lock import file_lock
+from app.metrics import STATE_WRITE_BYTES, cache_lookup
+from app.prompt_builder import PROMPT_VERSION
+
+CACHE_PATH = Path(".cache/teacher_responses.json")
+
+# What the model sees as the student's name when generating a shared response
+NAME_PLACEHOLDER = "STUDENT_NAME"
+
+DEFAULT_TTL_S = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 2000
+
+# Puts within this window are written to disk together
+FLUSH_DELAY_S = 1.0
+
+
+def temperature_bucket(temperature: float) -> str:
+    # 0.3 and 0.31 are the same bucket, 0.3 and 0.4 are not
+    return f"{round(float(temperature), 1):.1f}"
+
+
+def make_key(
+    kind: str,
+    model: str,
+    plan: dict,
+    cohort_state: dict,
+    temperature: float,
+    with_step: bool = True,
+) -> str:
+    """
+    (kind, model, prompt version, plan, unit, lesson, step, temperature bucket) as a string key.
+    """
+    step = str(int(cohort_state.get("step_idx", 0))) if with_step else "-"
+    parts = [
+        kind,
+        model,
+        PROMPT_VERSION,
+        plan.get("cohort_id", ""),
+        str(int(cohort_state.get("unit_idx", 0))),
+        str(int(cohort_state.get("lesson_idx", 0))),
+        step,
+        temperature_bucket(temperature),
+    ]
+    return "|".join(parts)
+
+
+def render(template: str, name: str) -> str:
+    return template.replace(NAME_PLACEHOLDER, name)
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        path: Optional[Path] = CACHE_PATH,
+        ttl_s: float = DEFAULT_TTL_S,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        flush_delay_s: float = FLUSH_DELAY_S,
+    ):
+        self.path = path
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.flush_delay_s = flush_delay_s
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()  # key -> (created_at, text)
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.hits = 0
+        self.misses = 0
+
+        # Not yet on disk: new entries and (prefix, time) invalidations
+        self._dirty: Dict[str, Tuple[float, str]] = {}
+        self._invalidated: List[Tuple[str, float]] = []
+        self._flush_lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        if path is not None:
+            atexit.register(self.flush)
+
+    def _read_disk(self) -> Dict[str, Tuple[float, str]]:
+        if self.path is None or not self.path.exists():
+            return {}
+        try:
+            raw = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        return {key: (float(item["created_at"]), item["text"]) for key, item in raw.get("entries", {}).items()}
+
+    def _load(self) -> None:
+        # Lazy, once per process
+        self._loaded = True
+        for key, item in sorted(self._read_disk().items(), key=lambda kv: kv[1][0]):
+            self._entries[key] = item
+
+    def _schedule_flush(self) -> None:
+        # Caller holds self._lock. Several puts in a row become one write.
+        if self.path is None or self._timer is not None:
+            return
+        self._timer = threading.Timer(self.flush_delay_s, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def flush(self) -> None:
+        """
+        Merge pending changes into the file on disk. Other processes' entries are
+        kept (newest created_at wins per key) and picked up in memory too. Runs
+        outside the lookup lock, under a cross-process file lock.
+        """
+        if self.path is None:
+            return
+        with self._flush_lock:
+            with self._lock:
+                self._timer = None
+                dirty, self._dirty = self._dirty, {}
+                invalidated, self._invalidated = self._invalidated, []
+            if not dirty and not invalidated:
+                return
+
+            now = time.time()
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with file_lock(self.path):
+                merged = self._read_disk()
+                for prefix, at in invalidated:
+                    for k in [k for k, (ts, _) in merged.items() if k.startswith(prefix) and ts <= at]:
+                        del merged[k]
+                for k, item in dirty.items():
+                    if k not in merged or merged[k][0] <= item[0]:
+                        merged[k] = item
+                live = sorted(((k, v) for k, v in merged.items() if now - v[0] <= self.ttl_s), key=lambda kv: kv[1][0])
+                live = live[-self.max_entries:]
+
+                out = {"entries": {k: {"created_at": ts, "text": t} for k, (ts, t) in live}}
+                data = json.dumps(out, ensure_ascii=False).encode("utf-8")
+                tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+                tmp.write_bytes(data)
+                os.replace(tmp, self.path)
+            STATE_WRITE_BYTES.inc(len(data), store="response_cache")
+
+            # Entries other workers wrote meanwhile become visible here too
+            with self._lock:
+                for k, item in live:
+                    if k not in self._entries and k not in self._dirty:
+                        self._entries[k] = item
+                        self._entries.move_to_end(k, last=False)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            item = self._entries.get(key)
+            if item is None:
+                self.misses += 1
+                cache_lookup("response", False)
+                return None
+            created_at, text = item
+            if time.time() - created_at > self.ttl_s:
+                del self._entries[key]
+                self.misses += 1
+                cache_lookup("response", False)
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            cache_lookup("response", True)
+            return text
+
+    def put(self, key: str, text: str) -> None:
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            item = (time.time(), text)
+            self._entries[key] = item
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._dirty[key] = item
+            self._schedule_flush()
+
+    def invalidate(self, prefix: str = "") -> int:
+        """
+        Remove entries whose key starts with prefix (all entries when empty).
+        """
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            doomed = [k for k in self._entries if k.startswith(prefix)]
+            for k in doomed:
+                del self._entries[k]
+            for k in [k for k in self._dirty if k.startswith(prefix)]:
+                del self._dirty[k]
+            self._invalidated.append((prefix, time.time()))
+            self._schedule_flush()
+            return len(doomed)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / total) if total else 0.0,
+        }
+
+
+# Shared instance used by teacher_openai
+response_cache = ResponseCache()
@@ -1,13 +1,25 @@
+import argparse
+import logging
+import os
 from pathlib import Path
 
+from app.audio_utils import decode_audio
 from app.stt_local import transcribe
-from app.tts_local import speak
+from app.tts_local import play_wav, speak
 from app.voice_id import identify_speaker
 
 from app.memory import get_student_memory, update_student_progress, build_memory_summary
 
-from app.lesson_plan import load_plan, get_lesson, get_step
-from app.classroom_state import get_or_create_cohort_state, advance_step
+from app.classroom_state import advance_step, current_position
+from app.history_store import LESSON_STEP_PREFIX, start_compaction_from_env
+from app.log_setup import configure_logging
+from app.metrics import start_from_env as start_metrics
+
+from app.prefetch import prefetcher
+from app.profiling import add_cli_flags, enable_from_args, profile_turn
+from app.response_cache import NAME_PLACEHOLDER, render
+from app.turn_graph import Stage, TurnGraph
+from app.tracing import current_trace_id, traced
 
 from app.teacher_openai import (
     teacher_welcome,
@@ -15,6 +27,11 @@ from app.teacher_openai import (
     teacher_answer_question_and_resume,
 )
 
+log = logging.getLogger(__name__)
+
+# Print the per-stage timing / critical path after each turn (TEACHER_TURN_REPORT=1)
+TURN_REPORT = os.getenv("TEACHER_TURN_REPORT", "0") == "1"
+
 # Cohort / class we are teaching (matches lesson_plans/Year7_Maths_Term1.json)
 COHORT_ID = "Year7_Maths_Term1"
 
@@ -45,73 +62,16 @@ def find_audio_file() -> Path:
 
 def _reload_plan_state_step():
     """Reload plan/state/lesson/step based on current cohort_state (single source of truth)."""
-    plan = load_plan(COHORT_ID)
-    cohort_state = get_or_create_cohort_state(COHORT_ID)
-    lesson = get_lesson(plan, cohort_state["unit_idx"], cohort_state["lesson_idx"])
-    step = get_step(lesson, cohort_state["step_idx"])
-    return plan, cohort_state, lesson, step
-
-
-def main() -> None:
-    # 1) Audio input
-    audio_path = find_audio_file()
-    print(f"Using audio: {audio_path}")
+    return current_position(COHORT_ID)
 
-    # 2) Identify student
-    raw = identify_speaker(str(audio_path))
-    print(f"Raw speaker match: {raw}")
 
-    speaker = raw if raw else "Student"
-    STUDENT["name"] = speaker
-    print(f"Detected speaker (final): {speaker}")
-
-    # 3) Load memory summary (optional)
-    mem = get_student_memory(STUDENT["name"])
-    STUDENT["memory_summary"] = build_memory_summary(mem)
-
-    print(f"Detected speaker: {speaker}")
-
-    # 4) Transcribe question
-    question = transcribe(str(audio_path)).strip()
+def _print_question(transcript: str) -> None:
     print("\n--- TRANSCRIBED QUESTION ---")
-    print(question if question else "[No question detected]")
-
-    # 5) Load lesson plan + state + current step
-    plan, cohort_state, lesson, step = _reload_plan_state_step()
-
-    # 6) Welcome (later: do this once per day using memory)
-    welcome = teacher_welcome(STUDENT, plan, cohort_state, lesson)
-    print("\n--- TEACHER WELCOME ---")
-    print(welcome)
-    speak(welcome)
-
-    # 7) If student asked a question, answer and then truly resume teaching
-    if question:
-        answer = teacher_answer_question_and_resume(
-            STUDENT, plan, cohort_state, lesson, step, question
-        )
-
-        print("\n--- TEACHER ANSWER (Q&A) ---")
-        print(answer)
-        speak(answer)
+    print(transcript if transcript else "[No question detected]")
 
-        update_student_progress(
-            name=STUDENT["name"],
-            question=question,
-            answer=answer,
-            topic=plan.get("subject", STUDENT.get("subject")),
-        )
 
-        # ✅ KEY FIX:
-        # After Q&A, move forward one step so "resume" actually continues.
-        advance_step(COHORT_ID)
-
-        # Reload the new current step (the one we should teach now)
-        plan, cohort_state, lesson, step = _reload_plan_state_step()
-
-    # 8) If we land on an end step, advance again to the next lesson/unit if possible
-    # (Your advance_step() should handle rolling step_idx -> next lesson; if it doesn't,
-    # we'll adjust classroom_state next.)
+def _teach(plan: dict, cohort_state: dict, lesson: dict, step: dict) -> None:
+    # If we land on an end step, advance again to the next lesson/unit if possible
     if step.get("type") == "end":
         # Try to move into next lesson
         advance_step(COHORT_ID)
@@ -128,24 +88,161 @@ def main() -> None:
             speak(end_msg)
             return
 
-    # 9) Teach the current step in order
-    teach_text = teacher_teach_step(STUDENT, plan, cohort_state, lesson, step)
+    # Teach the current step in order (instant if it was prefetched)
+    hit = prefetcher.take(COHORT_ID, cohort_state["cursor"], STUDENT)
+    teach_text, teach_audio = hit if hit else (teacher_teach_step(STUDENT, plan, cohort_state, lesson, step), None)
+
+    # Generate the following step while this one is being spoken
+    prefetcher.prefetch_next(COHORT_ID, STUDENT)
 
     print("\n--- TEACHING CURRENT STEP ---")
     print(teach_text)
-    speak(teach_text)
+    if teach_audio:
+        play_wav(teach_audio)
+    else:
+        speak(teach_text)
 
     update_student_progress(
         name=STUDENT["name"],
-        question=f"[LESSON_STEP] {lesson.get('lesson_title')} - step {cohort_state['step_idx'] + 1}",
+        question=f"{LESSON_STEP_PREFIX} {lesson.get('lesson_title')} - step {cohort_state['step_idx'] + 1}",
         answer=teach_text,
         topic=plan.get("subject", STUDENT.get("subject")),
     )
 
-    # 10) Advance for next session
+    # Advance for next session
     advance_step(COHORT_ID)
     print("\nAdvanced lesson step for next session ✅")
 
 
+def build_turn() -> TurnGraph:
+    """
+    One turn as a stage graph. Independent work overlaps (speaker ID and
+    transcription, welcome generation, answer generation while the welcome is
+    spoken); prints and speech keep the order of the old sequential turn.
+    """
+
+    def audio():
+        audio_path = find_audio_file()
+        print(f"Using audio: {audio_path}")
+        # Decoded once; speaker ID and transcription share the buffer
+        return decode_audio(str(audio_path))
+
+    def speaker(audio):
+        raw = identify_speaker(audio.path, audio=audio)
+        print(f"Raw speaker match: {raw}")
+
+        name = raw if raw else "Student"
+        STUDENT["name"] = name
+        print(f"Detected speaker (final): {name}")
+        return name
+
+    def memory(speaker):
+        mem = get_student_memory(speaker)
+        STUDENT["memory_summary"] = build_memory_summary(mem)
+        print(f"Detected speaker: {speaker}")
+
+    def transcript(audio):
+        return transcribe(audio.path, audio=audio).strip()
+
+    def position():
+        return _reload_plan_state_step()
+
+    def welcome(position):
+        # Name-agnostic, so it does not wait for speaker ID
+        plan, cohort_state, lesson, _ = position
+        return teacher_welcome({**STUDENT, "name": NAME_PLACEHOLDER}, plan, cohort_state, lesson)
+
+    def say_welcome(welcome, speaker):
+        text = render(welcome, speaker)
+        print("\n--- TEACHER WELCOME ---")
+        print(text)
+        speak(text)
+
+    def answer(transcript, position):
+        # Needs the name and memory summary (ordered after the memory stage)
+        if not transcript:
+            return None
+        plan, cohort_state, lesson, step = position
+        return teacher_answer_question_and_resume(STUDENT, plan, cohort_state, lesson, step, transcript)
+
+    def prefetch_next(transcript):
+        # After Q&A we resume on the next step: start generating it now
+        if transcript:
+            prefetcher.prefetch_next(COHORT_ID, STUDENT)
+
+    def say_answer(answer, transcript, position):
+        if answer is None:
+            return position
+
+        print("\n--- TEACHER ANSWER (Q&A) ---")
+        print(answer)
+        speak(answer)
+
+        plan = position[0]
+        update_student_progress(
+            name=STUDENT["name"],
+            question=transcript,
+            answer=answer,
+            topic=plan.get("subject", STUDENT.get("subject")),
+        )
+
+        # After Q&A, move forward one step so "resume" actually continues.
+        advance_step(COHORT_ID)
+
+        # Reload the new current step (the one we should teach now)
+        return _reload_plan_state_step()
+
+    def teach(say_answer):
+        _teach(*say_answer)
+
+    return TurnGraph([
+        Stage("audio", audio),
+        Stage("speaker", speaker, deps=["audio"]),
+        Stage("memory", memory, deps=["speaker"]),
+        Stage("transcript", transcript, deps=["audio"]),
+        Stage("show_question", _print_question, deps=["transcript"], after=["memory"]),
+        Stage("position", position),
+        Stage("welcome", welcome, deps=["position"]),
+        Stage("say_welcome", say_welcome, deps=["welcome", "speaker"], after=["show_question"]),
+        Stage("answer", answer, deps=["transcript", "position"], after=["memory"]),
+        Stage("prefetch_next", prefetch_next, deps=["transcript"], after=["speaker"]),
+        # prefetch_next reads the live cursor: it must run before say_answer advances it
+        Stage("say_answer", say_answer, deps=["answer", "transcript", "position"], after=["say_welcome", "prefetch_next"]),
+        Stage("teach", teach, deps=["say_answer"]),
+    ])
+
+
+@traced("turn")
+def main() -> None:
+    parser = argparse.ArgumentParser(description="One classroom turn: listen, identify, answer, teach.")
+    add_cli_flags(parser)
+    enable_from_args(parser.parse_args())
+
+    configure_logging()
+    start_metrics()
+    start_compaction_from_env()
+
+    turn = build_turn()
+    # Same id as the trace when tracing is on, so profiles and spans line up
+    try:
+        with profile_turn(current_trace_id()) as turn_id:
+            turn.run()
+    finally:
+        # Hand the decoded audio back to the pool
+        if "audio" in turn.results:
+            turn.results["audio"].release()
+    if turn_id:
+        log.info("profiled turn %s", turn_id)
+
+    # Let the prefetch finish so the next session finds it in the response cache
+    prefetcher.drain()
+
+    if TURN_REPORT:
+        print("\n--- TURN STAGES ---")
+        print(turn.report())
+    else:
+        log.info("turn stages:\n%s", turn.report())
+
+
 if __name__ == "__main__":
     main()
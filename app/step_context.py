@@ -0,0 +1,187 @@
+"""
+Curriculum context precomputed per lesson-plan step.
+
+Every student at the same step needs the same curriculum excerpts, so an offline
+job (python -m app.build_step_context <COHORT_ID>) retrieves them once per step and
+writes a sidecar:
+
+    .rag_index/steps/<cohort_id>.json
+    {
+      "cohort_id", "pack_id", "mode", "top_k", "plan_mtime",
+      "chunks": {chunk_id: excerpt},        # each excerpt stored once
+      "steps":  [[chunk_id, ...], ...]      # indexed by plan cursor
+    }
+
+At run time step_chunks(cohort_id, cursor) is a list index plus dict lookups.
+A sidecar built for an older version of the plan is ignored.
+"""
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.curriculum_retriever import pick_pack_id, retrieve_curriculum_chunks
+from app.lesson_plan import PLANS_DIR
+from app.plan_cursor import get_compiled_plan
+
+CONTEXT_DIR = Path(".rag_index/steps")
+MODES = ("keyword", "semantic", "hybrid")
+
+# Reciprocal-rank-fusion constant for hybrid mode
+_RRF_K = 60
+
+log = logging.getLogger(__name__)
+
+
+def _sidecar_path(cohort_id: str) -> Path:
+    return CONTEXT_DIR / f"{cohort_id}.json"
+
+
+def _plan_mtime(cohort_id: str) -> float:
+    return os.stat(PLANS_DIR / f"{cohort_id}.json").st_mtime
+
+
+def _step_query(lesson: Dict[str, Any], step: Dict[str, Any]) -> str:
+    return f"{lesson.get('lesson_title', '')}. {step.get('text', '')}"
+
+
+def _retrieve(
+    mode: str,
+    pack_id: str,
+    query: str,
+    objectives: List[str],
+    top_k: int,
+    max_chunk_chars: int,
+) -> List[Dict[str, str]]:
+    if mode == "keyword":
+        return retrieve_curriculum_chunks(pack_id, query, top_k, max_chunk_chars, objectives=objectives)
+
+    from app.rag_retriever import retrieve_semantic  # needs the API and a built index
+
+    semantic = retrieve_semantic(pack_id, query, top_k, max_chunk_chars, objectives=objectives)
+    if mode == "semantic":
+        return semantic
+
+    keyword = retrieve_curriculum_chunks(pack_id, query, top_k, max_chunk_chars, objectives=objectives)
+    fused: Dict[str, Tuple[float, Dict[str, str]]] = {}
+    for ranked in (keyword, semantic):
+        for rank, ch in enumerate(ranked):
+            score = fused.get(ch["chunk_id"], (0.0, ch))[0] + 1.0 / (_RRF_K + rank + 1)
+            fused[ch["chunk_id"]] = (score, ch)
+    return [ch for _, ch in sorted(fused.values(), key=lambda x: x[0], reverse=True)[:top_k]]
+
+
+def build_step_context(
+    cohort_id: str,
+    mode: str = "keyword",
+    top_k: int = 4,
+    max_chunk_chars: int = 900,
+    pack_id: Optional[str] = None,
+) -> Path:
+    """
+    Retrieve top_k chunks for every step of the cohort's plan and write the sidecar.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode {mode!r}; expected one of {MODES}")
+
+    compiled = get_compiled_plan(cohort_id)
+    plan = compiled.plan
+    pack_id = pack_id or pick_pack_id({"subject": plan.get("subject", ""), "year": plan.get("year", "")})
+
+    chunks: Dict[str, str] = {}
+    steps: List[List[str]] = []
+    for e in compiled.steps:
+        found = _retrieve(
+            mode,
+            pack_id,
+            _step_query(e.lesson, e.step),
+            e.lesson.get("objectives", []),
+            top_k,
+            max_chunk_chars,
+        )
+        for ch in found:
+            # The first (earliest step's) excerpt wins; ids are what steps share
+            chunks.setdefault(ch["chunk_id"], ch["text"])
+        steps.append([ch["chunk_id"] for ch in found])
+
+    out = {
+        "cohort_id": cohort_id,
+        "pack_id": pack_id,
+        "mode": mode,
+        "top_k": top_k,
+        "plan_mtime": _plan_mtime(cohort_id),
+        "chunks": chunks,
+        "steps": steps,
+    }
+    path = _sidecar_path(cohort_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(out, ensure_ascii=False), encoding="utf-8")
+    _CACHE.pop(cohort_id, None)
+    return path
+
+
+# cohort_id -> (sidecar mtime, sidecar)
+_CACHE: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+
+def load_step_context(cohort_id: str) -> Optional[Dict[str, Any]]:
+    """
+    The cohort's sidecar, or None if it is missing or was built for another plan version.
+    """
+    path = _sidecar_path(cohort_id)
+    try:
+        mtime = os.stat(path).st_mtime
+    except FileNotFoundError:
+        return None
+
+    cached = _CACHE.get(cohort_id)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, json.loads(path.read_text(encoding="utf-8")))
+        _CACHE[cohort_id] = cached
+
+    ctx = cached[1]
+    try:
+        if ctx.get("plan_mtime") != _plan_mtime(cohort_id):
+            log.warning("step context for %s is stale; rebuild with python -m app.build_step_context %s", cohort_id, cohort_id)
+            return None
+    except FileNotFoundError:
+        return None
+    return ctx
+
+
+def step_chunks(cohort_id: str, cursor: Optional[int]) -> List[Dict[str, str]]:
+    """
+    Precomputed {chunk_id, text} excerpts for the step at `cursor` ([] if none).
+    """
+    ctx = load_step_context(cohort_id)
+    if ctx is None or cursor is None or not 0 <= cursor < len(ctx["steps"]):
+        return []
+    return [{"chunk_id": cid, "text": ctx["chunks"][cid]} for cid in ctx["steps"][cursor]]
+
+
+def seeded_question_chunks(
+    cohort_id: str,
+    cursor: Optional[int],
+    question: str,
+    objectives: Optional[List[str]] = None,
+    top_k: int = 4,
+    max_chunk_chars: int = 900,
+) -> List[Dict[str, str]]:
+    """
+    Keyword retrieval for a student's question, with the current step's precomputed
+    chunks added to the candidate pool. [] if the cohort has no sidecar.
+    """
+    ctx = load_step_context(cohort_id)
+    if ctx is None:
+        return []
+    seed = step_chunks(cohort_id, cursor)
+    return retrieve_curriculum_chunks(
+        ctx["pack_id"],
+        question,
+        top_k,
+        max_chunk_chars,
+        objectives=objectives,
+        seed_ids=[c["chunk_id"] for c in seed],
+    ) or seed
@@ -1,11 +1,43 @@
+import time
+from typing import Optional
+
 import whisper
 
+from app.audio_utils import AudioBuffer
+
+from app.metrics import histogram
+from app.profiling import torch_stage
+from app.torch_runtime import configure_torch, grad_mode, optimize_module
+from app.tracing import traced
+
+configure_torch()
+
 # Load once (faster for repeated runs)
 _MODEL = whisper.load_model("base")  # try "small" for better accuracy
+_MODEL.encoder = optimize_module("whisper", _MODEL.encoder)
+
+# Processing time / audio duration (below 1 = faster than real time)
+RTF = histogram("teacher_stt_real_time_factor", "Whisper processing time over audio duration",
+                buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 4.0))
+AUDIO_SECONDS = histogram("teacher_stt_audio_seconds", "Length of transcribed audio",
+                          buckets=(1, 2, 5, 10, 20, 30, 60, 120))
 
-def transcribe(audio_path: str) -> str:
+@traced("stt.whisper")
+def transcribe(audio_path: str, audio: Optional[AudioBuffer] = None) -> str:
     """
-    Transcribe an audio file to text using local Whisper.
+    Transcribe an audio file to text using local Whisper. Pass the turn's decoded
+    buffer as `audio` to skip decoding the file a second time.
     """
-    result = _MODEL.transcribe(audio_path)
+    t0 = time.perf_counter()
+    if audio is not None and audio.sr == whisper.audio.SAMPLE_RATE:
+        audio = audio.numpy()  # view, no copy; Whisper only reads it
+    else:
+        audio = whisper.load_audio(audio_path)
+    with torch_stage("whisper"), grad_mode("whisper"):
+        result = _MODEL.transcribe(audio)
+
+    duration = len(audio) / whisper.audio.SAMPLE_RATE
+    if duration > 0:
+        AUDIO_SECONDS.observe(duration)
+        RTF.observe((time.perf_counter() - t0) / duration)
     return (result.get("text") or "").strip()
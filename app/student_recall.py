@@ -0,0 +1,129 @@
+"""
+Per-student semantic recall over past questions.
+
+    data/recall/<student>.<dim>.f32     float32 rows, L2-normalised, append-only
+    data/recall/<student>.<dim>.jsonl   one metadata line per row: {"ts", "q", "a_short", "dim"}
+
+One file pair per embedding size, so rows from a different embedding model never
+share a matrix (queries only see rows of their own size). The vector file is
+loaded once and cached per process (refreshed when it grows; the
+TEACHER_RECALL_CACHE most recently used students are kept), so a lookup is one
+matrix-vector product plus a partial sort: well under a millisecond for
+thousands of past exchanges.
+"""
+
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.file_lock import file_lock
+from app.metrics import STATE_WRITE_BYTES
+from app.tracing import traced
+
+RECALL_DIR = Path("data/recall")
+
+# Students whose matrices stay in memory
+CACHE_STUDENTS = int(os.getenv("TEACHER_RECALL_CACHE", "64"))
+
+# (student slug, dim) -> (vector file size, matrix [N, D], metadata list), LRU
+_CACHE: "OrderedDict[Tuple[str, int], Tuple[int, np.ndarray, List[Dict[str, Any]]]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _slug(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_-]+", "_", name.strip()) or "_"
+
+
+def _paths(name: str, dim: int) -> Tuple[Path, Path]:
+    base = RECALL_DIR / f"{_slug(name)}.{dim}"
+    return base.with_name(base.name + ".f32"), base.with_name(base.name + ".jsonl")
+
+
+def _normalise(vec) -> np.ndarray:
+    v = np.asarray(vec, dtype=np.float32).reshape(-1)
+    n = float(np.linalg.norm(v))
+    return v / n if n else v
+
+
+@traced("recall.add")
+def add_exchange(name: str, question: str, answer: str, vec) -> None:
+    """
+    Append one exchange and its question embedding.
+    """
+    v = _normalise(vec)
+    a_short = answer.strip().replace("\n", " ")
+    if len(a_short) > 180:
+        a_short = a_short[:177] + "..."
+    meta = {
+        "ts": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "q": question.strip(),
+        "a_short": a_short,
+        "dim": int(v.shape[0]),
+    }
+
+    vec_path, meta_path = _paths(name, meta["dim"])
+    vec_path.parent.mkdir(parents=True, exist_ok=True)
+    line = (json.dumps(meta, ensure_ascii=False) + "\n").encode("utf-8")
+    with file_lock(vec_path):
+        with vec_path.open("ab") as f:
+            f.write(v.tobytes())
+        with meta_path.open("ab") as f:
+            f.write(line)
+    STATE_WRITE_BYTES.inc(v.nbytes + len(line), store="recall")
+
+
+def _load(name: str, dim: int) -> Optional[Tuple[np.ndarray, List[Dict[str, Any]]]]:
+    vec_path, meta_path = _paths(name, dim)
+    if not vec_path.exists() or not meta_path.exists():
+        return None
+
+    key = (_slug(name), dim)
+    size = vec_path.stat().st_size
+    with _cache_lock:
+        cached = _CACHE.get(key)
+        if cached is not None and cached[0] == size:
+            _CACHE.move_to_end(key)
+            return cached[1], cached[2]
+
+    meta = [json.loads(line) for line in meta_path.read_text(encoding="utf-8").splitlines() if line.strip()]
+    if not meta or size == 0:
+        return None
+    rows = min(size // (4 * dim), len(meta))  # tolerate a half-finished append
+    mat = np.fromfile(vec_path, dtype=np.float32, count=rows * dim).reshape(rows, dim)
+
+    with _cache_lock:
+        _CACHE[key] = (size, mat, meta[:rows])
+        _CACHE.move_to_end(key)
+        while len(_CACHE) > CACHE_STUDENTS:
+            _CACHE.popitem(last=False)
+    return mat, meta[:rows]
+
+
+@traced("recall.search")
+def recall_similar(name: str, vec, k: int = 3, min_score: float = 0.3) -> List[Dict[str, Any]]:
+    """
+    Top-k past exchanges most similar to the query embedding (cosine), best first.
+    """
+    q = _normalise(vec)
+    # Rows from another embedding model live in another file and are never compared
+    loaded = _load(name, int(q.shape[0]))
+    if loaded is None:
+        return []
+    mat, meta = loaded
+
+    scores = mat @ q
+    k = min(k, scores.shape[0])
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [
+        {**meta[i], "score": float(scores[i])}
+        for i in top
+        if scores[i] >= min_score
+    ]
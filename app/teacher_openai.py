@@ -1,123 +1,92 @@
-from openai import OpenAI
-from app.config import OPENAI_API_KEY
-
-client = OpenAI(api_key=OPENAI_API_KEY)
-
-
-def _teacher_style_rules() -> str:
-    return """
-STYLE (talk like a real UK classroom teacher):
-- Use warm, encouraging language.
-- Use the student name naturally.
-- Praise effort: "Good question", "Well done", "You're thinking well".
-- If the student is confused, simplify and use a different example.
-- Keep it spoken, simple, and clear for text-to-speech.
-- No markdown, no symbols like **, no bullet characters, no weird formatting.
-- Short sentences are better than long sentences.
-"""
-
-
-def _lesson_context_text(plan: dict, cohort_state: dict, lesson: dict, step: dict) -> str:
-    # Build a friendly “where we are” summary
-    year = plan.get("year", "Year 7")
-    subject = plan.get("subject", "Maths")
-    term = plan.get("term", "this term")
-
-    unit_idx = cohort_state.get("unit_idx", 0)
-    lesson_idx = cohort_state.get("lesson_idx", 0)
-    step_idx = cohort_state.get("step_idx", 0)
-
-    unit = plan["units"][unit_idx]
-    unit_title = unit.get("unit_title", f"Unit {unit_idx + 1}")
-    lesson_title = lesson.get("lesson_title", f"Lesson {lesson_idx + 1}")
-
-    objectives = lesson.get("objectives", [])
-    obj_text = " ".join([f"Objective: {o}" for o in objectives[:3]])
-
-    step_type = step.get("type", "explain")
-    step_text = step.get("text", "")
-
-    return f"""
-CLASS CONTEXT:
-- Year group: {year}
-- Subject: {subject}
-- Term: {term}
-- Unit: {unit_title}
-- Lesson: {lesson_title}
-- We are currently on step {step_idx + 1} of the lesson.
-{obj_text}
-
-CURRENT STEP TYPE: {step_type}
-CURRENT STEP CONTENT:
-{step_text}
-""".strip()
-
-
-def teacher_welcome(student: dict, plan: dict, cohort_state: dict, lesson: dict) -> str:
-    name = student.get("name", "Student")
-    year = plan.get("year", "Year 7")
-    subject = plan.get("subject", student.get("subject", "Maths"))
-    term = plan.get("term", "this term")
-    unit = plan["units"][cohort_state.get("unit_idx", 0)]
-    unit_title = unit.get("unit_title", "our unit")
-    lesson_title = lesson.get("lesson_title", "today's lesson")
-
-    system = f"""
-You are a classroom teacher.
-Your task: welcome the student and tell them what we are learning today.
-
-Student name: {name}
-
-Context:
-- Year: {year}
-- Subject: {subject}
-- Term: {term}
-- Unit: {unit_title}
-- Lesson: {lesson_title}
-
-Rules:
-1) Start with: "{name},"
-2) Be friendly and teacher-like.
-3) Mention term, unit, and lesson.
-4) Keep it short (2 to 4 sentences).
-{_teacher_style_rules()}
-"""
-
-    resp = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "system", "content": system}],
-        temperature=0.4,
-    )
+import logging
+from typing import Dict, List, Optional
+
+from app.history_store import recall_from_history
+from app.openai_client import TOKENS, call, get_client
+from app.prompt_builder import build_messages
+from app.rag_index import embed_texts
+from app.response_cache import NAME_PLACEHOLDER, make_key, render, response_cache
+from app.step_context import seeded_question_chunks, step_chunks
+from app.student_recall import add_exchange, recall_similar
+from app.tracing import span
+
+client = get_client()
+
+log = logging.getLogger(__name__)
+
+MODEL = "gpt-4o-mini"
+
+
+def _chat(kind: str, messages: List[Dict[str, str]], temperature: float) -> str:
+    with span("llm.chat", kind=kind, model=MODEL) as sp:
+        # Q&A is what the student is waiting on, so it gets a hedged request
+        resp = call(
+            "chat",
+            client.chat.completions.create,
+            hedge=(kind == "answer"),
+            model=MODEL,
+            messages=messages,
+            temperature=temperature,
+        )
+
+        # Provider-side numbers: how much of our stable prefix was actually reused
+        usage = getattr(resp, "usage", None)
+        if usage is not None:
+            details = getattr(usage, "prompt_tokens_details", None)
+            cached = getattr(details, "cached_tokens", 0) if details is not None else 0
+            completion = getattr(usage, "completion_tokens", 0) or 0
+            sp.set(prompt_tokens=usage.prompt_tokens, cached_tokens=cached or 0)
+            TOKENS.inc(usage.prompt_tokens or 0, kind=kind, type="prompt")
+            TOKENS.inc(completion, kind=kind, type="completion")
+            TOKENS.inc(cached or 0, kind=kind, type="cached")
+            log.debug(
+                "chat usage",
+                extra={"kind": kind, "prompt_tokens": usage.prompt_tokens, "completion_tokens": completion, "cached_tokens": cached or 0},
+            )
+
     return resp.choices[0].message.content.strip()
 
 
-def teacher_teach_step(student: dict, plan: dict, cohort_state: dict, lesson: dict, step: dict) -> str:
-    name = student.get("name", "Student")
-    ctx = _lesson_context_text(plan, cohort_state, lesson, step)
+def _shared_student(student: dict) -> dict:
+    # Same profile, but the name is a placeholder so the output can be shared
+    return {**student, "name": NAME_PLACEHOLDER}
 
-    system = f"""
-You are a classroom teacher teaching a lesson in order.
 
-You MUST teach the CURRENT STEP only.
-Do not jump ahead to future steps.
-Do not introduce new topics outside the lesson context.
+def teacher_welcome(student: dict, plan: dict, cohort_state: dict, lesson: dict, use_cache: bool = True) -> str:
+    name = student.get("name", "Student")
+    key = make_key("welcome", MODEL, plan, cohort_state, 0.4, with_step=False)
 
-Rules:
-1) Start with: "{name},"
-2) Teach the step in a clear spoken way.
-3) If the step is "check_question", ask ONLY that check question.
-4) No markdown or symbols.
-{_teacher_style_rules()}
+    text = response_cache.get(key) if use_cache else None
+    if text is None:
+        messages = build_messages("welcome", _shared_student(student), plan, cohort_state, lesson)
+        text = _chat("welcome", messages, temperature=0.4)
+        if use_cache:
+            response_cache.put(key, text)
+    return render(text, name)
 
-{ctx}
-"""
 
-    resp = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "system", "content": system}],
-        temperature=0.3,
-    )
-    return resp.choices[0].message.content.strip()
+def teacher_teach_step(
+    student: dict,
+    plan: dict,
+    cohort_state: dict,
+    lesson: dict,
+    step: dict,
+    use_cache: bool = True,
+) -> str:
+    name = student.get("name", "Student")
+    key = make_key("teach_step", MODEL, plan, cohort_state, 0.3)
+
+    text = response_cache.get(key) if use_cache else None
+    if text is None:
+        # Precomputed for this step by app.build_step_context ([] if not built)
+        chunks = step_chunks(plan.get("cohort_id", ""), cohort_state.get("cursor"))
+        messages = build_messages(
+            "teach_step", _shared_student(student), plan, cohort_state, lesson, step, chunks=chunks
+        )
+        text = _chat("teach_step", messages, temperature=0.3)
+        if use_cache:
+            response_cache.put(key, text)
+    return render(text, name)
 
 
 def teacher_answer_question_and_resume(
@@ -127,37 +96,49 @@ def teacher_answer_question_and_resume(
     lesson: dict,
     step: dict,
     question: str,
+    chunks: Optional[List[Dict[str, str]]] = None,
+    use_recall: bool = True,
 ) -> str:
     name = student.get("name", "Student")
-    ctx = _lesson_context_text(plan, cohort_state, lesson, step)
-
-    system = f"""
-You are a classroom teacher.
-
-A student asked a question while we are in the middle of a lesson.
-Answer the question kindly, then return to the lesson.
-
-Rules:
-1) Start with: "{name},"
-2) First say something encouraging like:
-   "Good question" or "You're thinking well".
-3) Answer in simple spoken language.
-4) Use an example if needed.
-5) Then end with a short transition sentence:
-   "Now let's continue our lesson from where we stopped."
-6) Do NOT teach the next step. Just resume verbally.
-7) No markdown or symbols.
-{_teacher_style_rules()}
-
-{ctx}
-"""
-
-    resp = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": system},
-            {"role": "user", "content": question},
-        ],
-        temperature=0.35,
+
+    if chunks is None:
+        # Question retrieval, warm-started from the step's precomputed chunks
+        chunks = seeded_question_chunks(
+            plan.get("cohort_id", ""), cohort_state.get("cursor"), question, objectives=lesson.get("objectives")
+        )
+
+    # Similar things this student asked before (one embedding call, reused for storing)
+    q_vec, recall = None, []
+    if use_recall:
+        try:
+            q_vec = embed_texts([question])[0]
+            recall = recall_similar(name, q_vec, k=3)
+        except Exception as e:
+            # No embedding (API down, no index yet): fall back to term overlap over the history log
+            log.warning("semantic recall skipped for %s: %s", name, e)
+            try:
+                recall = recall_from_history(name, question, k=3)
+            except Exception as e:
+                log.warning("history recall skipped for %s: %s", name, e)
+
+    messages = build_messages(
+        "answer",
+        student,
+        plan,
+        cohort_state,
+        lesson,
+        step,
+        question=question,
+        memory_summary=student.get("memory_summary", ""),
+        chunks=chunks,
+        recall=recall,
     )
-    return resp.choices[0].message.content.strip()
+    answer = _chat("answer", messages, temperature=0.35)
+
+    if q_vec is not None:
+        try:
+            add_exchange(name, question, answer, q_vec)
+        except Exception as e:
+            # The answer is already paid for: losing one recall row is the better failure
+            log.warning("recall store skipped for %s: %s", name, e)
+    return answer
@@ -0,0 +1,157 @@
+"""
+One place for torch CPU runtime settings shared by the ECAPA and Whisper models.
+
+Several workers on one host each default to a full intra-op pool (one thread per
+core), so N workers run N x cores threads and tail latency spikes. Settings:
+
+    TEACHER_WORKERS=1                 # worker processes sharing this host
+    TEACHER_WORKER_INDEX=0            # this worker's slot (for affinity=auto)
+    TEACHER_TORCH_THREADS=            # intra-op threads (default: cores available / workers)
+    TEACHER_TORCH_INTEROP_THREADS=1
+    TEACHER_CPU_AFFINITY=             # "" (leave alone) | "auto" (slice by worker index) | "0-3,8"
+    TEACHER_ECAPA_GRAD_MODE=inference # inference | no_grad
+    TEACHER_WHISPER_GRAD_MODE=no_grad
+    TEACHER_TORCH_COMPILE=none        # none | compile (torch.compile) | script (TorchScript)
+
+configure_torch() applies the process-wide part once; models call grad_mode(name)
+around inference and optimize_module(name, module) once after loading.
+benchmarks/torch_tuning.py sweeps these under concurrency and prints a recommendation.
+"""
+
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+log = logging.getLogger(__name__)
+
+GRAD_MODES = ("inference", "no_grad")
+COMPILE_MODES = ("none", "compile", "script")
+
+_configured: Optional[Dict[str, Any]] = None
+_lock = threading.Lock()
+
+
+def _parse_cpus(spec: str) -> List[int]:
+    cpus: List[int] = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            lo, hi = part.split("-", 1)
+            cpus.extend(range(int(lo), int(hi) + 1))
+        else:
+            cpus.append(int(part))
+    return sorted(set(cpus))
+
+
+def _available_cpus() -> List[int]:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def _auto_slice(cpus: List[int], workers: int, index: int) -> List[int]:
+    """
+    Contiguous, near-equal share of `cpus` for worker `index` of `workers`.
+    """
+    workers = max(1, min(workers, len(cpus)))
+    index %= workers
+    size, extra = divmod(len(cpus), workers)
+    start = index * size + min(index, extra)
+    return cpus[start:start + size + (1 if index < extra else 0)]
+
+
+def settings_from_env() -> Dict[str, Any]:
+    workers = max(1, int(os.getenv("TEACHER_WORKERS", "1")))
+    return {
+        "workers": workers,
+        "worker_index": int(os.getenv("TEACHER_WORKER_INDEX", "0")),
+        "threads": int(os.getenv("TEACHER_TORCH_THREADS", "0")) or None,
+        "interop_threads": int(os.getenv("TEACHER_TORCH_INTEROP_THREADS", "1")),
+        "affinity": os.getenv("TEACHER_CPU_AFFINITY", ""),
+        "grad_mode": {
+            "ecapa": os.getenv("TEACHER_ECAPA_GRAD_MODE", "inference"),
+            "whisper": os.getenv("TEACHER_WHISPER_GRAD_MODE", "no_grad"),
+        },
+        "compile": os.getenv("TEACHER_TORCH_COMPILE", "none"),
+    }
+
+
+def configure_torch(**overrides: Any) -> Dict[str, Any]:
+    """
+    Apply thread counts and CPU affinity once per process (later calls return the
+    settings in effect). Keyword arguments override the env settings.
+    """
+    global _configured
+    with _lock:
+        if _configured is not None:
+            return _configured
+
+        import torch
+
+        cfg = {**settings_from_env(), **overrides}
+        for name, mode in cfg["grad_mode"].items():
+            if mode not in GRAD_MODES:
+                raise ValueError(f"Unknown grad mode for {name}: {mode}")
+        if cfg["compile"] not in COMPILE_MODES:
+            raise ValueError(f"Unknown compile mode: {cfg['compile']}")
+
+        cpus = _available_cpus()
+        if cfg["affinity"] and hasattr(os, "sched_setaffinity"):
+            cpus = _auto_slice(cpus, cfg["workers"], cfg["worker_index"]) if cfg["affinity"] == "auto" else _parse_cpus(cfg["affinity"])
+            os.sched_setaffinity(0, cpus)
+        elif cfg["affinity"]:
+            log.warning("CPU affinity is not supported on this platform; ignoring TEACHER_CPU_AFFINITY")
+
+        # Pinned: the slice is ours. Not pinned: share the host with the other workers.
+        threads = cfg["threads"] or max(1, len(cpus) // (1 if cfg["affinity"] else cfg["workers"]))
+        torch.set_num_threads(threads)
+        try:
+            torch.set_num_interop_threads(cfg["interop_threads"])
+        except RuntimeError:
+            # Only allowed before the first parallel op; the pool already exists
+            log.warning("interop threads already started; keeping %d", torch.get_num_interop_threads())
+
+        cfg["threads"] = threads
+        cfg["cpus"] = cpus
+        _configured = cfg
+        log.info(
+            "torch runtime",
+            extra={"threads": threads, "interop_threads": torch.get_num_interop_threads(), "cpus": len(cpus),
+                   "compile": cfg["compile"]},
+        )
+        return cfg
+
+
+def grad_mode(model: str):
+    """
+    Context manager for one model's inference: torch.inference_mode() or torch.no_grad().
+    """
+    import torch
+
+    mode = configure_torch()["grad_mode"].get(model, "no_grad")
+    return torch.inference_mode() if mode == "inference" else torch.no_grad()
+
+
+def optimize_module(model: str, module: Any) -> Any:
+    """
+    torch.compile / TorchScript `module` per TEACHER_TORCH_COMPILE. Falls back to the
+    eager module (with a warning) if the model does not compile.
+    """
+    import torch
+
+    mode = configure_torch()["compile"]
+    module.eval()
+    if mode == "none":
+        return module
+    try:
+        if mode == "compile":
+            # Compilation is lazy; graphs that fail on first call fall back to eager too
+            torch._dynamo.config.suppress_errors = True
+            return torch.compile(module, dynamic=True)
+        return torch.jit.script(module)
+    except Exception as e:
+        log.warning("%s: %s failed, running eager: %s", model, mode, e)
+        return module
@@ -0,0 +1,55 @@
+import argparse
+import json
+from collections import defaultdict
+from typing import Dict, List
+
+from app.load_test import percentile
+
+
+def load_durations(path: str) -> Dict[str, List[float]]:
+    """
+    stage name -> list of durations (ms). Reads both jsonl and otel trace formats.
+    """
+    out: Dict[str, List[float]] = defaultdict(list)
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            rec = json.loads(line)
+            if "duration_ms" in rec:
+                out[rec["name"]].append(float(rec["duration_ms"]))
+            else:
+                dur = (int(rec["endTimeUnixNano"]) - int(rec["startTimeUnixNano"])) / 1e6
+                out[rec["name"]].append(dur)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize per-stage latency from a trace file.")
+    parser.add_argument("path", nargs="?", default="data/traces.jsonl")
+    parser.add_argument("--sort", choices=["p95", "p50", "total", "name"], default="total")
+    args = parser.parse_args()
+
+    stats = []
+    for name, ds in load_durations(args.path).items():
+        stats.append({
+            "name": name,
+            "count": len(ds),
+            "p50": percentile(ds, 50),
+            "p95": percentile(ds, 95),
+            "total": sum(ds),
+        })
+
+    if args.sort == "name":
+        stats.sort(key=lambda r: r["name"])
+    else:
+        stats.sort(key=lambda r: r[args.sort], reverse=True)
+
+    print(f"{'stage':<32} {'count':>6} {'p50 ms':>10} {'p95 ms':>10} {'total ms':>12}")
+    for r in stats:
+        print(f"{r['name']:<32} {r['count']:>6} {r['p50']:>10.1f} {r['p95']:>10.1f} {r['total']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
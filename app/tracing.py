@@ -0,0 +1,206 @@
+"""
+Lightweight per-turn tracing.
+
+Off by default. Enable with an env var (or enable() in code):
+    TEACHER_TRACE=data/traces.jsonl          # where spans are appended
+    TEACHER_TRACE_FORMAT=jsonl | otel        # flat records or OpenTelemetry-style spans
+
+Use:
+    with span("stt.whisper", model="base"):
+        ...
+
+    @traced("voice.embed")
+    def _embed(...): ...
+
+When disabled, span() returns a shared no-op context and traced() functions make
+a single flag check before calling through.
+
+Summarize a trace file:
+    python -m app.trace_report data/traces.jsonl
+"""
+
+import atexit
+import contextvars
+import functools
+import json
+import os
+import secrets
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+_enabled = False
+_path: Optional[Path] = None
+_format = "jsonl"
+
+_buffer: List[str] = []
+_buffer_lock = threading.Lock()
+FLUSH_EVERY = 64
+
+# (trace_id, span_id) of the innermost open span in this thread/task
+_current: contextvars.ContextVar[Optional[tuple]] = contextvars.ContextVar("teacher_trace_current", default=None)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("name", "attrs", "trace_id", "span_id", "parent_id", "start_ns", "_token")
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs: Any) -> None:
+        """
+        Attach attributes discovered while the span is open (sizes, scores, ...).
+        """
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        parent = _current.get()
+        if parent is None:
+            self.trace_id = secrets.token_hex(16)
+            self.parent_id = None
+        else:
+            self.trace_id, self.parent_id = parent
+        self.span_id = secrets.token_hex(8)
+        self._token = _current.set((self.trace_id, self.span_id))
+        self.start_ns = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end_ns = time.time_ns()
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        _record(self, end_ns)
+        return False
+
+
+def span(name: str, **attrs: Any):
+    """
+    Context manager timing one stage. Nested spans share the outer trace id.
+    """
+    if not _enabled:
+        return _NOOP
+    return Span(name, attrs)
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """
+    Decorator form of span(); name defaults to module.function.
+    """
+
+    def deco(fn: Callable) -> Callable:
+        span_name = name or f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with Span(span_name, {}):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return deco
+
+
+def current_trace_id() -> Optional[str]:
+    cur = _current.get()
+    return cur[0] if cur else None
+
+
+def _otel_value(v: Any) -> Dict[str, Any]:
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, int):
+        return {"intValue": str(v)}
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    return {"stringValue": str(v)}
+
+
+def _record(s: Span, end_ns: int) -> None:
+    if _format == "otel":
+        rec = {
+            "traceId": s.trace_id,
+            "spanId": s.span_id,
+            "parentSpanId": s.parent_id or "",
+            "name": s.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(end_ns),
+            "attributes": [{"key": k, "value": _otel_value(v)} for k, v in s.attrs.items()],
+        }
+    else:
+        rec = {
+            "trace_id": s.trace_id,
+            "span_id": s.span_id,
+            "parent_id": s.parent_id,
+            "name": s.name,
+            "start_ns": s.start_ns,
+            "duration_ms": (end_ns - s.start_ns) / 1e6,
+            "attrs": s.attrs,
+        }
+
+    line = json.dumps(rec, default=str)
+    with _buffer_lock:
+        _buffer.append(line)
+        full = len(_buffer) >= FLUSH_EVERY
+    # Flush at the end of every root span (turn) so traces survive crashes
+    if full or s.parent_id is None:
+        flush()
+
+
+def flush() -> None:
+    if _path is None:
+        return
+    with _buffer_lock:
+        if not _buffer:
+            return
+        lines, _buffer[:] = list(_buffer), []
+        _path.parent.mkdir(parents=True, exist_ok=True)
+        with _path.open("a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+def enable(path: str = "data/traces.jsonl", fmt: str = "jsonl") -> None:
+    global _enabled, _path, _format
+    if fmt not in ("jsonl", "otel"):
+        raise ValueError(f"Unknown trace format: {fmt}")
+    _path = Path(path)
+    _format = fmt
+    _enabled = True
+
+
+def disable() -> None:
+    global _enabled
+    flush()
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+_env_path = os.getenv("TEACHER_TRACE")
+if _env_path:
+    enable("data/traces.jsonl" if _env_path == "1" else _env_path, os.getenv("TEACHER_TRACE_FORMAT", "jsonl"))
+
+atexit.register(flush)
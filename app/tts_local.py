@@ -1,6 +1,13 @@
+import logging
 import re
 import subprocess
 import time
+from pathlib import Path
+from typing import Optional
+
+from app.tracing import span, traced
+
+log = logging.getLogger(__name__)
 
 
 def _clean_for_tts(text: str) -> str:
@@ -31,6 +38,7 @@ def _chunk_text(text: str, max_len: int = 700) -> list[str]:
     return chunks
 
 
+@traced("tts.speak")
 def speak(text: str) -> None:
     text = _clean_for_tts(text)
     if not text:
@@ -39,7 +47,7 @@ def speak(text: str) -> None:
     chunks = _chunk_text(text, max_len=700)
 
     for i, chunk in enumerate(chunks, start=1):
-        print(f"[TTS] PS chunk {i}/{len(chunks)}: {chunk[:60]}...")
+        log.debug("tts chunk", extra={"chunk": i, "of": len(chunks), "chars": len(chunk), "preview": chunk[:60]})
         safe = chunk.replace('"', "'")
 
         ps = (
@@ -49,5 +57,43 @@ def speak(text: str) -> None:
             f'$speak.Speak("{safe}");'
         )
 
-        subprocess.run(["powershell", "-Command", ps], check=False)
+        with span("tts.chunk", index=i, chars=len(chunk)):
+            subprocess.run(["powershell", "-Command", ps], check=False)
         time.sleep(0.1)
+
+
+def _ps_quote(path: str) -> str:
+    # PowerShell single-quoted string
+    return "'" + path.replace("'", "''") + "'"
+
+
+@traced("tts.synthesize")
+def synthesize_to_wav(text: str, out_path: str) -> Optional[str]:
+    """
+    Render text to a WAV file once (so it can be played to many listeners).
+    Returns the path, or None if nothing was written.
+    """
+    text = _clean_for_tts(text)
+    if not text:
+        return None
+
+    out = Path(out_path).resolve()
+    out.parent.mkdir(parents=True, exist_ok=True)
+    safe = text.replace('"', "'")
+
+    ps = (
+        "Add-Type -AssemblyName System.Speech; "
+        "$speak = New-Object System.Speech.Synthesis.SpeechSynthesizer; "
+        "$speak.Rate = 0; "
+        f"$speak.SetOutputToWaveFile({_ps_quote(str(out))}); "
+        f'$speak.Speak("{safe}"); '
+        "$speak.Dispose();"
+    )
+    subprocess.run(["powershell", "-Command", ps], check=False)
+    return str(out) if out.exists() else None
+
+
+@traced("tts.play")
+def play_wav(path: str) -> None:
+    ps = f"(New-Object System.Media.SoundPlayer {_ps_quote(str(Path(path).resolve()))}).PlaySync();"
+    subprocess.run(["powershell", "-Command", ps], check=False)
@@ -0,0 +1,174 @@
+"""
+A turn as a small dependency graph of stages.
+
+Each Stage names the stages whose results it needs; TurnGraph.run() starts every
+stage as soon as all of its inputs are ready, plain functions on a thread pool
+and `async def` stages on one shared event loop thread. Results are passed to a
+stage as keyword arguments named after its dependencies.
+
+After a run, critical_path() walks back from the last stage to finish, always
+through the dependency that finished last: those are the stages worth making
+faster, everything else was overlapped.
+"""
+
+import asyncio
+import contextvars
+import inspect
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.metrics import histogram
+from app.profiling import turn_thread
+from app.tracing import span
+
+MAX_WORKERS = 4
+
+STAGE_SECONDS = histogram("teacher_stage_seconds", "Turn stage latency", ["stage"])
+TURN_SECONDS = histogram("teacher_turn_seconds", "Whole-turn wall time")
+
+
+@dataclass
+class Stage:
+    name: str
+    fn: Callable[..., Any]
+    deps: Sequence[str] = ()
+    # Extra ordering-only dependencies (must finish first, result not passed in)
+    after: Sequence[str] = ()
+
+
+@dataclass
+class StageTiming:
+    name: str
+    start: float
+    end: float
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+@dataclass
+class TurnGraph:
+    stages: List[Stage]
+    max_workers: int = MAX_WORKERS
+    results: Dict[str, Any] = field(default_factory=dict)
+    timings: Dict[str, StageTiming] = field(default_factory=dict)
+    t0: float = 0.0
+    wall: float = 0.0
+
+    def __post_init__(self) -> None:
+        names = {s.name for s in self.stages}
+        for s in self.stages:
+            missing = [d for d in (*s.deps, *s.after) if d not in names]
+            if missing:
+                raise ValueError(f"Stage {s.name!r} depends on unknown stage(s) {missing}")
+
+    def _needs(self, s: Stage) -> Tuple[str, ...]:
+        return (*s.deps, *s.after)
+
+    def run(self) -> Dict[str, Any]:
+        """
+        Run every stage; returns {stage name: result}. The first failing stage's
+        exception is re-raised once the stages already running have finished.
+        """
+        pending = {s.name: s for s in self.stages}
+        running: Dict[Future, str] = {}
+        loop: Optional[asyncio.AbstractEventLoop] = None
+        loop_thread: Optional[threading.Thread] = None
+        error: Optional[BaseException] = None
+
+        self.t0 = time.perf_counter()
+        pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="turn-stage")
+        try:
+            while pending or running:
+                if error is None:
+                    ready = [s for s in pending.values() if all(d in self.results for d in self._needs(s))]
+                    for s in ready:
+                        del pending[s.name]
+                        kwargs = {d: self.results[d] for d in s.deps}
+                        if inspect.iscoroutinefunction(s.fn):
+                            if loop is None:
+                                loop = asyncio.new_event_loop()
+                                loop_thread = threading.Thread(target=loop.run_forever, name="turn-async", daemon=True)
+                                loop_thread.start()
+                            fut = asyncio.run_coroutine_threadsafe(self._timed_async(s, kwargs), loop)
+                        else:
+                            ctx = contextvars.copy_context()  # keep the caller's trace span as parent
+                            fut = pool.submit(ctx.run, self._timed, s, kwargs)
+                        running[fut] = s.name
+                elif not running:
+                    break
+
+                if not running:
+                    if pending:
+                        raise RuntimeError(f"Dependency cycle among stages {sorted(pending)}")
+                    break
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for fut in done:
+                    name = running.pop(fut)
+                    try:
+                        self.results[name] = fut.result()
+                    except BaseException as e:
+                        error = error or e
+        finally:
+            pool.shutdown(wait=True)
+            if loop is not None:
+                loop.call_soon_threadsafe(loop.stop)
+                loop_thread.join()
+                loop.close()
+            self.wall = time.perf_counter() - self.t0
+            TURN_SECONDS.observe(self.wall)
+
+        if error is not None:
+            raise error
+        return self.results
+
+    def _timed(self, s: Stage, kwargs: Dict[str, Any]) -> Any:
+        start = time.perf_counter()
+        try:
+            # Pool workers count as the profiled turn's threads while running its stage
+            with turn_thread(), span(f"stage.{s.name}"):
+                return s.fn(**kwargs)
+        finally:
+            self._finish(s, start)
+
+    async def _timed_async(self, s: Stage, kwargs: Dict[str, Any]) -> Any:
+        start = time.perf_counter()
+        try:
+            with span(f"stage.{s.name}"):
+                return await s.fn(**kwargs)
+        finally:
+            self._finish(s, start)
+
+    def _finish(self, s: Stage, start: float) -> None:
+        t = self.timings[s.name] = StageTiming(s.name, start, time.perf_counter())
+        STAGE_SECONDS.observe(t.duration, stage=s.name)
+
+    def critical_path(self) -> List[StageTiming]:
+        if not self.timings:
+            return []
+        by_name = {s.name: s for s in self.stages}
+        node = max(self.timings.values(), key=lambda t: t.end)
+        path = [node]
+        while True:
+            deps = [self.timings[d] for d in self._needs(by_name[node.name]) if d in self.timings]
+            if not deps:
+                break
+            node = max(deps, key=lambda t: t.end)
+            path.append(node)
+        return list(reversed(path))
+
+    def report(self) -> str:
+        lines = [f"turn wall={self.wall * 1000:.0f}ms  stage sum={sum(t.duration for t in self.timings.values()) * 1000:.0f}ms"]
+        crit = {t.name for t in self.critical_path()}
+        for t in sorted(self.timings.values(), key=lambda t: t.start):
+            mark = "*" if t.name in crit else " "
+            lines.append(
+                f" {mark} {t.name:<18} start={(t.start - self.t0) * 1000:7.0f}ms  took={t.duration * 1000:7.0f}ms"
+            )
+        lines.append(" (* = critical path)")
+        return "\n".join(lines)
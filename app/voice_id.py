@@ -1,18 +1,43 @@
 import json
+import logging
+import os
 from pathlib import Path
+from typing import Optional
+
+import numpy as np
 import torch
-import torch.nn.functional as F
 from speechbrain.inference.speaker import EncoderClassifier
 
-from app.audio_utils import load_audio_ffmpeg
+from app.audio_utils import AudioBuffer, load_audio_ffmpeg
+from app.file_lock import file_lock, update_json
+from app.metrics import counter, histogram
+from app.profiling import torch_stage
+from app.quantize import QuantizedMatrix
+from app.torch_runtime import configure_torch, grad_mode, optimize_module
+from app.tracing import traced
 
 DB_PATH = Path("data/voice_db.json")
 DB_PATH.parent.mkdir(parents=True, exist_ok=True)
 
+# Compact matrix of every stored voice print, rebuilt whenever voice_db.json changes
+VOICE_INDEX_DIR = Path("data/voice_index")
+VOICE_DB_DTYPE = os.getenv("VOICE_DB_DTYPE", "float32")  # float32 | float16 | int8
+VOICE_RERANK = int(os.getenv("VOICE_RERANK", "8"))
+
+SCORES = histogram("teacher_voice_id_score", "Best cosine score per identification",
+                   buckets=tuple(round(0.1 * i, 1) for i in range(-2, 11)))
+RESULTS = counter("teacher_voice_id_total", "Identifications by result (match/unknown)", ["result"])
+
+log = logging.getLogger(__name__)
+
+# Thread counts / affinity before the first model runs (see app/torch_runtime.py)
+configure_torch()
+
 _classifier = EncoderClassifier.from_hparams(
     source="speechbrain/spkrec-ecapa-voxceleb",
     run_opts={"device": "cpu"},
 )
+_classifier.mods.embedding_model = optimize_module("ecapa", _classifier.mods.embedding_model)
 
 SR = 16000
 
@@ -21,63 +46,108 @@ def _load_db():
         return json.loads(DB_PATH.read_text(encoding="utf-8"))
     return {"students": []}
 
-def _save_db(db):
-    DB_PATH.write_text(json.dumps(db, indent=2), encoding="utf-8")
+def _student_embeddings(s: dict) -> list:
+    embs = s.get("embeddings")
+    # backward compatibility
+    if embs is None and "embedding" in s:
+        embs = [s["embedding"]]
+    return embs or []
+
+
+_matrix: Optional[QuantizedMatrix] = None
 
-def _embed(audio_path: str) -> torch.Tensor:
-    wav = load_audio_ffmpeg(audio_path, sr=SR)          # [1, T]
-    emb = _classifier.encode_batch(wav)                 # often [1, 1, D] or [1, D]
+
+def _voice_matrix() -> Optional[QuantizedMatrix]:
+    """
+    All voice prints as one (possibly quantized) matrix; meta["names"][row] is the owner.
+    Loaded from data/voice_index/ if it matches voice_db.json, rebuilt otherwise.
+    """
+    global _matrix
+    if not DB_PATH.exists():
+        return None
+    st = DB_PATH.stat()
+    # Writes replace the file (new inode), so this changes even within one mtime tick
+    src_stamp = [st.st_mtime_ns, st.st_size, st.st_ino]
+
+    def _fresh(m: Optional[QuantizedMatrix]) -> bool:
+        return m is not None and m.meta.get("source_stamp") == src_stamp and m.meta.get("dtype") == VOICE_DB_DTYPE
+
+    if _fresh(_matrix):
+        return _matrix
+
+    with file_lock(VOICE_INDEX_DIR):
+        if (VOICE_INDEX_DIR / "meta.json").exists():
+            m = QuantizedMatrix.load(VOICE_INDEX_DIR)
+            if _fresh(m):
+                _matrix = m
+                return _matrix
+
+        names, rows = [], []
+        for s in _load_db()["students"]:
+            for e in _student_embeddings(s):
+                names.append(s["name"])
+                rows.append(np.asarray(e, dtype=np.float32).reshape(-1))
+        if not rows:
+            return None
+
+        _matrix = QuantizedMatrix.from_float(
+            np.stack(rows),
+            dtype=VOICE_DB_DTYPE,
+            meta={"names": names, "source_stamp": src_stamp},
+        )
+        _matrix.save(VOICE_INDEX_DIR)
+    return _matrix
+
+
+@traced("voice.embed")
+def _embed(audio_path: str, audio: Optional[AudioBuffer] = None) -> torch.Tensor:
+    # Already decoded for this turn: use its memory as is
+    wav = audio.tensor() if audio is not None and audio.sr == SR else load_audio_ffmpeg(audio_path, sr=SR)  # [1, T]
+    with torch_stage("ecapa"), grad_mode("ecapa"):
+        emb = _classifier.encode_batch(wav)             # often [1, 1, D] or [1, D]
     emb = emb.squeeze()                                 # remove all size-1 dims
     emb = emb.flatten()                                 # ensure shape [D]
     return emb
 
 
+@traced("voice.register")
 def register_student(name: str, audio_path: str):
     emb = _embed(audio_path).tolist()
-    db = _load_db()
-
-    # find existing student
-    for s in db["students"]:
-        if s["name"].lower() == name.lower():
-            s.setdefault("embeddings", [])
-            # migrate old single embedding format if needed
-            if "embedding" in s and "embeddings" not in s:
-                s["embeddings"] = [s["embedding"]]
-                del s["embedding"]
-
-            s["embeddings"].append(emb)
-            _save_db(db)
-            return
-
-    # new student
-    db["students"].append({"name": name, "embeddings": [emb]})
-    _save_db(db)
-
-def identify_speaker(audio_path: str, threshold: float = 0.60):
-    db = _load_db()
-    if not db["students"]:
-        return None
 
-    emb = _embed(audio_path)
-
-    best_name = None
-    best_score = -1.0
-
-    for s in db["students"]:
-        embs = s.get("embeddings")
+    def _apply(db):
+        # find existing student
+        for s in db["students"]:
+            if s["name"].lower() == name.lower():
+                # migrate old single embedding format if needed
+                if "embedding" in s and "embeddings" not in s:
+                    s["embeddings"] = [s["embedding"]]
+                    del s["embedding"]
+                s.setdefault("embeddings", [])
+
+                s["embeddings"].append(emb)
+                return
+
+        # new student
+        db["students"].append({"name": name, "embeddings": [emb]})
+
+    # Safe against other workers registering at the same time
+    update_json(DB_PATH, {"students": []}, _apply)
+
+@traced("voice.identify")
+def identify_speaker(audio_path: str, threshold: float = 0.60, audio: Optional[AudioBuffer] = None):
+    matrix = _voice_matrix()
+    if matrix is None:
+        return None
 
-        # backward compatibility
-        if embs is None and "embedding" in s:
-            embs = [s["embedding"]]
+    emb = _embed(audio_path, audio)
 
-        for e in embs:
-            ref = torch.tensor(e).squeeze().flatten()
-            score = F.cosine_similarity(emb, ref, dim=0).item()
-            if score > best_score:
-                best_score = score
-                best_name = s["name"]
+    hits = matrix.search(emb.detach().cpu().numpy(), k=1, rerank=VOICE_RERANK)
+    best_score, row = hits[0]
+    best_name = matrix.meta["names"][row]
 
-    # Debug (optional — you can remove later)
-    print(f"VoiceID best match: {best_name} score={best_score:.3f} threshold={threshold}")
+    matched = best_score >= threshold
+    SCORES.observe(best_score)
+    RESULTS.inc(result="match" if matched else "unknown")
+    log.debug("voice best match", extra={"speaker": best_name, "score": round(best_score, 3), "threshold": threshold})
 
-    return best_name if best_score >= threshold else None
+    return best_name if matched else None
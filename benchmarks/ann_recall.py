@@ -0,0 +1,102 @@
+"""
+Recall@k and QPS of the IVF-flat index against exact (brute-force) search.
+
+    python benchmarks/ann_recall.py --n 20000 --dim 256 --nlist 141 --nprobe 1 4 8 16 32
+    python benchmarks/ann_recall.py --pack KS3_Maths      # use a built .rag_index/ pack
+
+Synthetic mode draws clustered unit vectors (like real embeddings); queries are
+perturbed copies of stored vectors. Nothing on disk is changed.
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from app.ann_index import IVFIndex, _normalise_rows, exact_search  # noqa: E402
+
+
+def synthetic(n: int, dim: int, clusters: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(clusters, size=n)
+    x = centres[labels] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    return _normalise_rows(x)
+
+
+def load_pack_vectors(pack_id: str) -> np.ndarray:
+    path = REPO_ROOT / ".rag_index" / f"{pack_id}.index.json"
+    idx = json.loads(path.read_text(encoding="utf-8"))
+    return _normalise_rows(np.array([c["embedding"] for c in idx["chunks"]], dtype=np.float32))
+
+
+def _qps(fn, queries) -> float:
+    t0 = time.perf_counter()
+    for q in queries:
+        fn(q)
+    wall = time.perf_counter() - t0
+    return len(queries) / wall if wall else 0.0
+
+
+def run(x: np.ndarray, nlist, nprobes, k: int, n_queries: int, seed: int) -> dict:
+    rng = np.random.default_rng(seed + 1)
+    base = x[rng.integers(x.shape[0], size=n_queries)]
+    queries = _normalise_rows(base + 0.3 * rng.standard_normal(base.shape).astype(np.float32))
+
+    t0 = time.perf_counter()
+    ann = IVFIndex.build(x, nlist=nlist, seed=seed)
+    build_s = time.perf_counter() - t0
+
+    # Search through the on-disk, memory-mapped copy, as the app does
+    with tempfile.TemporaryDirectory() as tmp:
+        ann.save(Path(tmp))
+        ann = IVFIndex.load(Path(tmp))
+
+        truth = [{row for _, row in exact_search(x, q, k)} for q in queries]
+        res = {
+            "n": int(x.shape[0]),
+            "dim": int(x.shape[1]),
+            "nlist": ann.nlist,
+            "k": k,
+            "queries": n_queries,
+            "build_s": round(build_s, 3),
+            "exact_qps": round(_qps(lambda q: exact_search(x, q, k), queries), 1),
+            "ivf": [],
+        }
+        for nprobe in nprobes:
+            found = [{row for _, row in ann.search(q, k, nprobe)} for q in queries]
+            recall = sum(len(f & t) for f, t in zip(found, truth)) / (k * n_queries)
+            res["ivf"].append({
+                "nprobe": nprobe,
+                "recall_at_k": round(recall, 4),
+                "qps": round(_qps(lambda q: ann.search(q, k, nprobe), queries), 1),
+            })
+    return res
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IVF-flat vs exact search benchmark.")
+    parser.add_argument("--pack", help="Benchmark a built pack index instead of synthetic data")
+    parser.add_argument("--n", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--clusters", type=int, default=64)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    x = load_pack_vectors(args.pack) if args.pack else synthetic(args.n, args.dim, args.clusters, args.seed)
+    print(json.dumps(run(x, args.nlist, args.nprobe, args.k, args.queries, args.seed), indent=2))
+
+
+if __name__ == "__main__":
+    main()
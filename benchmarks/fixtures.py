@@ -0,0 +1,120 @@
+"""
+Offline fixtures for the benchmark suite.
+
+Everything is generated locally and deterministically (seeded): a scratch working
+directory holding copies of the shipped curriculum_packs/ and lesson_plans/,
+synthetic speech-like audio, the local OpenAI stand-in server for any call that
+would otherwise go to the API, and packs / progress / voice databases of any size
+from tools/generate_synthetic_data.py.
+"""
+
+import json
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import wave
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "tools"))
+
+import generate_synthetic_data as synth  # noqa: E402
+
+SR = 16000
+# Fixed clock for generated timestamps (reproducible runs)
+SYNTH_NOW = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def make_workdir() -> Path:
+    """
+    Fresh scratch directory with the shipped packs and plans; becomes the cwd
+    (app modules use paths relative to it). The real data/ is never touched.
+    """
+    workdir = Path(tempfile.mkdtemp(prefix="teacher_bench_"))
+    shutil.copytree(REPO_ROOT / "lesson_plans", workdir / "lesson_plans")
+    shutil.copytree(REPO_ROOT / "curriculum_packs", workdir / "curriculum_packs")
+    os.chdir(workdir)
+    return workdir
+
+
+def start_fake_openai() -> str:
+    """
+    Start the stand-in server (zero latency) and point the OpenAI settings at it.
+    Must run before any app module that builds a client is imported.
+    """
+    from app.fake_openai_server import start_in_background
+
+    server = start_in_background(port=0, seed=0)
+    host, port = server.server_address[:2]
+    base_url = f"http://{host}:{port}/v1"
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ["OPENAI_API_KEY"] = "bench"
+    return base_url
+
+
+def write_speech_wav(path: Path, seconds: float, seed: int = 0, sr: int = SR) -> Path:
+    """
+    16-bit mono WAV of speech-like sound: a gliding voiced tone with harmonics,
+    syllable-rate amplitude envelope and a little noise.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * sr)) / sr
+    f0 = 120 + 30 * np.sin(2 * math.pi * 0.5 * t + rng.uniform(0, math.pi))
+    phase = 2 * math.pi * np.cumsum(f0) / sr
+    voiced = sum((0.6 / h) * np.sin(h * phase) for h in range(1, 6))
+    envelope = 0.5 * (1 + np.sin(2 * math.pi * 4 * t)) ** 2 / 4
+    x = voiced * envelope + 0.01 * rng.standard_normal(t.size)
+    pcm = (np.clip(x / max(np.abs(x).max(), 1e-9), -1, 1) * 0.8 * 32767).astype(np.int16)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sr)
+        w.writeframes(pcm.tobytes())
+    return path
+
+
+def synthetic_pack(chunks: int, chunk_chars: int = 1000, seed: int = 0, with_index: bool = False) -> str:
+    """
+    Write a synthetic Maths pack of `chunks` chunks (tools/generate_synthetic_data.py)
+    into curriculum_packs/, plus its .rag_index embeddings if with_index. Returns the pack id.
+    """
+    from app.fake_openai_server import DEFAULT_EMBED_DIM
+
+    pack = synth.make_packs(random.Random(seed), 1, chunks, chunk_chars)[0]
+    pack_id = f"{pack['pack_id']}_{chunks}"
+    pack = {**pack, "pack_id": pack_id}
+    (Path("curriculum_packs") / f"{pack_id}.json").write_text(json.dumps(pack), encoding="utf-8")
+    if with_index:
+        # Same hash embeddings the stand-in server returns for queries
+        synth.write_index(Path("."), pack, DEFAULT_EMBED_DIM, ann=False, quantize=None)
+    return pack_id
+
+
+def seed_progress_db(students: int, seed: int = 0) -> str:
+    """
+    data/progress_db.json with `students` generated learners. Returns one of their names.
+    """
+    from app.memory import DB_PATH
+
+    db = synth.make_progress_db(random.Random(seed), students, SYNTH_NOW)
+    DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    DB_PATH.write_text(json.dumps(db), encoding="utf-8")
+    return next(iter(db["students"]))
+
+
+def seed_voice_db(voices: int, prints: int = 2, seed: int = 0) -> Path:
+    """
+    data/voice_db.json with `voices` generated speakers x `prints` voice prints.
+    """
+    path = Path("data/voice_db.json")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(synth.make_voice_db(np.random.default_rng(seed), voices, prints)), encoding="utf-8")
+    return path
@@ -0,0 +1,133 @@
+"""
+Memory saved and accuracy lost by float16 / int8 embedding storage.
+
+    python benchmarks/quantization.py                      # synthetic RAG + voice sets
+    python benchmarks/quantization.py --pack KS3_Maths     # a built .rag_index/ pack
+    python benchmarks/quantization.py --voice-db data/voice_db.json
+
+RAG: recall@k of each dtype (with and without float32 re-rank) against exact
+float32 search. Voice: top-1 identification agreement with float32, where each
+query is a noisy new recording of an enrolled speaker.
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from app.ann_index import _normalise_rows, exact_search  # noqa: E402
+from app.quantize import DTYPES, QuantizedMatrix  # noqa: E402
+
+
+def _clustered(n: int, dim: int, clusters: int, spread: float, rng) -> np.ndarray:
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(clusters, size=n)
+    return _normalise_rows(centres[labels] + spread * rng.standard_normal((n, dim)).astype(np.float32))
+
+
+def _queries(x: np.ndarray, n: int, noise: float, rng) -> np.ndarray:
+    base = x[rng.integers(x.shape[0], size=n)]
+    return _normalise_rows(base + noise * rng.standard_normal(base.shape).astype(np.float32))
+
+
+def rag_report(x: np.ndarray, k: int, n_queries: int, rerank: int, seed: int) -> dict:
+    rng = np.random.default_rng(seed)
+    queries = _queries(x, n_queries, 0.3, rng)
+    truth = [{row for _, row in exact_search(x, q, k)} for q in queries]
+
+    out = {"n": int(x.shape[0]), "dim": int(x.shape[1]), "k": k, "float32_bytes": int(x.nbytes), "dtypes": []}
+    for dtype in DTYPES[1:]:
+        qm = QuantizedMatrix.from_float(x, dtype=dtype, keep_full=True)
+        row = {"dtype": dtype, "bytes": qm.nbytes(), "saved_pct": round(100 * (1 - qm.nbytes() / x.nbytes), 1)}
+        for label, rr in (("no_rerank", 0), (f"rerank_{rerank}", rerank)):
+            t0 = time.perf_counter()
+            found = [{r for _, r in qm.search(q, k, rerank=rr)} for q in queries]
+            wall = time.perf_counter() - t0
+            recall = sum(len(f & t) for f, t in zip(found, truth)) / (k * n_queries)
+            row[label] = {"recall_at_k": round(recall, 4), "qps": round(n_queries / wall, 1)}
+        out["dtypes"].append(row)
+    return out
+
+
+def voice_report(x: np.ndarray, owners: np.ndarray, n_queries: int, rerank: int, seed: int) -> dict:
+    rng = np.random.default_rng(seed)
+    pick = rng.integers(x.shape[0], size=n_queries)
+    queries = _normalise_rows(x[pick] + 0.25 * rng.standard_normal((n_queries, x.shape[1])).astype(np.float32))
+    want = owners[pick]
+
+    ref = QuantizedMatrix.from_float(x, dtype="float32")
+    ref_ids = np.array([owners[ref.search(q, 1)[0][1]] for q in queries])
+
+    out = {
+        "prints": int(x.shape[0]),
+        "dim": int(x.shape[1]),
+        "float32_bytes": int(x.nbytes),
+        "float32_accuracy": round(float(np.mean(ref_ids == want)), 4),
+        "dtypes": [],
+    }
+    for dtype in DTYPES[1:]:
+        qm = QuantizedMatrix.from_float(x, dtype=dtype, keep_full=True)
+        row = {"dtype": dtype, "bytes": qm.nbytes(), "saved_pct": round(100 * (1 - qm.nbytes() / x.nbytes), 1)}
+        for label, rr in (("no_rerank", 0), (f"rerank_{rerank}", rerank)):
+            ids = np.array([owners[qm.search(q, 1, rerank=rr)[0][1]] for q in queries])
+            row[label] = {
+                "accuracy": round(float(np.mean(ids == want)), 4),
+                "agreement_with_float32": round(float(np.mean(ids == ref_ids)), 4),
+            }
+        out["dtypes"].append(row)
+    return out
+
+
+def _load_voice_db(path: Path):
+    db = json.loads(path.read_text(encoding="utf-8"))
+    rows, owners = [], []
+    for i, s in enumerate(db["students"]):
+        for e in s.get("embeddings") or [s["embedding"]]:
+            rows.append(np.asarray(e, dtype=np.float32).reshape(-1))
+            owners.append(i)
+    return _normalise_rows(np.stack(rows)), np.array(owners)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantized embedding storage report.")
+    parser.add_argument("--pack", help="Use a built pack index instead of synthetic chunks")
+    parser.add_argument("--voice-db", help="Use a voice_db.json instead of synthetic voices")
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--students", type=int, default=500)
+    parser.add_argument("--prints-per-student", type=int, default=3)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--rerank", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    if args.pack:
+        idx = json.loads((REPO_ROOT / ".rag_index" / f"{args.pack}.index.json").read_text(encoding="utf-8"))
+        chunks = _normalise_rows(np.array([c["embedding"] for c in idx["chunks"]], dtype=np.float32))
+    else:
+        chunks = _clustered(args.chunks, 1536, 64, 0.6, rng)  # text-embedding-3-small size
+
+    if args.voice_db:
+        voices, owners = _load_voice_db(Path(args.voice_db))
+    else:
+        # ECAPA-sized prints: one centre per student, a few enrolment recordings each
+        centres = rng.standard_normal((args.students, 192)).astype(np.float32)
+        owners = np.repeat(np.arange(args.students), args.prints_per_student)
+        voices = _normalise_rows(centres[owners] + 0.25 * rng.standard_normal((owners.size, 192)).astype(np.float32))
+
+    report = {
+        "rag": rag_report(chunks, args.k, args.queries, args.rerank, args.seed),
+        "voice": voice_report(voices, owners, args.queries, args.rerank, args.seed),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Hammer update_student_progress and advance_step from many processes at once and
+check that no update is lost.
+
+    python benchmarks/state_concurrency.py --procs 8 --ops 50
+
+Runs in a throwaway directory (the real data/ is never touched).
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+COHORT_ID = "Year7_Maths_Term1"
+STUDENT = "BenchStudent"
+
+
+def _worker(workdir: str, ops: int, start_evt) -> None:
+    sys.path.insert(0, str(REPO_ROOT))
+    os.chdir(workdir)
+    from app.classroom_state import advance_step
+    from app.memory import update_student_progress
+
+    start_evt.wait()
+    for i in range(ops):
+        update_student_progress(STUDENT, f"question {os.getpid()}-{i}", "answer", topic="Maths")
+        advance_step(COHORT_ID)
+
+
+def run(procs: int, ops: int) -> dict:
+    workdir = tempfile.mkdtemp(prefix="state_bench_")
+    try:
+        shutil.copytree(REPO_ROOT / "lesson_plans", Path(workdir) / "lesson_plans")
+
+        ctx = mp.get_context("spawn")
+        start_evt = ctx.Event()
+        workers = [ctx.Process(target=_worker, args=(workdir, ops, start_evt)) for _ in range(procs)]
+        for w in workers:
+            w.start()
+        time.sleep(0.5)  # let every process finish importing
+
+        t0 = time.perf_counter()
+        start_evt.set()
+        for w in workers:
+            w.join()
+        wall = time.perf_counter() - t0
+
+        expected = procs * ops
+        db = json.loads((Path(workdir) / "data/progress_db.json").read_text(encoding="utf-8"))
+        asked = db["students"][STUDENT]["topics"]["Maths"]["asked"]
+
+        log = Path(workdir) / "data/cohorts" / COHORT_ID / "events.jsonl"
+        seqs = [json.loads(line)["seq"] for line in log.read_text(encoding="utf-8").splitlines() if line]
+
+        return {
+            "procs": procs,
+            "ops_per_proc": ops,
+            "expected": expected,
+            "progress_updates": asked,
+            "advance_events": len(seqs),
+            "advance_seq_ok": seqs == list(range(1, len(seqs) + 1)),
+            "lost_progress": expected - asked,
+            "lost_advances": expected - len(seqs),
+            "wall_s": wall,
+            "ops_per_s": (2 * expected) / wall if wall else 0.0,
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-process state store benchmark.")
+    parser.add_argument("--procs", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=50, help="Updates + advances per process")
+    args = parser.parse_args()
+
+    res = run(args.procs, args.ops)
+    print(json.dumps(res, indent=2))
+    ok = res["lost_progress"] == 0 and res["lost_advances"] == 0 and res["advance_seq_ok"]
+    print("✅ no lost updates" if ok else "❌ LOST UPDATES")
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
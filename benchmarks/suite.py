@@ -0,0 +1,293 @@
+"""
+Offline benchmark suite for the classroom pipeline.
+
+    python benchmarks/suite.py --out bench_main.json               # run everything
+    python benchmarks/suite.py --only rag. tts. --quick            # subset, fewer repeats
+    python benchmarks/suite.py --compare bench_main.json bench_pr.json --threshold 0.2
+
+Runs in a scratch directory built by benchmarks/fixtures.py (synthetic audio, the
+shipped plans, packs and databases swept over sizes with
+tools/generate_synthetic_data.py) with OpenAI calls going to the local
+stand-in server, so no network or API key is needed. Benchmarks whose
+dependencies are not installed (torch, whisper, ffmpeg, speechbrain, ...) are
+recorded as skipped rather than failing the run.
+
+Each result holds p50/p95/mean in milliseconds. Compare mode flags every case
+whose p50 grew by more than --threshold (relative), or that ran on BASE but
+errored, was skipped or is missing on HEAD, and exits 1 if any did.
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(REPO_ROOT / "benchmarks"))
+
+import fixtures  # noqa: E402
+from app.load_test import percentile  # noqa: E402
+
+# Cases faster than this are too noisy to call a regression on
+NOISE_FLOOR_MS = 0.05
+
+# name -> (function(param) -> (callable to time, repeats), params)
+BENCHMARKS: Dict[str, Tuple[Callable[[Any], Tuple[Callable[[], Any], int]], List[Any]]] = {}
+
+
+def benchmark(name: str, params: List[Any]):
+    def deco(fn):
+        BENCHMARKS[name] = (fn, params)
+        return fn
+    return deco
+
+
+def _time(fn: Callable[[], Any], repeats: int, warmup: int = 1) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    return {
+        "n": repeats,
+        "p50_ms": round(percentile(samples, 50), 4),
+        "p95_ms": round(percentile(samples, 95), 4),
+        "mean_ms": round(sum(samples) / len(samples), 4),
+    }
+
+
+# --- audio / voice / speech ---------------------------------------------------
+
+@benchmark("audio.load_audio_ffmpeg", params=[2, 10])
+def bench_load_audio(seconds):
+    from app.audio_utils import load_audio_ffmpeg
+
+    wav = fixtures.write_speech_wav(Path(f"audio/speech_{seconds}s.wav"), seconds)
+    return (lambda: load_audio_ffmpeg(str(wav))), 10
+
+
+@benchmark("audio.decode_pooled", params=[2, 10])
+def bench_decode_pooled(seconds):
+    from app.audio_utils import decode_audio
+
+    wav = fixtures.write_speech_wav(Path(f"audio/speech_{seconds}s.wav"), seconds)
+    return (lambda: decode_audio(str(wav)).release()), 10
+
+
+@benchmark("voice.embed", params=[3])
+def bench_voice_embed(seconds):
+    from app.voice_id import _embed
+
+    wav = fixtures.write_speech_wav(Path(f"audio/speech_{seconds}s.wav"), seconds)
+    return (lambda: _embed(str(wav))), 5
+
+
+@benchmark("voice.identify_speaker", params=[10, 100, 1000])
+def bench_identify(enrolled):
+    import app.voice_id as voice_id
+
+    fixtures.seed_voice_db(enrolled)
+    voice_id._matrix = None
+    wav = fixtures.write_speech_wav(Path("audio/speech_3s.wav"), 3)
+    return (lambda: voice_id.identify_speaker(str(wav))), 5
+
+
+@benchmark("stt.transcribe", params=[5])
+def bench_transcribe(seconds):
+    from app.stt_local import transcribe
+
+    wav = fixtures.write_speech_wav(Path(f"audio/speech_{seconds}s.wav"), seconds)
+    return (lambda: transcribe(str(wav))), 3
+
+
+# --- retrieval ------------------------------------------------------------------
+
+QUERY = "What is a fraction and how do I find equivalent fractions?"
+
+
+@benchmark("rag.keyword", params=[100, 1_000, 10_000])
+def bench_keyword(chunks):
+    from app.curriculum_retriever import retrieve_curriculum_chunks
+
+    pack_id = fixtures.synthetic_pack(chunks)
+    return (lambda: retrieve_curriculum_chunks(pack_id, QUERY)), 20
+
+
+@benchmark("rag.semantic", params=[100, 1_000])
+def bench_semantic(chunks):
+    from app.rag_retriever import retrieve_semantic
+
+    pack_id = fixtures.synthetic_pack(chunks, with_index=True)
+    return (lambda: retrieve_semantic(pack_id, QUERY)), 20
+
+
+# --- memory / state -------------------------------------------------------------
+
+@benchmark("memory.update_student_progress", params=[10, 100, 1000])
+def bench_memory_update(students):
+    from app.memory import update_student_progress
+
+    name = fixtures.seed_progress_db(students)
+    return (lambda: update_student_progress(name, "What is 3 over 8?", "Three eighths.", topic="Maths")), 20
+
+
+@benchmark("memory.summary", params=[10, 100, 1000])
+def bench_memory_summary(students):
+    from app.memory import build_memory_summary, get_student_memory
+
+    name = fixtures.seed_progress_db(students)
+    return (lambda: build_memory_summary(get_student_memory(name))), 50
+
+
+@benchmark("state.advance_step", params=[None])
+def bench_advance(_):
+    from app.classroom_state import advance_step, reset_cohort
+
+    reset_cohort("Year7_Maths_Term1")
+    return (lambda: advance_step("Year7_Maths_Term1")), 50
+
+
+# --- text for TTS ---------------------------------------------------------------
+
+_TEACH_TEXT = (
+    "Great question, **Sam**! A fraction shows part of a whole. If a pizza is cut into 8 equal slices "
+    "and you eat 3, you ate 3/8 of it. The top number is the numerator; the bottom is the denominator. "
+    "Can you find a fraction equal to 1/2? Try 2/4 or 4/8. Area is measured in cm² and that's fine too. "
+)
+
+
+@benchmark("tts.clean_for_tts", params=[1_000, 10_000])
+def bench_clean(chars):
+    from app.tts_local import _clean_for_tts
+
+    text = (_TEACH_TEXT * (chars // len(_TEACH_TEXT) + 1))[:chars]
+    return (lambda: _clean_for_tts(text)), 200
+
+
+@benchmark("tts.chunk_text", params=[1_000, 10_000])
+def bench_chunk(chars):
+    from app.tts_local import _chunk_text
+
+    text = (_TEACH_TEXT * (chars // len(_TEACH_TEXT) + 1))[:chars]
+    return (lambda: _chunk_text(text)), 200
+
+
+# --- runner ---------------------------------------------------------------------
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(only: Optional[List[str]] = None, quick: bool = False) -> Dict[str, Any]:
+    cwd = os.getcwd()
+    workdir = fixtures.make_workdir()
+    try:
+        fixtures.start_fake_openai()
+        results: Dict[str, Any] = {}
+        for name, (fn, params) in BENCHMARKS.items():
+            if only and not any(name.startswith(o) for o in only):
+                continue
+            for param in params:
+                case = name if param is None else f"{name}[{param}]"
+                try:
+                    target, repeats = fn(param)
+                    results[case] = _time(target, max(1, repeats // 4) if quick else repeats)
+                except (ImportError, FileNotFoundError, OSError) as e:
+                    # Missing optional dependency (torch, whisper, ffmpeg, ...)
+                    results[case] = {"skipped": f"{type(e).__name__}: {e}"}
+                except Exception as e:
+                    results[case] = {"error": f"{type(e).__name__}: {e}"}
+                print(f"{case:<45} {_fmt(results[case])}", file=sys.stderr)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "quick": quick,
+        },
+        "results": results,
+    }
+
+
+def _fmt(r: Dict[str, Any]) -> str:
+    if "p50_ms" in r:
+        return f"p50={r['p50_ms']:.3f}ms p95={r['p95_ms']:.3f}ms"
+    return r.get("skipped") or r.get("error", "")
+
+
+def compare(base: Dict[str, Any], head: Dict[str, Any], threshold: float) -> Tuple[List[str], List[str]]:
+    """
+    (report lines, regressed case names) for head vs base, by p50.
+    """
+    lines, regressed = [], []
+    lines.append(f"base {base['meta']['commit']}  ->  head {head['meta']['commit']}  (threshold {threshold:.0%})")
+    for case in sorted(set(base["results"]) | set(head["results"])):
+        b, h = base["results"].get(case, {}), head["results"].get(case, {})
+        if "p50_ms" in b and "p50_ms" not in h:
+            # Ran on base, crashed / skipped / missing on head: a broken benchmark must not pass
+            why = h.get("error") or h.get("skipped") or "missing from head"
+            lines.append(f"  {case:<45} {b['p50_ms']:10.3f} ->     failed     ({why})  REGRESSION")
+            regressed.append(case)
+            continue
+        if "p50_ms" not in b or "p50_ms" not in h:
+            lines.append(f"  {case:<45} n/a")
+            continue
+        delta = (h["p50_ms"] - b["p50_ms"]) / b["p50_ms"] if b["p50_ms"] else 0.0
+        flag = ""
+        if delta > threshold and h["p50_ms"] - b["p50_ms"] > NOISE_FLOOR_MS:
+            flag = "  REGRESSION"
+            regressed.append(case)
+        elif delta < -threshold:
+            flag = "  faster"
+        lines.append(f"  {case:<45} {b['p50_ms']:10.3f} -> {h['p50_ms']:10.3f} ms  {delta:+7.1%}{flag}")
+    return lines, regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark suite.")
+    parser.add_argument("--out", help="Write results JSON here (default: stdout)")
+    parser.add_argument("--only", nargs="+", help="Run only benchmarks whose name starts with one of these")
+    parser.add_argument("--quick", action="store_true", help="A quarter of the repeats")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "HEAD"), help="Compare two result files")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative p50 slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    if args.compare:
+        base, head = (json.loads(Path(p).read_text(encoding="utf-8")) for p in args.compare)
+        lines, regressed = compare(base, head, args.threshold)
+        print("\n".join(lines))
+        print(f"❌ {len(regressed)} regression(s)" if regressed else "✅ no regressions")
+        raise SystemExit(1 if regressed else 0)
+
+    out = Path(args.out).resolve() if args.out else None
+    res = run(args.only, args.quick)
+    text = json.dumps(res, indent=2)
+    if out:
+        out.write_text(text, encoding="utf-8")
+        print(f"✅ Wrote {args.out}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""
+Sweep torch runtime settings (app/torch_runtime.py) under concurrency and recommend one.
+
+    python benchmarks/torch_tuning.py --model ecapa --workers 4
+    python benchmarks/torch_tuning.py --model whisper --workers 2 --compile --out tuning.json
+    python benchmarks/torch_tuning.py --model proxy --workers 8 --quick     # no model download
+
+Every configuration starts --workers fresh processes (like separate teacher workers
+on one host). They wait on a barrier, then each runs --requests inferences on a
+few seconds of synthetic speech. Reported per configuration: p50/p95 latency
+over all requests and total throughput.
+
+The recommendation is the lowest p95 among configurations within 10% of the
+best throughput, printed as the env vars to set.
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing as mp
+import os
+import queue
+import sys
+import tempfile
+import time
+import wave
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(REPO_ROOT / "benchmarks"))
+
+import fixtures  # noqa: E402
+from app.load_test import percentile  # noqa: E402
+
+# Keep configurations whose throughput is at least this share of the best
+THROUGHPUT_SLACK = 0.9
+
+# Give up on a configuration whose workers haven't all reported after this long
+RESULT_TIMEOUT_S = 1800.0
+
+
+def _read_wav(path: Path) -> np.ndarray:
+    with wave.open(str(path), "rb") as w:
+        pcm = np.frombuffer(w.readframes(w.getnframes()), dtype=np.int16)
+    return pcm.astype(np.float32) / 32768.0
+
+
+def _build_model(name: str):
+    """
+    (callable(audio np.ndarray) -> Any, grad-mode model name) for one workload.
+    """
+    import torch
+
+    from app.torch_runtime import optimize_module
+
+    if name == "ecapa":
+        from speechbrain.inference.speaker import EncoderClassifier
+
+        clf = EncoderClassifier.from_hparams(source="speechbrain/spkrec-ecapa-voxceleb", run_opts={"device": "cpu"})
+        clf.mods.embedding_model = optimize_module("ecapa", clf.mods.embedding_model)
+        return (lambda audio: clf.encode_batch(torch.from_numpy(audio).unsqueeze(0))), "ecapa"
+
+    if name == "whisper":
+        import whisper
+
+        model = whisper.load_model("base", device="cpu")
+        model.encoder = optimize_module("whisper", model.encoder)
+        # Encoder only: the decoder's cost depends on what was said, not on threading
+        return (lambda audio: model.encoder(whisper.log_mel_spectrogram(whisper.pad_or_trim(audio)).unsqueeze(0))), "whisper"
+
+    # ECAPA-sized TDNN stand-in: no download needed
+    net = torch.nn.Sequential(
+        torch.nn.Conv1d(80, 512, 5, padding=2), torch.nn.ReLU(),
+        torch.nn.Conv1d(512, 512, 3, dilation=2, padding=2), torch.nn.ReLU(),
+        torch.nn.Conv1d(512, 512, 3, dilation=3, padding=3), torch.nn.ReLU(),
+        torch.nn.Conv1d(512, 1536, 1), torch.nn.ReLU(),
+        torch.nn.AdaptiveAvgPool1d(1), torch.nn.Flatten(), torch.nn.Linear(1536, 192),
+    )
+    net = optimize_module("proxy", net)
+
+    def run(audio):
+        frames = max(1, len(audio) // 160)  # 10 ms hop, like fbank features
+        return net(torch.from_numpy(np.resize(audio, 80 * frames).reshape(1, 80, frames)))
+
+    return run, "proxy"
+
+
+def _worker(index: int, cfg: Dict[str, Any], model: str, wav: str, requests: int, barrier, out) -> None:
+    try:
+        _run_worker(index, cfg, model, wav, requests, barrier, out)
+    except BaseException:
+        barrier.abort()  # don't leave the others (and the parent) waiting
+        raise
+
+
+def _run_worker(index: int, cfg: Dict[str, Any], model: str, wav: str, requests: int, barrier, out) -> None:
+    from app.torch_runtime import configure_torch, grad_mode
+
+    configure_torch(
+        workers=cfg["workers"],
+        worker_index=index,
+        threads=cfg["threads"],
+        interop_threads=cfg["interop_threads"],
+        affinity=cfg["affinity"],
+        grad_mode={"ecapa": cfg["grad_mode"], "whisper": cfg["grad_mode"], "proxy": cfg["grad_mode"]},
+        compile=cfg["compile"],
+    )
+    fn, grad_name = _build_model(model)
+    audio = _read_wav(Path(wav))
+    with grad_mode(grad_name):
+        fn(audio)  # warm-up (and lazy compile) outside the timed part
+
+    barrier.wait()
+    lat = []
+    with grad_mode(grad_name):
+        for _ in range(requests):
+            t0 = time.perf_counter()
+            fn(audio)
+            lat.append(time.perf_counter() - t0)
+    out.put(lat)
+
+
+def run_config(cfg: Dict[str, Any], model: str, wav: Path, requests: int) -> Dict[str, Any]:
+    ctx = mp.get_context("spawn")  # fresh torch runtime per worker
+    barrier = ctx.Barrier(cfg["workers"] + 1)
+    out = ctx.Queue()
+    procs = [
+        ctx.Process(target=_worker, args=(i, cfg, model, str(wav), requests, barrier, out))
+        for i in range(cfg["workers"])
+    ]
+    for p in procs:
+        p.start()
+    try:
+        barrier.wait(timeout=600)  # everyone loaded and warmed up
+    except Exception:
+        for p in procs:
+            p.terminate()
+        return {**cfg, "error": "workers failed to start (see stderr)"}
+
+    t0 = time.perf_counter()
+    latencies: List[float] = []
+    pending = len(procs)
+    while pending:
+        try:
+            latencies.extend(out.get(timeout=1.0))
+            pending -= 1
+            continue
+        except queue.Empty:
+            pass
+        # A worker that exits without reporting would otherwise leave us waiting forever
+        dead = [p.exitcode for p in procs if p.exitcode not in (None, 0)]
+        gone = all(p.exitcode is not None for p in procs)
+        if dead or gone or time.perf_counter() - t0 > RESULT_TIMEOUT_S:
+            for p in procs:
+                p.terminate()
+            if dead:
+                why = f"worker exited with code {dead[0]}"
+            elif gone:
+                why = "workers exited without reporting"
+            else:
+                why = f"no results after {RESULT_TIMEOUT_S:.0f}s"
+            return {**cfg, "error": f"{why} (see stderr)"}
+    wall = time.perf_counter() - t0
+    for p in procs:
+        p.join()
+
+    return {
+        **cfg,
+        "requests": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "throughput_per_s": round(len(latencies) / wall, 2) if wall else 0.0,
+    }
+
+
+def configs(workers: int, cores: int, with_compile: bool, quick: bool) -> List[Dict[str, Any]]:
+    share = max(1, cores // workers)
+    threads = sorted({1, share, cores} if not quick else {share, cores})
+    grid = itertools.product(
+        threads,
+        [1] if quick else [1, 2],
+        ["", "auto"],
+        ["inference"] if quick else ["inference", "no_grad"],
+        ["none", "compile", "script"] if with_compile else ["none"],
+    )
+    return [
+        {"workers": workers, "threads": t, "interop_threads": i, "affinity": a, "grad_mode": g, "compile": c}
+        for t, i, a, g, c in grid
+        # Pinned to a 1/workers slice, more threads than the slice only oversubscribes it
+        if not (a == "auto" and t > share)
+    ]
+
+
+def recommend(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    ok = [r for r in results if "p95_ms" in r]
+    if not ok:
+        return {}
+    best_tput = max(r["throughput_per_s"] for r in ok)
+    return min((r for r in ok if r["throughput_per_s"] >= THROUGHPUT_SLACK * best_tput), key=lambda r: r["p95_ms"])
+
+
+def _env_lines(r: Dict[str, Any], model: str) -> List[str]:
+    lines = [
+        f"TEACHER_WORKERS={r['workers']}",
+        f"TEACHER_TORCH_THREADS={r['threads']}",
+        f"TEACHER_TORCH_INTEROP_THREADS={r['interop_threads']}",
+        f"TEACHER_TORCH_COMPILE={r['compile']}",
+    ]
+    if r["affinity"]:
+        lines.append("TEACHER_CPU_AFFINITY=auto  # plus TEACHER_WORKER_INDEX=0..N-1 per worker")
+    if model in ("ecapa", "whisper"):
+        lines.append(f"TEACHER_{model.upper()}_GRAD_MODE={r['grad_mode']}")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep torch thread/affinity/grad/compile settings under concurrency.")
+    parser.add_argument("--model", choices=["ecapa", "whisper", "proxy"], default="proxy")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="Concurrent worker processes")
+    parser.add_argument("--requests", type=int, default=20, help="Inferences per worker")
+    parser.add_argument("--seconds", type=float, default=3.0, help="Length of the synthetic utterance")
+    parser.add_argument("--compile", action="store_true", help="Also try torch.compile and TorchScript (slow to warm up)")
+    parser.add_argument("--quick", action="store_true", help="Smaller grid")
+    parser.add_argument("--out", help="Write all results + recommendation as JSON")
+    args = parser.parse_args()
+
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    with tempfile.TemporaryDirectory(prefix="torch_tuning_") as tmp:
+        wav = fixtures.write_speech_wav(Path(tmp) / "speech.wav", args.seconds)
+        results = []
+        grid = configs(args.workers, cores, args.compile, args.quick)
+        print(f"{args.model}: {len(grid)} configurations x {args.workers} workers x {args.requests} requests ({cores} cores)")
+        print(f"{'threads':>7} {'interop':>7} {'affinity':>8} {'grad':>9} {'compile':>8} {'p50 ms':>9} {'p95 ms':>9} {'req/s':>8}")
+        for cfg in grid:
+            r = run_config(cfg, args.model, wav, args.requests)
+            results.append(r)
+            if "error" in r:
+                print(f"{cfg['threads']:>7} {cfg['interop_threads']:>7} {cfg['affinity'] or '-':>8} {cfg['grad_mode']:>9} {cfg['compile']:>8}  {r['error']}")
+                continue
+            print(
+                f"{r['threads']:>7} {r['interop_threads']:>7} {r['affinity'] or '-':>8} {r['grad_mode']:>9} {r['compile']:>8} "
+                f"{r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['throughput_per_s']:>8.1f}"
+            )
+
+    best = recommend(results)
+    if best:
+        print(f"\n✅ Recommended for {args.workers} worker(s): p95={best['p95_ms']:.1f}ms, {best['throughput_per_s']:.1f} req/s")
+        for line in _env_lines(best, args.model):
+            print(f"    {line}")
+    else:
+        print("\n❌ No configuration completed")
+
+    if args.out:
+        Path(args.out).write_text(json.dumps({"model": args.model, "cores": cores, "results": results,
+                                              "recommended": best}, indent=2), encoding="utf-8")
+        print(f"✅ Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
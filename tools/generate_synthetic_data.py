@@ -0,0 +1,262 @@
+"""
+Seeded synthetic datasets for scale testing (nothing here is real pupil data).
+
+Writes, under --out (laid out like the repo root so the app can run from there):
+
+    curriculum_packs/Synth_<KS>_<Subject>_<n>.json   build_curriculum_packs.py schema
+    .rag_index/<pack_id>.index.json                  hash embeddings (match app.fake_openai_server)
+    .rag_index/<pack_id>.ivf/ , .q/                  optional (--ann / --quantize)
+    data/progress_db.json                            N students with history
+    data/voice_db.json                               M voices x K prints (192-dim)
+    lesson_plans/Synth_<Subject>_Term<n>.json        multi-unit plans
+
+Example:
+    python tools/generate_synthetic_data.py --out synth --chunks 20000 --students 5000 \\
+        --voices 1000 --prints 3 --plans 2 --units 6 --lessons 5 --steps 4 --seed 1
+
+The same arguments and seed always produce identical files.
+"""
+
+import argparse
+import json
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+
+from app.fake_openai_server import hash_embedding  # noqa: E402
+
+SUBJECTS = {
+    "Maths": [
+        "fractions", "decimals", "percentages", "ratio", "proportion", "algebra", "equations",
+        "sequences", "angles", "triangles", "area", "perimeter", "volume", "probability",
+        "statistics", "graphs", "coordinates", "negative numbers", "prime numbers", "factors",
+    ],
+    "Science": [
+        "cells", "photosynthesis", "respiration", "forces", "energy", "electricity", "magnetism",
+        "atoms", "elements", "compounds", "acids", "alkalis", "light", "sound", "ecosystems",
+        "inheritance", "the solar system", "pressure", "particles", "chemical reactions",
+    ],
+    "English": [
+        "poetry", "metaphor", "simile", "narrative", "persuasive writing", "grammar", "punctuation",
+        "spelling", "Shakespeare", "drama", "characters", "themes", "vocabulary", "paragraphs",
+        "speech", "inference", "non-fiction", "plot", "setting", "tone",
+    ],
+}
+
+VERBS = ["understand", "explain", "compare", "apply", "describe", "identify", "use", "calculate",
+         "interpret", "evaluate", "recognise", "represent"]
+LINKS = ["including", "such as", "through", "in the context of", "alongside", "with reference to"]
+ADJ = ["simple", "increasingly complex", "everyday", "familiar", "unfamiliar", "real-life", "formal"]
+
+KEY_STAGES = [("KS2", "KS2 (Year 3-6)", (3, 6)), ("KS3", "KS3 (Year 7-9)", (7, 9)), ("KS4", "KS4 (Year 10-11)", (10, 11))]
+
+
+def _sentence(rng: random.Random, topics: List[str]) -> str:
+    a, b = rng.sample(topics, 2)
+    return (
+        f"Pupils should be taught to {rng.choice(VERBS)} {a} {rng.choice(LINKS)} "
+        f"{rng.choice(ADJ)} problems involving {b}."
+    )
+
+
+def _chunk_text(rng: random.Random, topics: List[str], target_chars: int) -> str:
+    parts = [f"{rng.choice(topics).capitalize()} \n"]
+    while sum(len(p) for p in parts) < target_chars:
+        if rng.random() < 0.08:
+            parts.append(f"\n{rng.choice(topics).capitalize()} \n")
+        parts.append(" " + _sentence(rng, topics) + " \n")
+    return "".join(parts)
+
+
+def make_packs(rng: random.Random, n_packs: int, chunks: int, chunk_chars: int) -> List[Dict[str, Any]]:
+    packs = []
+    subjects = list(SUBJECTS)
+    for i in range(n_packs):
+        subject = subjects[i % len(subjects)]
+        ks, band, _ = KEY_STAGES[(i // len(subjects)) % len(KEY_STAGES)]
+        pack_id = f"Synth_{ks}_{subject}_{i}"
+        packs.append({
+            "pack_id": pack_id,
+            "year_band": band,
+            "subject": subject,
+            "source": {
+                "url": "synthetic://generate_synthetic_data",
+                "publisher": "synthetic",
+                "licence": "n/a",
+                "retrieved_at": "2000-01-01T00:00:00Z",
+            },
+            "chunks": [
+                {"chunk_id": f"{pack_id}_{n:06d}", "text": _chunk_text(rng, SUBJECTS[subject], chunk_chars)}
+                for n in range(1, chunks + 1)
+            ],
+        })
+    return packs
+
+
+def write_index(out: Path, pack: Dict[str, Any], dim: int, ann: bool, quantize: str) -> None:
+    vectors = np.array([hash_embedding(c["text"], dim) for c in pack["chunks"]], dtype=np.float32)
+    index_dir = out / ".rag_index"
+    index_dir.mkdir(parents=True, exist_ok=True)
+    idx = {
+        "pack_id": pack["pack_id"],
+        "embedding_model": "text-embedding-3-small",
+        "chunks": [
+            {"chunk_id": c["chunk_id"], "embedding": [round(float(v), 6) for v in vec]}
+            for c, vec in zip(pack["chunks"], vectors)
+        ],
+    }
+    index_path = index_dir / f"{pack['pack_id']}.index.json"
+    index_path.write_text(json.dumps(idx), encoding="utf-8")
+
+    meta = {
+        "pack_id": pack["pack_id"],
+        "embedding_model": idx["embedding_model"],
+        "chunk_ids": [c["chunk_id"] for c in pack["chunks"]],
+        # app.rag_index ignores derived indexes whose stamp doesn't match the index file
+        "source_mtime_ns": index_path.stat().st_mtime_ns,
+    }
+    if ann:
+        from app.ann_index import IVFIndex
+
+        IVFIndex.build(vectors, meta=meta).save(index_dir / f"{pack['pack_id']}.ivf")
+    if quantize:
+        from app.quantize import QuantizedMatrix
+
+        QuantizedMatrix.from_float(vectors, dtype=quantize, meta=meta).save(index_dir / f"{pack['pack_id']}.q")
+
+
+def make_progress_db(rng: random.Random, students: int, now: datetime) -> Dict[str, Any]:
+    subjects = list(SUBJECTS)
+    db: Dict[str, Any] = {"students": {}, "_version": 1}
+    for i in range(students):
+        name = f"Pupil{i:06d}"
+        created = now - timedelta(days=rng.randint(1, 700))
+        seen = created + timedelta(days=rng.randint(0, (now - created).days))
+        iso = lambda ts: ts.isoformat(timespec="seconds")  # noqa: E731
+
+        # Zipf-ish: a few topics asked about a lot, most rarely
+        topics = {}
+        for rank, topic in enumerate(rng.sample(subjects, rng.randint(1, len(subjects))), start=1):
+            topics[topic] = {"asked": max(1, int(rng.paretovariate(1.2) * 10 / rank)), "last": iso(seen), "notes": ""}
+
+        subject = rng.choice(list(topics))
+        last_questions = []
+        for k in range(rng.randint(0, 8)):
+            topic_word = rng.choice(SUBJECTS[subject])
+            last_questions.append({
+                "ts": iso(seen - timedelta(hours=8 - k)),
+                "q": f"Can you explain {topic_word} again?",
+                "a_short": f"{topic_word.capitalize()} is about ...",
+                "topic": subject,
+            })
+
+        db["students"][name] = {
+            "name": name,
+            "created_at": iso(created),
+            "last_seen_at": iso(seen),
+            "topics": topics,
+            "misconceptions": [f"confuses {a} with {b}" for a, b in
+                               (rng.sample(SUBJECTS[subject], 2) for _ in range(rng.randint(0, 3)))],
+            "strengths": [f"good at {w}" for w in rng.sample(SUBJECTS[subject], rng.randint(0, 3))],
+            "last_questions": last_questions,
+            "lesson_state": {},
+            "session_state": {"last_welcome_at": iso(seen), "last_pack_id": None},
+        }
+    return db
+
+
+def make_voice_db(np_rng: np.random.Generator, voices: int, prints: int, dim: int = 192) -> Dict[str, Any]:
+    students = []
+    for i in range(voices):
+        centre = np_rng.standard_normal(dim) * 10.0  # ECAPA embeddings are not unit-norm
+        embs = [(centre + 3.0 * np_rng.standard_normal(dim)).round(4).tolist() for _ in range(prints)]
+        students.append({"name": f"Pupil{i:06d}", "embeddings": embs})
+    return {"students": students}
+
+
+def make_lesson_plan(rng: random.Random, subject: str, n: int, units: int, lessons: int, steps: int) -> Dict[str, Any]:
+    topics = SUBJECTS[subject]
+    step_types = ["explain", "example", "check_question"]
+    plan = {
+        "cohort_id": f"Synth_{subject}_Term{n}",
+        "year": "Year 7",
+        "subject": subject,
+        "term": f"Synthetic {n}",
+        "units": [],
+    }
+    for u in range(units):
+        unit_topic = topics[(u + n) % len(topics)]
+        unit = {"unit_id": f"U{u + 1}", "unit_title": unit_topic.capitalize(), "lessons": []}
+        for l in range(lessons):
+            focus = rng.choice(topics)
+            unit["lessons"].append({
+                "lesson_id": f"U{u + 1}_L{l + 1}",
+                "lesson_title": f"{unit_topic.capitalize()}: {focus}",
+                "objectives": [f"{rng.choice(VERBS).capitalize()} {focus}." for _ in range(3)],
+                "steps": [
+                    {"type": step_types[s % len(step_types)], "text": _sentence(rng, topics)}
+                    for s in range(steps)
+                ],
+            })
+        plan["units"].append(unit)
+    return plan
+
+
+def _write(path: Path, data: Any) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    print(f"  {path} ({path.stat().st_size / 1e6:.1f} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate seeded synthetic packs, indexes, students, voices and plans.")
+    parser.add_argument("--out", default="synthetic", help="Output root (laid out like the repo)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--packs", type=int, default=3)
+    parser.add_argument("--chunks", type=int, default=1000, help="Chunks per pack")
+    parser.add_argument("--chunk-chars", type=int, default=1000)
+    parser.add_argument("--no-index", action="store_true", help="Skip .rag_index files")
+    parser.add_argument("--embed-dim", type=int, default=1536)
+    parser.add_argument("--ann", action="store_true", help="Also write IVF indexes")
+    parser.add_argument("--quantize", choices=["float16", "int8"], default=None)
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--voices", type=int, default=100)
+    parser.add_argument("--prints", type=int, default=3, help="Embeddings per voice")
+    parser.add_argument("--plans", type=int, default=1, help="Lesson plans per subject")
+    parser.add_argument("--units", type=int, default=4)
+    parser.add_argument("--lessons", type=int, default=4)
+    parser.add_argument("--steps", type=int, default=4)
+    args = parser.parse_args()
+
+    out = Path(args.out)
+    rng = random.Random(args.seed)
+    np_rng = np.random.default_rng(args.seed)
+    # Fixed "now" so timestamps are reproducible too
+    now = datetime(2025, 1, 1, tzinfo=timezone.utc) + timedelta(days=args.seed)
+
+    print(f"Writing synthetic data to {out}/ (seed {args.seed})")
+    for pack in make_packs(rng, args.packs, args.chunks, args.chunk_chars):
+        _write(out / "curriculum_packs" / f"{pack['pack_id']}.json", pack)
+        if not args.no_index:
+            write_index(out, pack, args.embed_dim, args.ann, args.quantize)
+
+    _write(out / "data" / "progress_db.json", make_progress_db(rng, args.students, now))
+    _write(out / "data" / "voice_db.json", make_voice_db(np_rng, args.voices, args.prints))
+
+    for subject in SUBJECTS:
+        for n in range(1, args.plans + 1):
+            plan = make_lesson_plan(rng, subject, n, args.units, args.lessons, args.steps)
+            _write(out / "lesson_plans" / f"{plan['cohort_id']}.json", plan)
+
+    print("✅ Done")
+
+
+if __name__ == "__main__":
+    main()